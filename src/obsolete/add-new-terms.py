@@ -1,18 +1,24 @@
 #!/usr/bin/env python3
 
-import os, collections
+import os, sys, collections
 import cx_Oracle
 import re
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../scripts'))
+
+import iedbmap
+
 # Paths
 index_path = 'ontology/index.tsv'
 external_path = 'ontology/external.tsv'
-organism_map_path = 'organism_map.tsv'
-source_map_path = 'source_map.tsv'
+iedb_map_path = 'iedb-map.db'
+
+# Map from internal ID to curie (see src/scripts/iedbmap.py)
+iedb_map = None
 
-# Dict from internal ID to curie
-organism_map = {}
-source_map = {}
+# New (internal ID, curie, label) rows, added to the map in one upsert
+new_organisms = []
+new_sources = []
 
 # Dictionaries from NCBI Taxon labels to CURIEs
 external = {}
@@ -69,9 +75,9 @@ ORDER BY source_id
 
 def main():
 	"""Determines the last-used ONTIE ID then creates new classes within 
-	ontie.kn based on IEDB organisms that do not have an assigned IRI. The file 
-	organism_map.tsv is generated with the new classes & their organism tax_id 
-	from IEDB. This file is checked for each null IRI entry to ensure duplicate 
+	ontie.kn based on IEDB organisms that do not have an assigned IRI. The map 
+	iedb-map.db is updated with the new classes & their organism tax_id 
+	from IEDB. This map is checked for each null IRI entry to ensure duplicate 
 	classes are not created if the DB has not yet been updated."""
 	init_data()
 	print("Last ID: {}".format(ontie_id))
@@ -90,21 +96,22 @@ def main():
 
 	# Create new organisms in ontology/ontie.kn
 	# New IDs & are also added ontology/index.tsv
-	# And the new mappings are added in organism_map.tsv
+	# And the new mappings are added to iedb-map.db
 	orgs_added = 0
 	proteins_added = 0
-	with open('ontology/ontie.kn', 'a') as ontie:
-		with open(index_path, 'a') as index:
-			with open(organism_map_path, 'a') as orgs:
+	with iedb_map.transaction():
+		with open('ontology/ontie.kn', 'a') as ontie:
+			with open(index_path, 'a') as index:
 				cur.execute(organisms)
 				for row in cur:
-					if add_organism(ontie, index, orgs, row, additional_cur):
+					if add_organism(ontie, index, row, additional_cur):
 						orgs_added += 1
-			with open(source_map_path, 'a') as src:
 				cur.execute(proteins)
 				for row in cur:
-					if add_protein(ontie, index, src, row):
+					if add_protein(ontie, index, row):
 						proteins_added += 1
+		iedb_map.upsert('organism', new_organisms)
+		iedb_map.upsert('source', new_sources)
 
 	added = orgs_added + proteins_added
 
@@ -127,16 +134,16 @@ def clean_name(name):
 	"""Return a tab-replaced name."""
 	return name.strip().replace('\t', ' ')
 
-def add_organism(ontie, index, orgs, row, cur):
+def add_organism(ontie, index, row, cur):
 	"""For each IEDB taxon:
 	- add a new_external (if parent is in NCBI Taxonomy, and not yet in external)
 	- write a row to index.tsv
-	- write a row to organism_map.tsv
+	- add a row to the organism map
 	- write a Knotation stanza to ontie.kn"""
-	global organism_map, ontie_id, alternative_term, external
+	global ontie_id, alternative_term, external
 
 	(tax_id, label, rank, parent_tax_id, parents, parent) = row
-	if tax_id in organism_map:
+	if iedb_map.contains('organism', tax_id):
 		return False
 
 	ontie_id +=1
@@ -152,7 +159,7 @@ def add_organism(ontie, index, orgs, row, cur):
 
 	index.write('%s	%s	owl:Class		\n' % (curie, label))
 
-	orgs.write('%d	%s	%s\n' % (tax_id, curie, label))
+	new_organisms.append((tax_id, curie, label))
 
 	ontie.write(': %s\n' % curie)
 	ontie.write('apply template: taxon class\n')
@@ -172,16 +179,16 @@ def add_organism(ontie, index, orgs, row, cur):
 
 	return True
 
-def add_protein(ontie, index, src, row):
+def add_protein(ontie, index, row):
 	"""For each IEDB source protein:
 	- add a new_external (if organism is in NCBI Taxonomy, and not in external)
 	- write a row to index.tsv
-	- write a row to source_map.tsv
+	- add a row to the source map
 	- write a Knotation stanza to ontie.kn"""
-	global source_map, ontie_id
+	global ontie_id
 
 	(source_id, name, aliases, synonyms, organism_id, organism) = row
-	if source_id in source_map:
+	if iedb_map.contains('source', source_id):
 		return False
 
 	ontie_id +=1
@@ -200,7 +207,7 @@ def add_protein(ontie, index, src, row):
 	
 	index.write('%s	%s	owl:Class		\n' % (curie, label))
 	
-	src.write('%d	%s	%s\n' % (source_id, curie, name))
+	new_sources.append((source_id, curie, name))
 
 	ontie.write(': %s\n' % curie)
 	ontie.write('apply template: protein class\n')
@@ -218,8 +225,8 @@ def init_data():
 	"""Reads in data from:
 	- ontology/index.tsv to get the last ONTIE ID
 	- ontology/externals.tsv to get existing external classes
-	- organism_map and source_map.tsv to get recently added IDs"""
-	global ontie_id, organism_map, external
+	- iedb-map.db to get recently added IDs"""
+	global ontie_id, iedb_map, external
 
 	if os.path.exists(index_path):
 		with open(index_path, 'r') as index:
@@ -238,25 +245,7 @@ def init_data():
 				(curie, label, rdf_type) = line.split('\t')
 				external[label] = curie
 
-	if os.path.exists(organism_map_path):
-		with open(organism_map_path, 'r') as orgs:
-			next(orgs)
-			for line in orgs:
-				(tax_id, curie, label) = line.split('\t')
-				organism_map[int(tax_id)] = curie
-	else:
-		with open(organism_map_path, 'w') as orgs:
-			orgs.write('TAX_ID	CURIE	LABEL\n')
-
-	if os.path.exists(source_map_path):
-		with open(source_map_path, 'r') as src:
-			next(src)
-			for line in src:
-				(tax_id, curie, label) = line.split('\t')
-				source_map[int(tax_id)] = curie
-	else:
-		with open(source_map_path, 'w') as src:
-			src.write('SOURCE_ID	CURIE	NAME\n')
+	iedb_map = iedbmap.IEDBMap(iedb_map_path)
 
 def get_superclasses(parent_tax_id_string, parent, cur):
 	"""Given a string with multiple parent IDs, the original parent name, 
@@ -1,9 +1,14 @@
 #!/usr/bin/env python3
 
-import os, collections
+import os, sys, collections
 import cx_Oracle
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../scripts'))
+
+import iedbmap
+
 out_file = 'test/phony-ontie.kn'
+iedb_map_path = 'iedb-map.db'
 
 proteins = """
 SELECT iri, 
@@ -58,9 +63,15 @@ alternative_terms = collections.defaultdict(list)
 ontie_map = {}
 fake_id = 9000000
 
+# Map from internal ID to curie, for terms added since the DB was updated
+iedb_map = None
+
 def main():
 	"""Connect to the database to query for IEDB taxon, then create a 'phony'
 	ONTIE.kn file to compare to the original ONTIE.kn file."""
+	global iedb_map
+	iedb_map = iedbmap.IEDBMap(iedb_map_path)
+
 	# Connect to the Oracle DB
 	connect_string = "newdb/newdb@10.0.3.197:1521/iedbprod"
 	conn = cx_Oracle.connect(connect_string, encoding = "UTF-8", nencoding = "UTF-8")
@@ -95,6 +106,8 @@ def add_organism(row, cur):
 
 	if iri is not None:
 		curie = iri.replace(base, prefix)
+	elif iedb_map.contains('organism', tax_id):
+		curie = iedb_map.get('organism', tax_id)
 	else:
 		curie = fake_prefix % fake_id
 		fake_id += 1
@@ -128,7 +141,9 @@ def add_protein(row):
 
 	if iri is not None:
 		curie = iri.replace(base, prefix)
-	else: 
+	elif iedb_map.contains('source', source_id):
+		curie = iedb_map.get('source', source_id)
+	else:
 		curie = fake_prefix % fake_id
 		fake_id += 1
 	name = clean_name(name)
@@ -1,34 +1,46 @@
 #!/usr/bin/env python3
 
-import argparse
+import argparse, os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../scripts'))
+
+import taxdump, taxmap
 
 def main():
   parser = argparse.ArgumentParser(
-      description='Create a Turtle file with merged NCBI Taxonomy classes')
+      description='Create Turtle, N-Triples or a statements table with merged NCBI Taxonomy classes')
   parser.add_argument('merged_dmp',
-      type=argparse.FileType('r'),
-      help='the table of merged nodes')
+      type=str,
+      help='the table of merged nodes: merged.dmp (optionally .gz), taxdump.zip or taxdump.tar.gz')
   parser.add_argument('merged_ttl',
       type=str,
-      help='the Turtle file to write')
+      help='the file to write (.ttl, .nt or .db)')
+  parser.add_argument('-f', '--format',
+      choices=['ttl', 'nt', 'db'],
+      help='the output format, if not given by the output file extension')
+  parser.add_argument('-m', '--map',
+      type=str,
+      help='also write an obsolete taxon map (see src/scripts/taxmap.py)')
+  parser.add_argument('-d', '--delnodes',
+      type=str,
+      help='the table of deleted nodes, to resolve merges into deleted taxa in the map')
   args = parser.parse_args()
 
-  with open(args.merged_ttl, 'w') as w:
-    w.write('''@prefix rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#> .
-@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
-@prefix xsd: <http://www.w3.org/2001/XMLSchema#> .
-@prefix owl: <http://www.w3.org/2002/07/owl#> .
-@prefix NCBITaxon: <http://purl.obolibrary.org/obo/NCBITaxon_> .
-@prefix IAO: <http://purl.obolibrary.org/obo/IAO_> .
-
-''')
-    for line in args.merged_dmp:
-      cells = line.split('|')
-      w.write('NCBITaxon:%s\n' % cells[0].strip())
-      w.write('  rdf:type owl:Class ;\n')
-      w.write('  rdfs:label "obsolete taxon %s" ;\n' % cells[0].strip())
-      w.write('  owl:deprecated "true"^^xsd:boolean ;\n')
-      w.write('  IAO:0100001 NCBITaxon:%s .\n\n' % cells[1].strip())
+  merged = {}
+  def add_to_map(batch):
+    for old, new in batch:
+      merged[int(old)] = int(new)
+
+  with taxdump.open_dump(args.merged_dmp, 'merged.dmp') as lines:
+    taxdump.convert(lines, taxdump.parse_merged, args.merged_ttl, args.format,
+        add_to_map if args.map else None)
+
+  if args.map:
+    deleted = set()
+    if args.delnodes:
+      with taxdump.open_dump(args.delnodes, 'delnodes.dmp') as lines:
+        deleted = set(taxmap.read_delnodes(lines))
+    taxmap.write(args.map, taxmap.collapse(merged, deleted))
 
 if __name__ == "__main__":
   main()
@@ -1,32 +1,46 @@
 #!/usr/bin/env python3
 
-import argparse
+import argparse, os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../scripts'))
+
+import taxdump, taxmap
 
 def main():
   parser = argparse.ArgumentParser(
-      description='Create a Turtle file with obsolete NCBI Taxonomy classes')
+      description='Create Turtle, N-Triples or a statements table with obsolete NCBI Taxonomy classes')
   parser.add_argument('delnodes_dmp',
-      type=argparse.FileType('r'),
-      help='the table of merged nodes')
+      type=str,
+      help='the table of deleted nodes: delnodes.dmp (optionally .gz), taxdump.zip or taxdump.tar.gz')
   parser.add_argument('obsolete_ttl',
       type=str,
-      help='the Turtle file to write')
+      help='the file to write (.ttl, .nt or .db)')
+  parser.add_argument('-f', '--format',
+      choices=['ttl', 'nt', 'db'],
+      help='the output format, if not given by the output file extension')
+  parser.add_argument('-m', '--map',
+      type=str,
+      help='also write an obsolete taxon map (see src/scripts/taxmap.py)')
+  parser.add_argument('-M', '--merged',
+      type=str,
+      help='the table of merged nodes, to include merged taxa in the map')
   args = parser.parse_args()
 
-  with open(args.obsolete_ttl, 'w') as w:
-    w.write('''@prefix rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#> .
-@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
-@prefix xsd: <http://www.w3.org/2001/XMLSchema#> .
-@prefix owl: <http://www.w3.org/2002/07/owl#> .
-@prefix NCBITaxon: <http://purl.obolibrary.org/obo/NCBITaxon_> .
-
-''')
-    for line in args.delnodes_dmp:
-      taxid = line.strip().strip('|').strip()
-      w.write('NCBITaxon:%s\n' % taxid)
-      w.write('  rdf:type owl:Class ;\n')
-      w.write('  rdfs:label "obsolete taxon %s" ;\n' % taxid)
-      w.write('  owl:deprecated "true"^^xsd:boolean .\n\n')
+  deleted = set()
+  def add_to_map(batch):
+    for taxid, _ in batch:
+      deleted.add(int(taxid))
+
+  with taxdump.open_dump(args.delnodes_dmp, 'delnodes.dmp') as lines:
+    taxdump.convert(lines, taxdump.parse_delnodes, args.obsolete_ttl, args.format,
+        add_to_map if args.map else None)
+
+  if args.map:
+    merged = {}
+    if args.merged:
+      with taxdump.open_dump(args.merged, 'merged.dmp') as lines:
+        merged = dict(taxmap.read_merged(lines))
+    taxmap.write(args.map, taxmap.collapse(merged, deleted))
 
 if __name__ == "__main__":
   main()
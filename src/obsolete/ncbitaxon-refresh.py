@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+import argparse, os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../scripts'))
+
+import taxdump, taxmap
+
+SQL_CHUNK = 500
+
+def main():
+  parser = argparse.ArgumentParser(
+      description='Compare a new NCBI Taxonomy dump with the previous one and '
+      'write only the obsolete and merged classes that changed')
+  parser.add_argument('taxdump',
+      type=str,
+      help='taxdump.zip or taxdump.tar.gz, or a directory with merged.dmp and delnodes.dmp')
+  parser.add_argument('state',
+      type=str,
+      help='the state file from the previous refresh (created if missing)')
+  parser.add_argument('output',
+      type=str,
+      help='the delta to write: .sql (a full patch for the statements table) or .ttl (new stanzas only; fails if any taxon was removed or changed)')
+  parser.add_argument('--no-search',
+      action='store_true',
+      help='do not update the search index in the .sql patch (for databases built without search.sql)')
+  parser.add_argument('-m', '--map',
+      type=str,
+      help='also rewrite the obsolete taxon map (see src/scripts/taxmap.py)')
+  parser.add_argument('-n', '--dry-run',
+      action='store_true',
+      help='write the delta but do not update the state file or the map')
+  args = parser.parse_args()
+
+  current = read_dump(args.taxdump)
+  previous = {}
+  if os.path.exists(args.state):
+    with taxmap.TaxMap(args.state) as state:
+      previous = dict(zip(state.taxids, state.replacements))
+
+  added = sorted(t for t in current if t not in previous)
+  removed = sorted(t for t in previous if t not in current)
+  changed = sorted(t for t in current if t in previous and previous[t] != current[t])
+
+  if args.output.endswith('.sql'):
+    write_sql(args.output, current, added + changed, removed + changed, not args.no_search)
+  elif removed or changed:
+    # Turtle cannot retract the old statements, so only a .sql patch will do
+    sys.exit('ERROR: %d removed and %d changed taxa cannot be applied as Turtle; '
+        'write a .sql patch instead' % (len(removed), len(changed)))
+  else:
+    write_ttl(args.output, current, added)
+
+  if not args.dry_run:
+    # Raw entries (not collapsed), so the next refresh diffs the dump itself
+    taxmap.write(args.state, current)
+    if args.map:
+      merged = {t: r for t, r in current.items() if r != taxmap.DELETED}
+      deleted = {t for t, r in current.items() if r == taxmap.DELETED}
+      taxmap.write(args.map, taxmap.collapse(merged, deleted))
+
+  print('%d added, %d removed, %d changed' % (len(added), len(removed), len(changed)),
+      file=sys.stderr)
+
+def read_dump(path):
+  """Return a dict from obsolete taxid to replacement taxid (or DELETED)."""
+  if os.path.isdir(path):
+    merged_path = os.path.join(path, 'merged.dmp')
+    delnodes_path = os.path.join(path, 'delnodes.dmp')
+  else:
+    merged_path = delnodes_path = path
+  current = {}
+  with taxdump.open_dump(merged_path, 'merged.dmp') as lines:
+    for old, new in taxmap.read_merged(lines):
+      current[old] = new
+  # A taxon that is both merged and deleted is treated as deleted
+  with taxdump.open_dump(delnodes_path, 'delnodes.dmp') as lines:
+    for taxid in taxmap.read_delnodes(lines):
+      current[taxid] = taxmap.DELETED
+  return current
+
+def rows(current, taxids):
+  for t in taxids:
+    r = current[t]
+    yield str(t), str(r) if r != taxmap.DELETED else None
+
+def write_ttl(path, current, added):
+  """Write the stanzas of new obsolete taxa. Turtle cannot retract
+  statements, so this is only used when no taxon was removed or changed."""
+  writer = taxdump.TurtleWriter(path)
+  for batch in taxdump.read_batches(rows(current, added), lambda x: x):
+    writer.write(batch)
+  writer.close()
+
+def write_sql(path, current, upserts, deletes, search=True):
+  """Write a transaction that applies the delta to an rdftab statements table
+  (or the statements view of a compact database, see src/scripts/compact.sql).
+  With search, the entries of the touched stanzas in the search index (see
+  src/scripts/search.sql) are removed with their statements and added again
+  for the new statements."""
+  with open(path, 'w') as w:
+    w.write('BEGIN TRANSACTION;\n')
+    for stanzas in stanza_lists(deletes):
+      if search:
+        # The index is contentless, so an entry is deleted with its values
+        w.write('INSERT INTO search (search, rowid, label, synonym, definition)\n'
+            "SELECT 'delete', id, label, synonym, definition FROM search_statements\n"
+            'WHERE stanza IN (%s);\n' % stanzas)
+      w.write('DELETE FROM statements WHERE stanza IN (%s);\n' % stanzas)
+    for batch in taxdump.read_batches(rows(current, upserts), lambda x: x, SQL_CHUNK):
+      values = ',\n'.join(
+          '(%s)' % ', '.join(sql_literal(v) for v in statement)
+          for statement in taxdump.statements(batch))
+      w.write('INSERT INTO statements (stanza, subject, predicate, object, value, datatype, language) VALUES\n'
+          '%s;\n' % values)
+    if search:
+      for stanzas in stanza_lists(upserts):
+        w.write('INSERT INTO search (rowid, label, synonym, definition)\n'
+            'SELECT id, label, synonym, definition FROM search_statements\n'
+            'WHERE stanza IN (%s);\n' % stanzas)
+    w.write('COMMIT;\n')
+
+def stanza_lists(taxids):
+  """Yield SQL lists of NCBITaxon stanzas for the taxids, in chunks."""
+  for i in range(0, len(taxids), SQL_CHUNK):
+    yield ', '.join("'NCBITaxon:%d'" % t for t in taxids[i:i + SQL_CHUNK])
+
+def sql_literal(value):
+  if value is None:
+    return 'NULL'
+  return "'%s'" % value.replace("'", "''")
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,265 @@
+import java.io.*;
+import java.net.*;
+import java.nio.charset.StandardCharsets;
+import java.util.*;
+import org.obolibrary.robot.*;
+import org.semanticweb.owlapi.apibinding.OWLManager;
+import org.semanticweb.owlapi.model.*;
+import org.semanticweb.owlapi.model.parameters.Imports;
+
+/**
+ * Run ROBOT commands for the ONTIE build in one long-running JVM.
+ *
+ * <p>Started and called by src/scripts/robot.py. Requests are run one at a time from the
+ * directory the server was started in. Ontologies given on the command line (e.g.
+ * build/imports.ttl and src/ontology/metadata.ttl) are kept loaded between requests, and
+ * reloaded when their files change. They are used for the --input of the first command in a
+ * chain and for every --input of a merge command.
+ *
+ * <p>A request is the working directory and the ROBOT arguments, each sent as a 4-byte length
+ * and UTF-8 bytes, after a 4-byte count of arguments. The reply is a series of frames: a type
+ * byte (1 for stdout, 2 for stderr), a 4-byte length and the bytes, then a type 0 frame with
+ * the 4-byte exit code and the 8-byte run time in milliseconds.
+ */
+public class RobotServer {
+  private static final Set<String> INPUTS = new HashSet<>(Arrays.asList("--input", "-i"));
+
+  private static final Map<String, Cached> cache = new HashMap<>();
+
+  private static final Set<String> cacheable = new HashSet<>();
+
+  private static String root;
+
+  private static class Cached {
+    long modified;
+    long length;
+    OWLOntology ontology;
+  }
+
+  /** Write bytes to the client as frames of one type. */
+  private static class FrameOutputStream extends OutputStream {
+    private final DataOutputStream out;
+    private final int type;
+
+    FrameOutputStream(DataOutputStream out, int type) {
+      this.out = out;
+      this.type = type;
+    }
+
+    @Override
+    public void write(int b) throws IOException {
+      write(new byte[] {(byte) b}, 0, 1);
+    }
+
+    @Override
+    public void write(byte[] b, int off, int len) throws IOException {
+      synchronized (out) {
+        out.writeByte(type);
+        out.writeInt(len);
+        out.write(b, off, len);
+      }
+    }
+
+    @Override
+    public void flush() throws IOException {
+      synchronized (out) {
+        out.flush();
+      }
+    }
+  }
+
+  private static CommandManager manager() {
+    CommandManager m = new CommandManager();
+    m.addCommand("annotate", new AnnotateCommand());
+    m.addCommand("convert", new ConvertCommand());
+    m.addCommand("diff", new DiffCommand());
+    m.addCommand("extract", new ExtractCommand());
+    m.addCommand("filter", new FilterCommand());
+    m.addCommand("merge", new MergeCommand());
+    m.addCommand("query", new QueryCommand());
+    m.addCommand("reason", new ReasonCommand());
+    m.addCommand("remove", new RemoveCommand());
+    m.addCommand("report", new ReportCommand());
+    m.addCommand("template", new TemplateCommand());
+    return m;
+  }
+
+  private static final Set<String> COMMANDS =
+      new HashSet<>(
+          Arrays.asList(
+              "annotate", "convert", "diff", "extract", "filter", "merge", "query", "reason",
+              "remove", "report", "template"));
+
+  /** Return the loaded ontology for a cacheable path, or null. */
+  private static OWLOntology cached(String path) throws Exception {
+    File file = new File(path).getCanonicalFile();
+    String key = file.getPath();
+    if (!cacheable.contains(key) || !file.exists()) {
+      return null;
+    }
+    Cached entry = cache.get(key);
+    if (entry == null
+        || entry.modified != file.lastModified()
+        || entry.length != file.length()) {
+      long start = System.currentTimeMillis();
+      entry = new Cached();
+      entry.modified = file.lastModified();
+      entry.length = file.length();
+      entry.ontology = new IOHelper().loadOntology(key);
+      cache.put(key, entry);
+      System.err.println(
+          "Loaded " + path + " in " + (System.currentTimeMillis() - start) + " ms");
+    }
+    return entry.ontology;
+  }
+
+  private static OWLOntology copy(OWLOntology ontology) throws Exception {
+    return OWLManager.createOWLOntologyManager().copyOntology(ontology, OntologyCopy.DEEP);
+  }
+
+  /** Add the axioms (and ontology annotations) of cached ontologies to the target. */
+  private static void mergeInto(
+      OWLOntology target, List<OWLOntology> ontologies, boolean includeAnnotations) {
+    OWLOntologyManager m = target.getOWLOntologyManager();
+    for (OWLOntology ontology : ontologies) {
+      m.addAxioms(target, ontology.getAxioms(Imports.INCLUDED));
+      if (includeAnnotations) {
+        for (OWLAnnotation annotation : ontology.getAnnotations()) {
+          m.applyChange(new AddOntologyAnnotation(target, annotation));
+        }
+      }
+    }
+  }
+
+  /** Run a chain of commands, one command at a time, using cached inputs. */
+  private static void run(String[] args) throws Exception {
+    List<String> global = new ArrayList<>();
+    List<List<String>> segments = new ArrayList<>();
+    for (String arg : args) {
+      if (COMMANDS.contains(arg)) {
+        segments.add(new ArrayList<>());
+      }
+      if (segments.isEmpty()) {
+        global.add(arg);
+      } else {
+        segments.get(segments.size() - 1).add(arg);
+      }
+    }
+
+    CommandState state = null;
+    for (int i = 0; i < segments.size(); i++) {
+      List<String> segment = segments.get(i);
+      String name = segment.get(0);
+      List<String> rest = new ArrayList<>(global);
+      rest.add(name);
+      List<OWLOntology> merged = new ArrayList<>();
+      boolean includeAnnotations = false;
+      for (int j = 1; j < segment.size(); j++) {
+        String arg = segment.get(j);
+        if (arg.equals("--include-annotations") && j + 1 < segment.size()) {
+          includeAnnotations = segment.get(j + 1).equals("true");
+        }
+        OWLOntology ontology = null;
+        if (INPUTS.contains(arg) && j + 1 < segment.size()) {
+          ontology = cached(segment.get(j + 1));
+        }
+        if (ontology != null && name.equals("merge")) {
+          merged.add(ontology);
+          j++;
+          continue;
+        }
+        if (ontology != null && i == 0 && state == null) {
+          state = new CommandState();
+          state.setOntology(copy(ontology));
+          j++;
+          continue;
+        }
+        rest.add(arg);
+      }
+      if (!merged.isEmpty() && (state == null || state.getOntology() == null)) {
+        // A merge of only cached inputs starts from a copy of the first
+        state = new CommandState();
+        state.setOntology(copy(merged.remove(0)));
+      }
+      state = manager().execute(state, rest.toArray(new String[0]));
+      if (!merged.isEmpty()) {
+        mergeInto(state.getOntology(), merged, includeAnnotations);
+      }
+    }
+  }
+
+  private static String readString(DataInputStream in) throws IOException {
+    byte[] bytes = new byte[in.readInt()];
+    in.readFully(bytes);
+    return new String(bytes, StandardCharsets.UTF_8);
+  }
+
+  private static void handle(Socket socket) throws Exception {
+    DataInputStream in = new DataInputStream(new BufferedInputStream(socket.getInputStream()));
+    DataOutputStream out =
+        new DataOutputStream(new BufferedOutputStream(socket.getOutputStream()));
+    String cwd = readString(in);
+    String[] args = new String[in.readInt()];
+    for (int i = 0; i < args.length; i++) {
+      args[i] = readString(in);
+    }
+
+    PrintStream stdout = System.out;
+    PrintStream stderr = System.err;
+    PrintStream clientOut = new PrintStream(new FrameOutputStream(out, 1), true, "UTF-8");
+    PrintStream clientErr = new PrintStream(new FrameOutputStream(out, 2), true, "UTF-8");
+    long start = System.currentTimeMillis();
+    int code = 0;
+    boolean shutdown = args.length == 1 && args[0].equals("shutdown");
+    try {
+      System.setOut(clientOut);
+      System.setErr(clientErr);
+      if (!new File(cwd).getCanonicalPath().equals(root)) {
+        System.err.println("The ROBOT server runs in " + root + ", not " + cwd);
+        code = 1;
+      } else if (!shutdown) {
+        run(args);
+      }
+    } catch (Exception e) {
+      System.err.println("ROBOT ERROR: " + e.getMessage());
+      code = 1;
+    } finally {
+      System.out.flush();
+      System.err.flush();
+      System.setOut(stdout);
+      System.setErr(stderr);
+    }
+    long elapsed = System.currentTimeMillis() - start;
+    synchronized (out) {
+      out.writeByte(0);
+      out.writeInt(code);
+      out.writeLong(elapsed);
+      out.flush();
+    }
+    System.err.println(elapsed + " ms (exit " + code + "): " + String.join(" ", args));
+    if (shutdown) {
+      socket.close();
+      System.exit(0);
+    }
+  }
+
+  public static void main(String[] args) throws Exception {
+    root = new File(".").getCanonicalPath();
+    int port = Integer.parseInt(args[0]);
+    for (int i = 1; i < args.length; i++) {
+      cacheable.add(new File(args[i]).getCanonicalPath());
+    }
+    try (ServerSocket server = new ServerSocket(port, 50, InetAddress.getLoopbackAddress())) {
+      System.err.println("ROBOT server listening on port " + port);
+      while (true) {
+        try (Socket socket = server.accept()) {
+          handle(socket);
+        } catch (EOFException e) {
+          // robot.py connects without a request to check that the server is up
+        } catch (Exception e) {
+          e.printStackTrace();
+        }
+      }
+    }
+  }
+}
@@ -3,6 +3,10 @@ import csv
 from argparse import ArgumentParser
 from urllib.parse import parse_qs
 
+import templates
+
+from labels import LabelIndex
+
 
 DEFAULTS = ["add", "branch", "branch-name", "project-name", "view-path"]
 
@@ -40,6 +44,26 @@ def main():
 
 	template_path = f"src/ontology/templates/{template}.tsv"
 
+	# Check that the terms named in logic fields exist, before changing any table
+	table = templates.read_table(template_path)
+	names = []
+	for header, value in fields.items():
+		template_string = table.template.get(header) or table.template.get(header.replace("-", " "))
+		column, split = templates.column_type(template_string or "")
+		if column in templates.REFERENCE_TYPES and value:
+			for cell in value.split(split) if split else [value]:
+				names.extend(templates.cell_names(cell))
+	if names:
+		with LabelIndex.load() as index:
+			for name, match in index.resolve_all(names).items():
+				if match.resolved:
+					continue
+				if match.label:
+					print(f"Unable to add term; '{name}' is not a term label, did you mean '{match.label}'?")
+				else:
+					print(f"Unable to add term; '{name}' is not a term label")
+				return
+
 	rows = []
 	with open("src/ontology/templates/index.tsv", "r") as fr:
 		reader = csv.DictReader(fr, delimiter="\t")
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+#
+# Build the Makefile targets by content instead of modification time.
+#
+# `git checkout`, `cogs pull` and `make sort` touch every template, so make
+# rebuilds ontie.owl, the databases, reports and diffs even when nothing has
+# changed. This driver models the same targets as a graph, hashes the inputs
+# of each target (files, the commands make would run, and for diffs the
+# master version of the file), and only runs a target when that hash differs
+# from the last successful build. When a rebuilt output has the same content
+# as before, the targets that use it are skipped too.
+#
+# Each target is still built by its Makefile rule, with `make -B -o ...` so
+# that make does not rebuild its inputs. Targets whose inputs are ready run
+# in parallel. Use --explain to see why each target ran or was skipped.
+
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+from argparse import ArgumentParser
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import templates
+
+
+STATE_FILE = "build/build-state.json"
+
+TABLES = [templates.table_path(name) for name in templates.SHEETS]
+IMPORTS = ["doid", "obi"]
+
+# Directories and other order-only prerequisites that make should never rebuild here
+ORDER_ONLY = ["build", "build/diff", "build/master", "build/validate", "build/validation"]
+
+# The date in version IRIs should not cause a rebuild on its own
+DATE = re.compile(r"\b\d{4}-\d{2}-\d{2}\b")
+
+
+class Target:
+    """A file built by a Makefile rule from input files and other targets.
+    Targets without inputs (downloads and tools) are only built when missing."""
+
+    def __init__(self, name, inputs=(), tools=(), keys=None):
+        self.name = name
+        self.inputs = list(inputs)
+        self.tools = list(tools)
+        self.keys = keys or (lambda: {})
+
+    @property
+    def dependencies(self):
+        return self.inputs + self.tools
+
+
+def master_blob(path):
+    """Return a key for the version of a file on the master branch."""
+    return lambda: {
+        f"master:{path}": subprocess.run(
+            ["git", "rev-parse", f"master:{path}"], capture_output=True, text=True
+        ).stdout.strip()
+    }
+
+
+def targets():
+    """Return the build graph as a dict from name to Target."""
+    graph = {}
+
+    def add(*args, **kwargs):
+        target = Target(*args, **kwargs)
+        graph[target.name] = target
+
+    for tool in ["build/robot.jar", "build/robot-report.jar", "build/rdftab", "build/fetched.txt"]:
+        add(tool)
+    for name in IMPORTS:
+        add(f"build/{name}.owl")
+        add(
+            f"build/{name}.db",
+            ["src/scripts/prefixes.sql", f"build/{name}.owl", "src/scripts/search.sql", "src/scripts/compact.sql"],
+            ["build/rdftab"],
+        )
+        add(f"build/{name}-import.ttl", [f"build/{name}.db", "build/terms.txt"])
+    add("build/terms.txt", [templates.table_path("external")])
+    add("build/imports.ttl", [f"build/{name}-import.ttl" for name in IMPORTS], ["build/robot.jar"])
+    add("ontie.owl", TABLES + ["src/ontology/metadata.ttl", "build/imports.ttl"], ["build/robot.jar"])
+    add("build/ontie.db", ["src/scripts/prefixes.sql", "ontie.owl", "src/scripts/search.sql"], ["build/rdftab"])
+    add("build/report.tsv", ["ontie.owl"], ["build/robot-report.jar"])
+    add("build/diff.html", ["ontie.owl"], ["build/robot.jar"], master_blob("ontie.owl"))
+    for path in TABLES:
+        name = os.path.basename(path)
+        add(f"build/diff/{name[:-4]}.html", [path], ["build/fetched.txt"], master_blob(path))
+    add(
+        "build/diff/diff.html",
+        ["src/scripts/diff.py", "src/scripts/diff.html.jinja2"]
+        + [f"build/diff/{name}.html" for name in templates.SHEETS],
+    )
+    add("build/labels.db", ["src/scripts/labels.py"] + TABLES)
+    add(
+        "build/problems.tsv",
+        [
+            "src/scripts/qc.py",
+            "src/scripts/report.py",
+            "src/scripts/preflight.py",
+            "src/scripts/validate.py",
+            "build/labels.db",
+        ]
+        + TABLES
+        + [os.path.join("src/ontology/validation", f) for f in sorted(os.listdir("src/ontology/validation"))],
+        ["build/robot.jar"],
+    )
+    return graph
+
+
+# Named groups of targets, like the phony targets of the Makefile
+GOALS = {
+    "update": ["build/report.tsv", "build/ontie.db"] + [f"build/{name}.db" for name in IMPORTS],
+    "dbs": ["build/ontie.db"] + [f"build/{name}.db" for name in IMPORTS],
+    "diffs": ["build/diff/diff.html"],
+    "qc": ["build/problems.tsv"],
+}
+
+
+class State:
+    """Hashes of inputs and outputs from the last successful builds, and a
+    cache of file hashes by size and modification time."""
+
+    def __init__(self, path=STATE_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.data = {"files": {}, "targets": {}}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.data = json.load(f)
+
+    def file_hash(self, path):
+        """Return the SHA-256 of a file, only reading it when its size or mtime changed."""
+        if not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        stamp = [stat.st_size, stat.st_mtime_ns]
+        with self.lock:
+            cached = self.data["files"].get(path)
+        if cached and cached["stamp"] == stamp:
+            return cached["sha256"]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with self.lock:
+            self.data["files"][path] = {"stamp": stamp, "sha256": digest}
+        return digest
+
+    def previous(self, name):
+        with self.lock:
+            return self.data["targets"].get(name)
+
+    def record(self, name, inputs, output):
+        with self.lock:
+            self.data["targets"][name] = {"inputs": inputs, "output": output}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.data, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+class Builder:
+    def __init__(self, graph, state, jobs=4, explain=False, dry_run=False, record_only=False):
+        self.graph = graph
+        self.state = state
+        self.jobs = jobs
+        self.explain = explain
+        self.dry_run = dry_run
+        self.record_only = record_only
+        self.lock = threading.Lock()
+        self.ran = []
+
+    def say(self, message):
+        with self.lock:
+            print(message, file=sys.stderr)
+
+    def make_args(self, target):
+        args = ["make", "-B"]
+        for other in list(self.graph) + ORDER_ONLY:
+            if other != target.name:
+                args.extend(["-o", other])
+        return args + [target.name]
+
+    def recipe(self, target):
+        """Return the commands make would run for a target, without the date."""
+        args = self.make_args(target)
+        result = subprocess.run(args[:1] + ["-n"] + args[1:], capture_output=True, text=True)
+        return DATE.sub("DATE", result.stdout)
+
+    def input_hashes(self, target):
+        hashes = {path: self.state.file_hash(path) for path in target.inputs}
+        hashes["recipe"] = hashlib.sha256(self.recipe(target).encode()).hexdigest()
+        hashes.update(target.keys())
+        return hashes
+
+    def reasons(self, target, hashes):
+        """Return the reasons a target must be built, or an empty list."""
+        if not os.path.exists(target.name):
+            return ["output is missing"]
+        if not target.inputs:
+            return []
+        previous = self.state.previous(target.name)
+        if not previous:
+            return ["no previous build recorded"]
+        if previous["output"] != self.state.file_hash(target.name):
+            return ["output was changed outside of the build"]
+        reasons = []
+        for key, value in hashes.items():
+            old = previous["inputs"].get(key)
+            if old != value:
+                if key == "recipe":
+                    reasons.append("the commands changed")
+                elif old is None:
+                    reasons.append(f"new input {key}")
+                else:
+                    reasons.append(f"{key} changed ({old[:8]} -> {(value or 'missing')[:8]})")
+        return reasons
+
+    def build(self, name):
+        target = self.graph[name]
+        hashes = self.input_hashes(target)
+        reasons = self.reasons(target, hashes)
+        if not reasons:
+            if self.explain:
+                self.say(f"skip {name}: inputs unchanged")
+            return
+        if self.record_only and os.path.exists(name):
+            if target.inputs:
+                self.state.record(name, hashes, self.state.file_hash(name))
+            return
+        if self.explain or self.dry_run:
+            self.say(f"run  {name}: " + "; ".join(reasons))
+        if self.dry_run:
+            return
+        began = time.perf_counter()
+        result = subprocess.run(self.make_args(target))
+        if result.returncode != 0:
+            raise RuntimeError(f"building {name} failed with exit code {result.returncode}")
+        self.say(f"built {name} in {time.perf_counter() - began:.1f}s")
+        with self.lock:
+            self.ran.append(name)
+        if target.inputs:
+            self.state.record(name, hashes, self.state.file_hash(name))
+
+    def closure(self, goals):
+        """Return the targets needed for the goals."""
+        needed = set()
+        stack = list(goals)
+        while stack:
+            name = stack.pop()
+            if name in needed or name not in self.graph:
+                continue
+            needed.add(name)
+            stack.extend(self.graph[name].dependencies)
+        return needed
+
+    def run(self, goals):
+        """Build targets in dependency order, running independent targets in parallel."""
+        needed = self.closure(goals)
+        waiting = {
+            name: {d for d in self.graph[name].dependencies if d in needed} for name in needed
+        }
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            while waiting or running:
+                for name in [n for n, deps in waiting.items() if not deps]:
+                    del waiting[name]
+                    running[executor.submit(self.build, name)] = name
+                if not running:
+                    raise RuntimeError(f"dependency cycle in {sorted(waiting)}")
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    future.result()
+                    for deps in waiting.values():
+                        deps.discard(name)
+
+
+def main():
+    p = ArgumentParser(description="Build ONTIE targets when the content of their inputs changes")
+    p.add_argument("goals", nargs="*", default=["update"], help=f"Targets or {', '.join(GOALS)}")
+    p.add_argument("-j", "--jobs", type=int, default=4, help="Number of targets to build at once")
+    p.add_argument("-e", "--explain", action="store_true", help="Print why each target runs or is skipped")
+    p.add_argument("-n", "--dry-run", action="store_true", help="Print what would run without building")
+    p.add_argument(
+        "-r", "--record", action="store_true", help="Record existing outputs as up to date, like make -t"
+    )
+    p.add_argument("-s", "--state", default=STATE_FILE, help="File for the hashes of the last builds")
+    args = p.parse_args()
+
+    graph = targets()
+    goals = []
+    for goal in args.goals:
+        if goal in GOALS:
+            goals.extend(GOALS[goal])
+        elif goal in graph:
+            goals.append(goal)
+        else:
+            print(f"ERROR: unknown target '{goal}'", file=sys.stderr)
+            sys.exit(1)
+
+    state = State(args.state)
+    builder = Builder(graph, state, args.jobs, args.explain, args.dry_run, args.record)
+    try:
+        builder.run(goals)
+    except RuntimeError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if not args.dry_run:
+            state.save()
+    print(f"{len(builder.ran)} targets built", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+-- Convert an rdftab statements table to a compact, dictionary-encoded schema.
+--
+-- rdftab stores every stanza, subject, predicate, object, datatype and
+-- language as a repeated CURIE string, and each index over those columns
+-- repeats them again. Here each distinct CURIE is stored once in terms, the
+-- statements are stored as integer term IDs in triples, and the indexes are
+-- over the integers. Values are literals and stay as text.
+--
+-- A statements view with the same columns decodes the IDs, so queries on
+-- statements (sot.py, mireot.py, gizmos) work unchanged. Views have no rowid,
+-- so the last column of the view is a rowid column with the rowid of each
+-- triple, which is the rowid of the original statement (used by search.sql).
+-- New statements can be inserted into the view by column name, and their
+-- CURIEs are added to terms. Statements can be deleted from the view; their
+-- terms are kept.
+--
+-- Run this in place of the CREATE INDEX lines of the build/%.db rule, that
+-- is on a statements table without indexes: `make COMPACT=true`.
+
+BEGIN;
+
+-- Term IDs are assigned in term order
+CREATE TABLE terms (
+  id INTEGER PRIMARY KEY,
+  term TEXT NOT NULL UNIQUE
+);
+
+INSERT INTO terms (term)
+SELECT stanza FROM statements
+UNION SELECT subject FROM statements
+UNION SELECT predicate FROM statements
+UNION SELECT object FROM statements WHERE object IS NOT NULL
+UNION SELECT datatype FROM statements WHERE datatype IS NOT NULL
+UNION SELECT language FROM statements WHERE language IS NOT NULL
+ORDER BY 1;
+
+CREATE TABLE triples (
+  stanza INTEGER NOT NULL,
+  subject INTEGER NOT NULL,
+  predicate INTEGER NOT NULL,
+  object INTEGER,
+  value TEXT,
+  datatype INTEGER,
+  language INTEGER
+);
+
+INSERT INTO triples (rowid, stanza, subject, predicate, object, value, datatype, language)
+SELECT s.rowid, st.id, su.id, p.id, o.id, s.value, d.id, l.id
+FROM statements AS s
+LEFT JOIN terms AS st ON st.term = s.stanza
+LEFT JOIN terms AS su ON su.term = s.subject
+LEFT JOIN terms AS p ON p.term = s.predicate
+LEFT JOIN terms AS o ON o.term = s.object
+LEFT JOIN terms AS d ON d.term = s.datatype
+LEFT JOIN terms AS l ON l.term = s.language
+ORDER BY s.rowid;
+
+DROP TABLE statements;
+
+CREATE INDEX idx_stanza ON triples (stanza);
+CREATE INDEX idx_subject ON triples (subject);
+CREATE INDEX idx_predicate ON triples (predicate);
+CREATE INDEX idx_object ON triples (object);
+CREATE INDEX idx_value ON triples (value);
+
+-- Every term is joined with LEFT JOIN on its primary key, so that SQLite
+-- leaves out the joins for the columns a query does not use
+CREATE VIEW statements AS
+SELECT st.term AS stanza,
+  su.term AS subject,
+  p.term AS predicate,
+  o.term AS object,
+  t.value AS value,
+  d.term AS datatype,
+  l.term AS language,
+  t.rowid AS rowid
+FROM triples AS t
+LEFT JOIN terms AS st ON st.id = t.stanza
+LEFT JOIN terms AS su ON su.id = t.subject
+LEFT JOIN terms AS p ON p.id = t.predicate
+LEFT JOIN terms AS o ON o.id = t.object
+LEFT JOIN terms AS d ON d.id = t.datatype
+LEFT JOIN terms AS l ON l.id = t.language;
+
+CREATE TRIGGER statements_insert INSTEAD OF INSERT ON statements
+BEGIN
+  INSERT OR IGNORE INTO terms (term)
+  SELECT term FROM (
+    SELECT NEW.stanza AS term
+    UNION ALL SELECT NEW.subject
+    UNION ALL SELECT NEW.predicate
+    UNION ALL SELECT NEW.object
+    UNION ALL SELECT NEW.datatype
+    UNION ALL SELECT NEW.language
+  ) WHERE term IS NOT NULL;
+  INSERT INTO triples (stanza, subject, predicate, object, value, datatype, language)
+  VALUES (
+    (SELECT id FROM terms WHERE term = NEW.stanza),
+    (SELECT id FROM terms WHERE term = NEW.subject),
+    (SELECT id FROM terms WHERE term = NEW.predicate),
+    (SELECT id FROM terms WHERE term = NEW.object),
+    NEW.value,
+    (SELECT id FROM terms WHERE term = NEW.datatype),
+    (SELECT id FROM terms WHERE term = NEW.language)
+  );
+END;
+
+CREATE TRIGGER statements_delete INSTEAD OF DELETE ON statements
+BEGIN
+  DELETE FROM triples WHERE rowid = OLD.rowid;
+END;
+
+COMMIT;
+
+VACUUM;
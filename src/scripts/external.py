@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+#
+# Manage external.tsv: the classes from other ontologies that the ONTIE
+# templates refer to.
+#
+# external.tsv is indexed by label and by CURIE. Parents that taxon.tsv
+# (Parent) and protein.tsv or complex.tsv (In Taxon) refer to, but that are
+# not defined in any template, are looked up and appended as new rows,
+# leaving the existing rows untouched. External terms that nothing refers
+# to, directly or as an ancestor of a used term, are reported as orphans,
+# so they can be dropped from the import extraction (build/terms.txt).
+
+import csv
+import os
+import re
+import sqlite3
+import sys
+
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import iedb
+import templates
+
+
+# Template columns that name taxa, which are NCBI Taxonomy classes when not in ONTIE
+TAXON_COLUMNS = {
+    "taxon": ["Parent"],
+    "protein": ["In Taxon"],
+    "complex": ["In Taxon"],
+}
+
+# Template string types of the columns that name the term of each row. A
+# template can name an external term there to add axioms to it.
+TERM_TYPES = {"ID", "LABEL"}
+
+LABEL_SQL = """SELECT value, subject FROM statements
+WHERE predicate = 'rdfs:label' AND value IN ({})"""
+
+
+class ExternalIndex:
+    """Label and CURIE indexes over the rows of external.tsv."""
+
+    def __init__(self, table):
+        self.table = table
+        self.by_label = {}
+        self.by_curie = {}
+        # Label or CURIE -> A1 row numbers, for values on more than one row
+        self.duplicates = {}
+        for number, row in enumerate(table.rows, start=3):
+            self.add(row, number)
+
+    def add(self, row, number):
+        for key, index in [("Label", self.by_label), ("ID", self.by_curie)]:
+            value = row.get(key)
+            if not value:
+                continue
+            if value in index:
+                self.duplicates.setdefault(value, [index[value]["number"]]).append(number)
+                continue
+            index[value] = {"number": number, "row": row}
+
+    def curie(self, label):
+        found = self.by_label.get(label)
+        return found["row"]["ID"] if found else None
+
+    def label(self, curie):
+        found = self.by_curie.get(curie)
+        return found["row"]["Label"] if found else None
+
+    def __contains__(self, name):
+        return name in self.by_label or name in self.by_curie
+
+
+def required_taxa(tables, known):
+    """Return the set of taxon labels used by the templates that are not known."""
+    required = set()
+    for name, headers in TAXON_COLUMNS.items():
+        if name not in tables:
+            continue
+        for _, header, label in templates.references(tables[name]):
+            if header in headers and label not in known:
+                required.add(label)
+    return required
+
+
+def resolve_from_databases(labels, paths):
+    """Return a dict from label to CURIE using the rdfs:label statements
+    of rdftab databases, such as build/ncbitaxon.db."""
+    found = {}
+    labels = sorted(labels)
+    for path in paths:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            for i in range(0, len(labels), 500):
+                batch = [label for label in labels[i:i + 500] if label not in found]
+                if not batch:
+                    continue
+                sql = LABEL_SQL.format(", ".join("?" for _ in batch))
+                for label, curie in conn.execute(sql, batch):
+                    found.setdefault(label, curie)
+        finally:
+            conn.close()
+    return found
+
+
+def resolve_from_iedb(labels, url):
+    """Return a dict from label to NCBITaxon CURIE using IEDB's organism table."""
+    conn = iedb.connect(url)
+    try:
+        return {
+            label: "NCBITaxon:%d" % taxon_id
+            for label, taxon_id in iedb.find_ncbi_taxa(conn, labels).items()
+        }
+    finally:
+        conn.close()
+
+
+def append_rows(table, rows):
+    """Append rows to a template file, without rewriting the existing rows."""
+    with open(table.path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+    with open(table.path, "a") as f:
+        writer = csv.writer(f, delimiter="\t", lineterminator="\n")
+        for row in rows:
+            writer.writerow([row.get(header, "") for header in table.headers])
+            table.rows.append(row)
+
+
+def term_names(table):
+    """Yield the labels and CURIEs in the ID and LABEL columns of a table."""
+    headers = [h for h in table.headers if templates.column_type(table.template.get(h) or "")[0] in TERM_TYPES]
+    for row in table.rows:
+        for header in headers:
+            value = (row.get(header) or "").strip()
+            if value:
+                yield value
+
+
+def orphans(tables, index):
+    """Return the external rows that no other template refers to or adds
+    axioms to, directly or through the Parent and Additional Axiom of a used
+    external term."""
+    used = set()
+    for name, table in tables.items():
+        if name == "external":
+            continue
+        for _, _, ref in templates.references(table):
+            if ref in index:
+                used.add(ref)
+        for ref in term_names(table):
+            if ref in index:
+                used.add(ref)
+    # Add ancestors and the terms in axioms of used external terms
+    queue = list(used)
+    references = {}
+    for number, header, ref in templates.references(index.table):
+        references.setdefault(number, []).append(ref)
+    while queue:
+        ref = queue.pop()
+        found = index.by_label.get(ref) or index.by_curie.get(ref)
+        for other in references.get(found["number"], []):
+            if other in index and other not in used:
+                used.add(other)
+                queue.append(other)
+    return [
+        row
+        for row in index.table.rows
+        if row.get("ID") not in used and row.get("Label") not in used
+    ]
+
+
+def mentioned(tables, rows):
+    """Return (row, table name) for the external rows whose label or CURIE is
+    a cell, a SPLIT value or a quoted name anywhere in another template."""
+    names = {}
+    for row in rows:
+        for key in ["ID", "Label"]:
+            if row.get(key):
+                names[row[key]] = row
+    found = []
+    for name, table in tables.items():
+        if name == "external":
+            continue
+        for row in table.rows:
+            for cell in row.values():
+                if not isinstance(cell, str):
+                    continue
+                for value in [cell] + cell.split("|") + re.findall(r"'([^']+)'", cell):
+                    value = value.strip()
+                    if value in names and (names[value], name) not in found:
+                        found.append((names[value], name))
+    return found
+
+
+def main():
+    p = ArgumentParser(description="Merge new parents into external.tsv and report orphaned terms")
+    p.add_argument("-t", "--templates", default=templates.TEMPLATE_DIR, help="Template directory")
+    sub = p.add_subparsers(dest="command", required=True)
+    m = sub.add_parser("merge", help="Add missing taxon parents to external.tsv")
+    m.add_argument("-d", "--database", help="IEDB database to look up NCBI Taxonomy IDs")
+    m.add_argument("-r", "--resource", action="append", default=[], help="rdftab database to look up labels")
+    m.add_argument("-n", "--dry-run", action="store_true", help="Print the new rows without writing them")
+    o = sub.add_parser("orphans", help="List external terms that no template uses")
+    o.add_argument(
+        "-c", "--check", action="store_true", help="Fail if a listed term is named anywhere in another template"
+    )
+    sub.add_parser("duplicates", help="List labels and CURIEs on more than one row of external.tsv")
+    args = p.parse_args()
+
+    tables = templates.read_tables(template_dir=args.templates)
+    index = ExternalIndex(tables["external"])
+    writer = csv.writer(sys.stdout, delimiter="\t", lineterminator="\n")
+
+    if args.command == "merge":
+        known = set(index.by_label) | set(index.by_curie)
+        for name, table in tables.items():
+            if name != "external":
+                known.update(table.column("Label"))
+                known.update(table.column("ID"))
+        required = required_taxa(tables, known)
+        found = {}
+        if required and args.resource:
+            found.update(resolve_from_databases(required, args.resource))
+        if required - set(found) and args.database:
+            found.update(resolve_from_iedb(required - set(found), args.database))
+        rows = [
+            {"ID": found[label], "Label": label, "Type": "owl:Class", "Parent": "organism"}
+            for label in sorted(found)
+        ]
+        if args.dry_run:
+            writer.writerows([row.get(h, "") for h in index.table.headers] for row in rows)
+        elif rows:
+            append_rows(index.table, rows)
+        print(f"Added {len(rows)} external terms", file=sys.stderr)
+        for label in sorted(required - set(found)):
+            print(f"Cannot resolve taxon '{label}'", file=sys.stderr)
+        if required - set(found):
+            sys.exit(1)
+
+    elif args.command == "orphans":
+        writer.writerow(["ID", "Label", "cell"])
+        rows = orphans(tables, index)
+        for row in rows:
+            number = index.by_curie.get(row.get("ID"), {}).get("number")
+            writer.writerow([row.get("ID"), row.get("Label"), f"A{number}" if number else ""])
+        if args.check:
+            found = mentioned(tables, rows)
+            for row, name in found:
+                print(f"ERROR: orphan {row.get('ID')} '{row.get('Label')}' is named in {name}.tsv", file=sys.stderr)
+            if found:
+                sys.exit(1)
+
+    else:
+        writer.writerow(["value", "cells"])
+        for value, numbers in sorted(index.duplicates.items()):
+            writer.writerow([value, ", ".join(f"A{n}" for n in numbers)])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+#
+# Extract every IEDB organism and source protein as "phony" ONTIE templates,
+# to compare with src/ontology/templates.
+#
+# The organism and source queries are split into ID ranges that run in
+# parallel over a pool of connections. Each finished partition is handed to
+# the writer threads for index.tsv, taxon.tsv and protein.tsv, which write
+# partitions in ID order as soon as the earlier ones are done. Throughput is
+# reported for each partition.
+
+import csv
+import os
+import queue
+import sys
+import threading
+import time
+
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import iedb
+import iedbmap
+import templates
+
+
+class OrderedWriter(threading.Thread):
+    """Write rows to a template file in partition order, from a queue
+    of (partition number, rows) items that may arrive in any order."""
+
+    def __init__(self, table, path):
+        super().__init__(daemon=True)
+        self.table = table
+        self.path = path
+        self.queue = queue.Queue()
+        self.error = None
+
+    def put(self, number, rows):
+        self.queue.put((number, rows))
+
+    def finish(self):
+        self.queue.put(None)
+        self.join()
+        if self.error:
+            raise self.error
+
+    def run(self):
+        pending = {}
+        next_number = 0
+        try:
+            with open(self.path, "w") as f:
+                writer = csv.writer(f, delimiter="\t", lineterminator="\n")
+                writer.writerow(self.table.headers)
+                writer.writerow(templates.row_cells(self.table.headers, self.table.template))
+                headers = self.table.headers
+                while True:
+                    item = self.queue.get()
+                    if item is None:
+                        break
+                    number, rows = item
+                    pending[number] = rows
+                    while next_number in pending:
+                        writer.writerows(
+                            [row.get(header, "") for header in headers]
+                            for row in pending.pop(next_number)
+                        )
+                        next_number += 1
+        except Exception as e:
+            self.error = e
+            # Keep draining so producers never block
+            while self.queue.get() is not None:
+                pass
+
+
+def get_curie(kind, record, mapped):
+    """Return the ONTIE CURIE from the IEDB IRI or the map, or a stable
+    TEMP CURIE for terms that do not have one yet."""
+    if record["iri"]:
+        return record["iri"].replace(iedb.ONTIE_BASE, "ONTIE:")
+    if record["id"] in mapped:
+        return mapped[record["id"]]
+    return f"TEMP:{kind}_{record['id']}"
+
+
+class Extract:
+    """Run partitioned queries and send the rows of each to the writers."""
+
+    def __init__(self, pool, writers, mapped, names, synonyms):
+        self.pool = pool
+        self.writers = writers
+        self.mapped = mapped
+        self.names = names
+        self.synonyms = synonyms
+        self.lock = threading.Lock()
+        self.total_rows = 0
+
+    def organisms(self, index_number, number, start, end):
+        conn = self.pool.connection()
+        index_rows = []
+        taxon_rows = []
+        for row in iedb.fetch(conn, iedb.ORGANISMS_RANGE_SQL.format(start, end)):
+            organism = iedb.organism_record(row, self.names, self.synonyms)
+            curie = get_curie("organism", organism, self.mapped["organism"])
+            index_rows.append({"ID": curie, "Label": organism["label"], "Type": "owl:Class"})
+            taxon_rows.append(iedb.taxon_row(organism))
+        self.writers["taxon"].put(number, taxon_rows)
+        self.writers["index"].put(index_number, index_rows)
+        return len(taxon_rows)
+
+    def proteins(self, index_number, number, start, end):
+        conn = self.pool.connection()
+        index_rows = []
+        protein_rows = []
+        for row in iedb.fetch(conn, iedb.PROTEINS_RANGE_SQL.format(start, end)):
+            protein = iedb.protein_record(row)
+            curie = get_curie("source", protein, self.mapped["source"])
+            index_rows.append({"ID": curie, "Label": protein["label"], "Type": "owl:Class"})
+            protein_rows.append(iedb.protein_row(protein))
+        self.writers["protein"].put(number, protein_rows)
+        self.writers["index"].put(index_number, index_rows)
+        return len(protein_rows)
+
+    def run(self, name, fn, index_number, number, start, end):
+        began = time.perf_counter()
+        count = fn(index_number, number, start, end)
+        elapsed = time.perf_counter() - began
+        with self.lock:
+            self.total_rows += count
+            print(
+                f"{name}\t{number}\t{start}-{end}\t{count}\t{elapsed:.2f}\t{count / elapsed if elapsed else 0:.0f}",
+                file=sys.stderr,
+            )
+        return count
+
+
+def main():
+    parser = ArgumentParser(description="Extract all IEDB organisms and proteins as phony ONTIE templates")
+    parser.add_argument(
+        "-d",
+        "--database",
+        required=True,
+        help="IEDB database: an Oracle connect string, postgresql://... or sqlite:///path",
+    )
+    parser.add_argument("-o", "--output", default="build/phony", help="Directory for the phony templates")
+    parser.add_argument("-m", "--map", default=iedbmap.MAP_FILE, help="Map of IEDB IDs to ONTIE IDs")
+    parser.add_argument("-j", "--jobs", type=int, default=4, help="Number of connections and queries in parallel")
+    parser.add_argument("-p", "--partitions", type=int, help="Partitions per query (default: 4 per job)")
+    args = parser.parse_args()
+    partitions = args.partitions or args.jobs * 4
+
+    os.makedirs(args.output, exist_ok=True)
+    mapped = {kind: {} for kind in iedbmap.KINDS}
+    if os.path.exists(args.map):
+        with iedbmap.IEDBMap(args.map) as iedb_map:
+            for kind in iedbmap.KINDS:
+                mapped[kind] = {iedb_id: curie for iedb_id, curie, _ in iedb_map.rows(kind)}
+
+    writers = {}
+    for name in ["index", "taxon", "protein"]:
+        table = templates.read_table(templates.table_path(name))
+        writers[name] = OrderedWriter(table, os.path.join(args.output, f"{name}.tsv"))
+        writers[name].start()
+
+    began = time.perf_counter()
+    pool = iedb.ConnectionPool(args.database, args.jobs)
+    try:
+        with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+            # The name and synonym maps are needed by every organism partition
+            names = executor.submit(lambda: iedb.get_organism_names(pool.connection()))
+            synonyms = executor.submit(lambda: iedb.get_synonyms(pool.connection()))
+            organism_ids = executor.submit(
+                lambda: next(iedb.fetch(pool.connection(), iedb.ORGANISM_IDS_SQL))
+            )
+            source_ids = executor.submit(lambda: next(iedb.fetch(pool.connection(), iedb.SOURCE_IDS_SQL)))
+            organism_ranges = iedb.id_ranges(*organism_ids.result(), partitions)
+            source_ranges = iedb.id_ranges(*source_ids.result(), partitions)
+            extract = Extract(pool, writers, mapped, names.result(), synonyms.result())
+            print("query\tpartition\tids\trows\tseconds\trows/sec", file=sys.stderr)
+
+            # Organisms then proteins in index.tsv, like the previous phony ONTIE
+            futures = []
+            for number, (start, end) in enumerate(organism_ranges):
+                futures.append(
+                    executor.submit(extract.run, "organisms", extract.organisms, number, number, start, end)
+                )
+            offset = len(organism_ranges)
+            for number, (start, end) in enumerate(source_ranges):
+                futures.append(
+                    executor.submit(
+                        extract.run, "proteins", extract.proteins, offset + number, number, start, end
+                    )
+                )
+            for future in futures:
+                future.result()
+    finally:
+        for writer in writers.values():
+            writer.finish()
+        pool.close()
+
+    elapsed = time.perf_counter() - began
+    print(
+        f"{extract.total_rows} rows in {elapsed:.2f} seconds "
+        f"({extract.total_rows / elapsed if elapsed else 0:.0f} rows/sec)",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+#
+# Add ONTIE terms for IEDB organisms and source proteins that do not have an IRI yet.
+#
+# Organisms, synonyms and sources are each fetched with one query, and every
+# new term is added to index.tsv, taxon.tsv, protein.tsv and external.tsv,
+# which are written together at the end.
+
+import os
+import sys
+
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import iedb
+import iedbmap
+import templates
+
+
+def last_ontie_id(index):
+    last = 0
+    for curie in index.column("ID"):
+        if curie.startswith("ONTIE:"):
+            last = max(last, int(curie.split(":", 1)[1]))
+    return last
+
+
+class Sync:
+    """Collect new rows for the templates, assigning ONTIE IDs in order."""
+
+    def __init__(self, tables, iedb_map):
+        self.tables = tables
+        self.iedb_map = iedb_map
+        self.ontie_id = last_ontie_id(tables["index"])
+        self.labels = {row["Label"]: row["ID"] for row in tables["index"].rows}
+        self.external = {row["Label"]: row["ID"] for row in tables["external"].rows}
+        self.new_organisms = []
+        self.new_sources = []
+        self.new_external = 0
+
+    def add_index(self, label):
+        self.ontie_id += 1
+        curie = "ONTIE:%07d" % self.ontie_id
+        self.tables["index"].append({"ID": curie, "Label": label, "Type": "owl:Class"})
+        self.labels[label] = curie
+        return curie
+
+    def add_external(self, taxon_id, label):
+        """Add an NCBI Taxonomy class to external.tsv if it is not there yet."""
+        if taxon_id >= iedb.IEDB_TAXON_START or not label or label in self.external:
+            return
+        curie = "NCBITaxon:%d" % taxon_id
+        self.tables["external"].append(
+            {"ID": curie, "Label": label, "Type": "owl:Class", "Parent": "organism"}
+        )
+        self.external[label] = curie
+        self.new_external += 1
+
+    def add_organism(self, organism, names):
+        if self.iedb_map.contains("organism", organism["id"]):
+            return
+        label = organism["label"]
+        curie = self.labels.get(label)
+        if not curie:
+            curie = self.add_index(label)
+            self.tables["taxon"].append(iedb.taxon_row(organism))
+            for parent_id in organism["parent_ids"]:
+                self.add_external(parent_id, names.get(parent_id))
+        self.new_organisms.append((organism["id"], curie, label))
+
+    def add_protein(self, protein):
+        if self.iedb_map.contains("source", protein["id"]):
+            return
+        label = protein["label"]
+        curie = self.labels.get(label)
+        if not curie:
+            curie = self.add_index(label)
+            self.tables["protein"].append(iedb.protein_row(protein))
+            self.add_external(protein["organism_id"], protein["organism"])
+        self.new_sources.append((protein["id"], curie, protein["name"]))
+
+
+def main():
+    parser = ArgumentParser(description="Add new IEDB organisms and source proteins to the ONTIE templates")
+    parser.add_argument(
+        "-d",
+        "--database",
+        required=True,
+        help="IEDB database: an Oracle connect string, postgresql://... or sqlite:///path",
+    )
+    parser.add_argument("-t", "--templates", default=templates.TEMPLATE_DIR, help="Template directory")
+    parser.add_argument("-m", "--map", default=iedbmap.MAP_FILE, help="Map of IEDB IDs to ONTIE IDs")
+    parser.add_argument("-n", "--dry-run", action="store_true", help="Report new terms without writing")
+    args = parser.parse_args()
+
+    iedb_map = iedbmap.IEDBMap(args.map)
+    conn = iedb.connect(args.database)
+    try:
+        # Hold the map's write lock so concurrent runs cannot assign the same IDs
+        with iedb_map.transaction():
+            tables = templates.read_tables(["index", "external", "taxon", "protein"], args.templates)
+            sync = Sync(tables, iedb_map)
+            names = iedb.get_organism_names(conn)
+            synonyms = iedb.get_synonyms(conn)
+            for organism in iedb.get_organisms(conn, names, synonyms, new_only=True):
+                sync.add_organism(organism, names)
+            for protein in iedb.get_proteins(conn, new_only=True):
+                sync.add_protein(protein)
+
+            print(
+                f"{len(sync.new_organisms)} organisms, {len(sync.new_sources)} proteins, "
+                f"{sync.new_external} external classes",
+                file=sys.stderr,
+            )
+            if not args.dry_run:
+                templates.write_tables(tables.values())
+                iedb_map.upsert("organism", sync.new_organisms)
+                iedb_map.upsert("source", sync.new_sources)
+    finally:
+        conn.close()
+        iedb_map.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""Bulk extraction of organisms, synonyms and source proteins from the IEDB database.
+
+The source can be IEDB's Oracle database (cx_Oracle), a PostgreSQL copy
+(psycopg2), or a SQLite file with the same tables for offline use, e.g.
+one loaded from test/iedb/fixture.sql. Each query is run once and fetched
+in arrays of rows rather than row by row.
+"""
+
+import sqlite3
+import threading
+
+from collections import defaultdict
+
+
+ARRAY_SIZE = 5000
+
+ONTIE_BASE = "https://ontology.iedb.org/ontology/ONTIE_"
+
+# IEDB organism IDs at or above this are IEDB's own taxa, below are NCBI Taxonomy
+IEDB_TAXON_START = 10000000
+
+ORGANISM_NAMES_SQL = """
+SELECT organism_id, organism_name
+FROM organism
+"""
+
+SYNONYMS_SQL = """
+SELECT tax_id, name_txt
+FROM names
+WHERE name_class = 'synonym'
+  AND tax_id >= 10000000
+ORDER BY tax_id
+"""
+
+ORGANISMS_QUERY = """
+SELECT o1.organism_id,
+  o1.organism_name AS label,
+  o1.rank,
+  o1.parent_tax_id,
+  o1.parent_tax_id_string,
+  o2.organism_name AS parent,
+  o1.iri
+FROM organism o1, organism o2
+WHERE o1.parent_tax_id = o2.organism_id
+  AND o1.organism_id >= 10000000
+  {}
+ORDER BY o1.organism_id
+"""
+
+PROTEINS_QUERY = """
+SELECT source_id,
+  name,
+  aliases,
+  synonyms,
+  organism_id,
+  organism_name,
+  iri
+FROM source
+WHERE database = 'IEDB'
+  AND organism_id IS NOT NULL
+  AND organism_name IS NOT NULL
+  {}
+ORDER BY source_id
+"""
+
+ORGANISMS_SQL = ORGANISMS_QUERY.format("")
+PROTEINS_SQL = PROTEINS_QUERY.format("")
+
+# Only the organisms and proteins that do not have an ONTIE IRI yet
+NEW_ORGANISMS_SQL = ORGANISMS_QUERY.format("AND o1.iri IS NULL")
+NEW_PROTEINS_SQL = PROTEINS_QUERY.format("AND iri IS NULL")
+
+# Queries over one ID range, for partitioned extraction
+ORGANISMS_RANGE_SQL = ORGANISMS_QUERY.format("AND o1.organism_id BETWEEN {0:d} AND {1:d}")
+PROTEINS_RANGE_SQL = PROTEINS_QUERY.format("AND source_id BETWEEN {0:d} AND {1:d}")
+ORGANISM_IDS_SQL = """
+SELECT MIN(organism_id), MAX(organism_id)
+FROM organism
+WHERE organism_id >= 10000000
+"""
+SOURCE_IDS_SQL = """
+SELECT MIN(source_id), MAX(source_id)
+FROM source
+WHERE database = 'IEDB'
+"""
+
+
+def connect(url):
+    """Connect to 'sqlite:///path', 'postgresql://...', or an Oracle connect string."""
+    if url.startswith("sqlite:///"):
+        # Pooled connections may be closed by a different thread
+        return sqlite3.connect(url[len("sqlite:///"):], check_same_thread=False)
+    if url.startswith(("postgres://", "postgresql://")):
+        import psycopg2
+
+        return psycopg2.connect(url)
+    import cx_Oracle
+
+    if url.startswith("oracle://"):
+        url = url[len("oracle://"):]
+    return cx_Oracle.connect(url, encoding="UTF-8", nencoding="UTF-8")
+
+
+class ConnectionPool:
+    """Open at most one connection per thread, up to size threads,
+    and close them all at the end."""
+
+    def __init__(self, url, size):
+        self.url = url
+        self.size = size
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = []
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            with self.lock:
+                if len(self.connections) >= self.size:
+                    raise Exception(f"More than {self.size} threads are using the pool")
+                conn = connect(self.url)
+                self.connections.append(conn)
+            self.local.conn = conn
+        return conn
+
+    def close(self):
+        with self.lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections = []
+
+
+def id_ranges(low, high, partitions):
+    """Split the inclusive range low..high into at most partitions
+    contiguous inclusive ranges."""
+    if low is None or high is None:
+        return []
+    partitions = max(1, min(partitions, high - low + 1))
+    step = (high - low + 1) / partitions
+    bounds = [low + round(step * i) for i in range(partitions)] + [high + 1]
+    return [(bounds[i], bounds[i + 1] - 1) for i in range(partitions)]
+
+
+def fetch(conn, sql, params=(), arraysize=ARRAY_SIZE):
+    """Yield rows from a query, fetched arraysize rows at a time."""
+    cur = conn.cursor()
+    cur.arraysize = arraysize
+    cur.execute(sql, params) if params else cur.execute(sql)
+    try:
+        while True:
+            rows = cur.fetchmany(arraysize)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cur.close()
+
+
+def clean_name(name):
+    """Return a tab-replaced name."""
+    return name.strip().replace("\t", " ")
+
+
+def read_lob(value):
+    """Return the text of an Oracle LOB, or the value itself."""
+    if value is None:
+        return ""
+    if hasattr(value, "read"):
+        return value.read()
+    return value
+
+
+def get_organism_names(conn):
+    """Return a dict from organism ID to cleaned organism name."""
+    return {
+        organism_id: clean_name(name)
+        for organism_id, name in fetch(conn, ORGANISM_NAMES_SQL)
+        if name
+    }
+
+
+def sql_literal(value):
+    return "'%s'" % value.replace("'", "''")
+
+
+def find_ncbi_taxa(conn, labels, size=500):
+    """Return a dict from label to NCBI Taxonomy ID for the given organism names.
+    Names are matched exactly, in batches of IN lists."""
+    labels = sorted(set(labels))
+    found = {}
+    for i in range(0, len(labels), size):
+        names = ", ".join(sql_literal(label) for label in labels[i:i + size])
+        sql = f"{ORGANISM_NAMES_SQL}WHERE organism_id < {IEDB_TAXON_START:d} AND organism_name IN ({names})"
+        for organism_id, name in fetch(conn, sql):
+            found[clean_name(name)] = organism_id
+    return found
+
+
+def get_synonyms(conn):
+    """Return a dict from IEDB taxon ID to a list of synonyms."""
+    synonyms = defaultdict(list)
+    for tax_id, name in fetch(conn, SYNONYMS_SQL):
+        synonyms[tax_id].append(clean_name(name))
+    return synonyms
+
+
+def get_parents(parent_tax_id_string, parent, names):
+    """Return the names of additional parents listed in a comma-separated
+    parent ID string, excluding the primary parent name."""
+    parents = []
+    if not parent_tax_id_string or "," not in str(parent_tax_id_string):
+        return parents
+    for s in str(parent_tax_id_string).split(","):
+        s = s.strip()
+        if not s:
+            continue
+        name = names.get(int(s))
+        if name and name != parent and name not in parents:
+            parents.append(name)
+    return parents
+
+
+def organism_record(row, names, synonyms):
+    """Return a dict for an organism row, with all parents resolved from names."""
+    (organism_id, label, rank, parent_tax_id, parent_tax_id_string, parent, iri) = row
+    parent = clean_name(parent)
+    return {
+        "id": organism_id,
+        "iri": iri,
+        "label": clean_name(label),
+        "rank": clean_name(rank) if rank else "",
+        "parent_id": parent_tax_id,
+        "parents": [parent] + get_parents(parent_tax_id_string, parent, names),
+        "parent_ids": parent_ids(parent_tax_id, parent_tax_id_string),
+        "synonyms": synonyms.get(organism_id, []),
+    }
+
+
+def parent_ids(parent_tax_id, parent_tax_id_string):
+    """Return the primary parent ID followed by any other parent IDs."""
+    ids = [parent_tax_id]
+    if parent_tax_id_string:
+        for s in str(parent_tax_id_string).split(","):
+            s = s.strip()
+            if s and int(s) not in ids:
+                ids.append(int(s))
+    return ids
+
+
+def protein_record(row):
+    """Return a dict for a source protein row."""
+    (source_id, name, aliases, synonyms, organism_id, organism, iri) = row
+    name = clean_name(name)
+    organism = clean_name(organism)
+    alternative_terms = []
+    for term in (aliases or "").split(", ") + read_lob(synonyms).split(", "):
+        term = term.strip()
+        if term and term not in alternative_terms:
+            alternative_terms.append(term)
+    return {
+        "id": source_id,
+        "iri": iri,
+        "name": name,
+        "label": f"{name} ({organism})",
+        "organism_id": organism_id,
+        "organism": organism,
+        "alternative_terms": alternative_terms,
+    }
+
+
+def taxon_row(organism):
+    """Return a taxon.tsv row for an organism record."""
+    return {
+        "Label": organism["label"],
+        "Parent": "|".join(organism["parents"]),
+        "Taxonomic Rank": organism["rank"],
+        "Alternative Term": "|".join(organism["synonyms"]),
+        "Domain": "taxon",
+    }
+
+
+def protein_row(protein):
+    """Return a protein.tsv row for a source protein record."""
+    return {
+        "Label": protein["label"],
+        "Parent": "protein",
+        "Alternative Term": "|".join(protein["alternative_terms"]),
+        "IEDB Term": protein["name"],
+        "Domain": "protein",
+        "In Taxon": protein["organism"],
+    }
+
+
+def get_organisms(conn, names=None, synonyms=None, new_only=False):
+    """Yield organism records, resolving extra parents from one name map."""
+    if names is None:
+        names = get_organism_names(conn)
+    if synonyms is None:
+        synonyms = get_synonyms(conn)
+    for row in fetch(conn, NEW_ORGANISMS_SQL if new_only else ORGANISMS_SQL):
+        yield organism_record(row, names, synonyms)
+
+
+def get_proteins(conn, new_only=False):
+    """Yield source protein records."""
+    for row in fetch(conn, NEW_PROTEINS_SQL if new_only else PROTEINS_SQL):
+        yield protein_record(row)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+#
+# A persistent map from IEDB organism and source IDs to ONTIE CURIEs.
+#
+# This replaces the organism_map.tsv and source_map.tsv files. The map is a
+# SQLite table keyed on (kind, IEDB ID) with an index on the CURIE, so
+# membership checks and reverse lookups do not scan the whole map, new
+# mappings are upserted in bulk, and concurrent loaders are serialized by
+# holding a write transaction while they assign IDs.
+
+import csv
+import sqlite3
+import sys
+
+from argparse import ArgumentParser
+from contextlib import contextmanager
+
+
+MAP_FILE = "src/ontology/iedb-map.db"
+
+# Headers of the TSV files the map replaces, for import and export
+KINDS = {
+    "organism": ["TAX_ID", "CURIE", "LABEL"],
+    "source": ["SOURCE_ID", "CURIE", "NAME"],
+}
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS iedb_map (
+  kind TEXT NOT NULL,
+  iedb_id INTEGER NOT NULL,
+  curie TEXT NOT NULL,
+  label TEXT,
+  PRIMARY KEY (kind, iedb_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_iedb_map_curie ON iedb_map (curie);
+"""
+
+GET_SQL = "SELECT curie FROM iedb_map WHERE kind = ? AND iedb_id = ?"
+CURIE_SQL = "SELECT kind, iedb_id, label FROM iedb_map WHERE curie = ?"
+EXPORT_SQL = "SELECT iedb_id, curie, label FROM iedb_map WHERE kind = ? ORDER BY iedb_id"
+UPSERT_SQL = """
+INSERT INTO iedb_map (kind, iedb_id, curie, label) VALUES (?, ?, ?, ?)
+ON CONFLICT (kind, iedb_id) DO UPDATE SET curie = excluded.curie, label = excluded.label
+"""
+
+
+class IEDBMap:
+    """Read and update a map file, creating it if it does not exist."""
+
+    def __init__(self, path=MAP_FILE, timeout=60):
+        # Autocommit unless inside transaction(), so readers never hold locks
+        self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.executescript(SCHEMA_SQL)
+
+    def get(self, kind, iedb_id):
+        """Return the CURIE for an IEDB ID, or None."""
+        row = self.conn.execute(GET_SQL, (kind, iedb_id)).fetchone()
+        return row[0] if row else None
+
+    def contains(self, kind, iedb_id):
+        return self.get(kind, iedb_id) is not None
+
+    def lookup_curie(self, curie):
+        """Return (kind, IEDB ID, label) for an ONTIE CURIE, or None."""
+        return self.conn.execute(CURIE_SQL, (curie,)).fetchone()
+
+    def upsert(self, kind, rows):
+        """Add or replace (IEDB ID, CURIE, label) rows. Return the row count."""
+        if kind not in KINDS:
+            raise Exception(f"Unknown IEDB map kind '{kind}'")
+        rows = [(kind, int(iedb_id), curie, label) for iedb_id, curie, label in rows]
+        if not rows:
+            return 0
+        if self.conn.in_transaction:
+            self.conn.executemany(UPSERT_SQL, rows)
+        else:
+            with self.transaction():
+                self.conn.executemany(UPSERT_SQL, rows)
+        return len(rows)
+
+    def rows(self, kind):
+        """Yield (IEDB ID, CURIE, label) rows in IEDB ID order."""
+        yield from self.conn.execute(EXPORT_SQL, (kind,))
+
+    @contextmanager
+    def transaction(self):
+        """Hold the write lock until the block ends, then commit,
+        or roll back if it raises."""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read_tsv(path):
+    """Yield (IEDB ID, CURIE, label) rows from an organism_map.tsv or source_map.tsv."""
+    with open(path, "r") as f:
+        reader = csv.reader(f, delimiter="\t")
+        next(reader)
+        for row in reader:
+            if row:
+                yield int(row[0]), row[1], row[2] if len(row) > 2 else None
+
+
+def main():
+    p = ArgumentParser(description="Query or update the map of IEDB IDs to ONTIE CURIEs")
+    p.add_argument("-m", "--map", default=MAP_FILE, help="The map file")
+    sub = p.add_subparsers(dest="command", required=True)
+    i = sub.add_parser("import", help="Add the rows of an organism_map.tsv or source_map.tsv")
+    i.add_argument("kind", choices=KINDS)
+    i.add_argument("tsv")
+    e = sub.add_parser("export", help="Write the map for one kind as TSV")
+    e.add_argument("kind", choices=KINDS)
+    q = sub.add_parser("lookup", help="Look up IEDB IDs")
+    q.add_argument("kind", choices=KINDS)
+    q.add_argument("ids", nargs="+", type=int)
+    r = sub.add_parser("reverse", help="Look up ONTIE CURIEs")
+    r.add_argument("curies", nargs="+")
+    args = p.parse_args()
+
+    with IEDBMap(args.map) as iedb_map:
+        if args.command == "import":
+            count = iedb_map.upsert(args.kind, read_tsv(args.tsv))
+            print(f"Imported {count} {args.kind} mappings", file=sys.stderr)
+        elif args.command == "export":
+            writer = csv.writer(sys.stdout, delimiter="\t", lineterminator="\n")
+            writer.writerow(KINDS[args.kind])
+            writer.writerows(iedb_map.rows(args.kind))
+        elif args.command == "lookup":
+            for iedb_id in args.ids:
+                print(f"{iedb_id}\t{iedb_map.get(args.kind, iedb_id) or ''}")
+        else:
+            for curie in args.curies:
+                found = iedb_map.lookup_curie(curie)
+                if found:
+                    kind, iedb_id, label = found
+                    print(f"{curie}\t{kind}\t{iedb_id}\t{label or ''}")
+                else:
+                    print(f"{curie}\t\t\t")
+
+
+if __name__ == "__main__":
+    main()
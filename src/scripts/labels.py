@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+#
+# A persisted index from labels and synonyms to CURIEs, shared by the QC and
+# editing scripts.
+#
+# The index is built from index.tsv, external.tsv and predicates.tsv, the
+# Alternative Term columns of the other templates, and the rdfs:label and
+# synonym statements of any import databases (build/doid.db, build/obi.db).
+# Keys are case-folded so near misses can be found; a name resolves when it
+# matches a label exactly, as ROBOT template requires. Case-only and synonym
+# matches are reported with the label to use instead.
+#
+# `labels.py check` reports every unresolvable name in the templates in one
+# problems table (the same format as report.py), before running ROBOT.
+
+import csv
+import os
+import sqlite3
+import sys
+
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import templates
+
+from templates import idx_to_a1
+
+
+INDEX_FILE = "build/labels.db"
+PREFIXES_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prefixes.sql")
+
+# Templates that define CURIEs for labels, in priority order
+DEFINING_TABLES = ["index", "predicates", "external"]
+
+# Statements in import databases that give labels and synonyms
+IMPORT_PREDICATES = {
+    "rdfs:label": "label",
+    "IAO:0000118": "synonym",
+    "oio:hasExactSynonym": "synonym",
+}
+
+SCHEMA_SQL = """
+DROP TABLE IF EXISTS labels;
+DROP TABLE IF EXISTS sources;
+CREATE TABLE labels (
+  key TEXT NOT NULL,
+  label TEXT NOT NULL,
+  curie TEXT NOT NULL,
+  kind TEXT NOT NULL,
+  source TEXT NOT NULL
+);
+CREATE TABLE sources (
+  path TEXT PRIMARY KEY,
+  kind TEXT NOT NULL,
+  mtime REAL,
+  size INTEGER
+);
+"""
+INDEX_SQL = [
+    "CREATE INDEX idx_labels_key ON labels (key)",
+    "CREATE INDEX idx_labels_curie ON labels (curie)",
+]
+INSERT_SQL = "INSERT INTO labels VALUES (?, ?, ?, ?, ?)"
+SOURCE_SQL = "INSERT INTO sources VALUES (?, ?, ?, ?)"
+IMPORT_SQL = """SELECT subject, predicate, value FROM statements
+WHERE predicate IN ({}) AND value IS NOT NULL AND subject NOT LIKE '\\_:%' ESCAPE '\\'"""
+KEY_SQL = "SELECT key, label, curie, kind FROM labels WHERE key IN ({})"
+CURIE_SQL = "SELECT label FROM labels WHERE curie = ? AND kind = 'label' LIMIT 1"
+
+
+def fold(name):
+    return name.strip().casefold()
+
+
+def stamp(path):
+    st = os.stat(path)
+    return st.st_mtime, st.st_size
+
+
+def read_prefixes():
+    conn = sqlite3.connect(":memory:")
+    with open(PREFIXES_SQL) as f:
+        conn.executescript(f.read())
+    prefixes = {row[0] for row in conn.execute("SELECT prefix FROM prefix")}
+    conn.close()
+    return prefixes
+
+
+def template_rows(tables):
+    """Yield (label, CURIE, kind, source) rows from the templates."""
+    curies = {}
+    for name in DEFINING_TABLES:
+        table = tables[name]
+        for row in table.rows:
+            curie = row.get("ID")
+            label = row.get("Label")
+            if not curie or not label:
+                continue
+            curies.setdefault(label, curie)
+            yield label, curie, "label", name
+            for synonym in (row.get("Synonyms") or "").split("|"):
+                if synonym.strip():
+                    yield synonym.strip(), curie, "synonym", name
+    # Other templates are keyed by label and take their CURIE from index.tsv
+    for name, table in tables.items():
+        if name in DEFINING_TABLES or "Alternative Term" not in table.headers:
+            continue
+        for row in table.rows:
+            curie = curies.get(row.get("Label"))
+            if not curie:
+                continue
+            for synonym in (row.get("Alternative Term") or "").split("|"):
+                if synonym.strip():
+                    yield synonym.strip(), curie, "synonym", name
+
+
+def import_rows(path):
+    """Yield (label, CURIE, kind, source) rows from an rdftab database."""
+    source = os.path.splitext(os.path.basename(path))[0]
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        sql = IMPORT_SQL.format(", ".join("?" for _ in IMPORT_PREDICATES))
+        for subject, predicate, value in conn.execute(sql, list(IMPORT_PREDICATES)):
+            yield value, subject, IMPORT_PREDICATES[predicate], source
+    finally:
+        conn.close()
+
+
+def build(path=INDEX_FILE, template_dir=templates.TEMPLATE_DIR, resources=None):
+    """Write a new index from the templates and the given import databases."""
+    tables = templates.read_tables(template_dir=template_dir)
+    sources = [(table.path, "template") for table in tables.values()]
+    sources += [(resource, "import") for resource in resources or []]
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    conn.executescript(SCHEMA_SQL)
+    rows = template_rows(tables)
+    conn.executemany(INSERT_SQL, ((fold(l), l, c, k, s) for l, c, k, s in rows))
+    for resource in resources or []:
+        rows = import_rows(resource)
+        conn.executemany(INSERT_SQL, ((fold(l), l, c, k, s) for l, c, k, s in rows))
+    conn.executemany(SOURCE_SQL, ((s, k) + stamp(s) for s, k in sources))
+    for sql in INDEX_SQL:
+        conn.execute(sql)
+    conn.commit()
+    conn.close()
+    os.replace(tmp, path)
+
+
+def recorded_sources(path):
+    """Return a dict from each source path of an index to its kind ("template"
+    or "import") and (mtime, size) when it was built, or None if the index
+    cannot be read."""
+    if not os.path.exists(path):
+        return None
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return {row[0]: (row[1], tuple(row[2:])) for row in conn.execute("SELECT path, kind, mtime, size FROM sources")}
+    except sqlite3.Error:
+        return None
+    finally:
+        conn.close()
+
+
+def recorded_imports(path):
+    """Return the import databases an index was built from."""
+    built = recorded_sources(path) or {}
+    return sorted(p for p, (kind, _) in built.items() if kind == "import")
+
+
+def template_paths(template_dir):
+    return {templates.table_path(name, template_dir) for name in templates.SHEETS}
+
+
+def is_current(path, template_dir=templates.TEMPLATE_DIR, resources=None):
+    """Return True if the index exists and was built from these unchanged sources.
+    When resources is None, the import databases it was built from are used."""
+    built = recorded_sources(path)
+    if built is None:
+        return False
+    if {p for p, (kind, _) in built.items() if kind == "template"} != template_paths(template_dir):
+        return False
+    if resources is not None and set(recorded_imports(path)) != set(resources):
+        return False
+    return all(os.path.exists(p) and built[p][1] == stamp(p) for p in built)
+
+
+class Match:
+    """The result of resolving a name: the CURIE if it resolves, and
+    otherwise the closest label to suggest, if any."""
+
+    def __init__(self, name, curie=None, label=None, kind=None):
+        self.name = name
+        self.curie = curie
+        self.label = label
+        # "exact", "curie", "iri", "case", "synonym", "ambiguous" or None
+        self.kind = kind
+
+    @property
+    def resolved(self):
+        return self.kind in ("exact", "curie", "iri")
+
+
+class LabelIndex:
+    """Read-only access to a label index file."""
+
+    def __init__(self, path=INDEX_FILE):
+        self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        self.prefixes = read_prefixes()
+
+    @classmethod
+    def load(cls, path=INDEX_FILE, template_dir=templates.TEMPLATE_DIR, resources=None):
+        """Open the index, rebuilding it first if any source has changed."""
+        if not is_current(path, template_dir, resources):
+            if resources is None:
+                # Keep the import databases the index was last built from
+                resources = [p for p in recorded_imports(path) if os.path.exists(p)]
+            build(path, template_dir, resources)
+        return cls(path)
+
+    def is_curie(self, name):
+        prefix, _, local = name.partition(":")
+        return bool(local) and prefix in self.prefixes and " " not in name
+
+    def label(self, curie):
+        row = self.conn.execute(CURIE_SQL, (curie,)).fetchone()
+        return row[0] if row else None
+
+    def resolve(self, name):
+        return self.resolve_all([name])[name]
+
+    def resolve_all(self, names, size=500):
+        """Return a dict from each name to its Match, with one query per batch."""
+        names = list(dict.fromkeys(names))
+        candidates = {}
+        keys = sorted({fold(name) for name in names})
+        for i in range(0, len(keys), size):
+            batch = keys[i:i + size]
+            sql = KEY_SQL.format(", ".join("?" for _ in batch))
+            for key, label, curie, kind in self.conn.execute(sql, batch):
+                candidates.setdefault(key, []).append((label, curie, kind))
+        return {name: self.match(name, candidates.get(fold(name), [])) for name in names}
+
+    def match(self, name, candidates):
+        if "://" in name:
+            return Match(name, name, None, "iri")
+        if self.is_curie(name):
+            return Match(name, name, self.label(name), "curie")
+        for kind, test in [
+            ("exact", lambda l, k: k == "label" and l == name),
+            ("case", lambda l, k: k == "label"),
+            ("synonym", lambda l, k: k == "synonym"),
+        ]:
+            found = {curie: label for label, curie, k in candidates if test(label, k)}
+            if len(found) == 1:
+                curie = next(iter(found))
+                label = found[curie] if kind == "exact" else self.label(curie) or found[curie]
+                return Match(name, curie, label, kind)
+            if len(found) > 1:
+                if kind == "exact":
+                    # Duplicate labels are reported by report.py; ROBOT uses one
+                    return Match(name, sorted(found)[0], name, kind)
+                return Match(name, None, None, "ambiguous")
+        return Match(name)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def check(tables, index):
+    """Return problems for every name in a reference column that does not
+    resolve to a CURIE, in the report.py problems format."""
+    refs = []
+    for name, table in tables.items():
+        for number, header, ref in templates.references(table):
+            refs.append((table, number, header, ref))
+    matches = index.resolve_all(ref for _, _, _, ref in refs)
+    problems = []
+    for table, number, header, ref in refs:
+        match = matches[ref]
+        if match.resolved:
+            continue
+        problem = {
+            "table": table.path,
+            "cell": idx_to_a1(number, table.headers.index(header) + 1),
+            "level": "error",
+            "rule ID": "ONTIE:unresolved_label",
+            "rule": "unresolved label",
+        }
+        if match.kind == "case":
+            problem["message"] = f"'{ref}' only matches '{match.label}' ignoring case"
+            problem["suggestion"] = match.label
+        elif match.kind == "synonym":
+            problem["message"] = f"'{ref}' is a synonym of '{match.label}' ({match.curie})"
+            problem["suggestion"] = match.label
+        elif match.kind == "ambiguous":
+            problem["message"] = f"'{ref}' matches more than one term ignoring case or as a synonym"
+        else:
+            problem["message"] = f"'{ref}' is not the label of any term; add it to external.tsv or fix the label"
+        problems.append(problem)
+    return problems
+
+
+def main():
+    p = ArgumentParser(description="Build or query the label index")
+    p.add_argument("-i", "--index", default=INDEX_FILE, help="The index file")
+    p.add_argument("-t", "--templates", default=templates.TEMPLATE_DIR, help="Template directory")
+    p.add_argument(
+        "-r",
+        "--resource",
+        action="append",
+        help="Import database (rdftab); lookup and check keep the ones the index was built from by default",
+    )
+    sub = p.add_subparsers(dest="command", required=True)
+    sub.add_parser("build", help="Rebuild the index")
+    q = sub.add_parser("lookup", help="Resolve labels or synonyms to CURIEs")
+    q.add_argument("names", nargs="+")
+    c = sub.add_parser("check", help="Report names in the templates that do not resolve")
+    c.add_argument("-o", "--output", help="Write the problems table here instead of stdout")
+    args = p.parse_args()
+
+    if args.command == "build":
+        build(args.index, args.templates, args.resource)
+        return
+
+    with LabelIndex.load(args.index, args.templates, args.resource) as index:
+        if args.command == "lookup":
+            for name, match in index.resolve_all(args.names).items():
+                print(f"{name}\t{match.curie or ''}\t{match.label or ''}\t{match.kind or ''}")
+            return
+
+        tables = templates.read_tables(template_dir=args.templates)
+        problems = check(tables, index)
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        writer = csv.DictWriter(
+            out,
+            fieldnames=["table", "cell", "level", "rule ID", "rule", "message", "suggestion"],
+            delimiter="\t",
+            lineterminator="\n",
+        )
+        writer.writeheader()
+        writer.writerows(problems)
+    finally:
+        if args.output:
+            out.close()
+    print(f"{len(problems)} unresolved labels", file=sys.stderr)
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+#
+# Check the templates for the errors ROBOT template most often stops on,
+# without starting the JVM:
+#
+# - template strings ROBOT does not know, or whose properties do not resolve
+# - rows with no LABEL
+# - empty or padded values in SPLIT= columns, and split characters in
+#   columns that are not split
+# - typed annotations (AT ...^^xsd:boolean etc.) with invalid values
+# - class and IRI cells (C, SC, EC, AI, ...) that do not resolve to a term
+#
+# Problems are written in the same table format as ROBOT's --errors output
+# and report.py, so COGS can apply them. When there are none, the build can
+# skip the separate `robot template --errors` run.
+#
+# The exit status is 0 when there are no problems and PROBLEMS_STATUS when
+# there are, so that the build can tell problems from a crash (status 1) or a
+# usage error (status 2).
+
+import csv
+import re
+import sys
+
+from argparse import ArgumentParser
+
+import templates
+
+from labels import INDEX_FILE, LabelIndex
+from templates import idx_to_a1
+
+
+# Exit status when problems were found and written
+PROBLEMS_STATUS = 3
+
+# Template string types ROBOT template accepts, by their first word
+KNOWN_TYPES = {
+    "ID", "LABEL", "TYPE", "CLASS_TYPE", "PROPERTY_TYPE", "INDIVIDUAL_TYPE",
+    "DOMAIN", "RANGE", "CHARACTERISTIC",
+    "A", "AT", "AL", "AI", ">A", ">AT", ">AL", ">AI",
+    "C", "SC", "EC", "DC", "CI", "I", "SI", "EI", "DI", "SP", "EP", "DP", "IP", "P",
+}
+
+DATATYPES = {
+    "xsd:boolean": re.compile(r"^(true|false)$"),
+    "xsd:integer": re.compile(r"^[+-]?[0-9]+$"),
+    "xsd:nonNegativeInteger": re.compile(r"^\+?[0-9]+$"),
+    "xsd:decimal": re.compile(r"^[+-]?([0-9]+(\.[0-9]*)?|\.[0-9]+)$"),
+    "xsd:date": re.compile(r"^[0-9]{4}-[0-9]{2}-[0-9]{2}$"),
+}
+
+FIELDNAMES = ["table", "cell", "level", "rule ID", "rule", "message", "suggestion"]
+
+
+class Problems:
+    """Collect problem rows for one table."""
+
+    def __init__(self, table):
+        self.table = table
+        self.rows = []
+
+    def add(self, number, header, rule, message, suggestion=None, level="error"):
+        col = self.table.headers.index(header) + 1
+        self.rows.append(
+            {
+                "table": self.table.path,
+                "cell": idx_to_a1(number, col),
+                "level": level,
+                "rule ID": f"ROBOT:template/{rule}",
+                "rule": rule.replace("-", " "),
+                "message": message,
+                "suggestion": suggestion,
+            }
+        )
+
+
+def template_names(template):
+    """Return the property names in a template string that must resolve,
+    e.g. 'alternative term' in "A alternative term SPLIT=|"."""
+    column, _ = templates.column_type(template)
+    rest = template.split(" SPLIT=", 1)[0][len(column):].strip()
+    if column.lstrip(">") in ("A", "AI", "AT", "AL"):
+        return [re.split(r"\^\^|@", rest, 1)[0].strip()] if rest else []
+    if column in ("C", "SC", "EC", "DC") and rest != "%":
+        return re.findall(r"'([^']+)'", rest)
+    return []
+
+
+def check_table(table, lookups):
+    """Check one table. Return its problems, and add every name that must
+    resolve to lookups as name -> [(problems, row number, header)]."""
+    problems = Problems(table)
+    columns = {}
+    for header in table.headers:
+        template = table.template.get(header) or ""
+        column, split = templates.column_type(template)
+        columns[header] = (column, split, template)
+        if not template.strip():
+            continue
+        if column not in KNOWN_TYPES:
+            problems.add(2, header, "invalid-template-string", f"unknown template string '{template}'")
+            continue
+        for name in template_names(template):
+            lookups.setdefault(name, []).append((problems, 2, header))
+
+    label_header = next((h for h, c in columns.items() if c[0] == "LABEL"), None)
+    id_header = next((h for h, c in columns.items() if c[0] == "ID"), None)
+    for number, row in enumerate(table.rows, start=3):
+        if label_header and not (row.get(label_header) or "").strip():
+            if any((row.get(h) or "").strip() for h in table.headers):
+                problems.add(number, label_header, "missing-label", "add a label for this row")
+        elif label_header and not id_header:
+            # Rows without an ID column are found by label
+            lookups.setdefault(row[label_header].strip(), []).append((problems, number, label_header))
+
+        for header, (column, split, template) in columns.items():
+            value = row.get(header)
+            if not value or column not in KNOWN_TYPES:
+                continue
+            if split:
+                values = value.split(split)
+                if any(not v.strip() for v in values):
+                    problems.add(
+                        number,
+                        header,
+                        "split-error",
+                        f"remove the empty value between '{split}' separators",
+                        split.join(v.strip() for v in values if v.strip()),
+                    )
+                elif any(v != v.strip() for v in values):
+                    problems.add(
+                        number,
+                        header,
+                        "split-error",
+                        f"remove spaces around the '{split}' separators",
+                        split.join(v.strip() for v in values),
+                    )
+                values = [v.strip() for v in values if v.strip()]
+            else:
+                values = [value]
+                if "|" in value and column in templates.REFERENCE_TYPES:
+                    problems.add(
+                        number,
+                        header,
+                        "split-error",
+                        f"this column takes one value; '{template}' has no SPLIT=|",
+                    )
+                    continue
+
+            if column.lstrip(">") == "AT" and "^^" in template:
+                datatype = template.split(" SPLIT=", 1)[0].rsplit("^^", 1)[1].strip()
+                pattern = DATATYPES.get(datatype)
+                for v in values:
+                    if pattern and not pattern.match(v):
+                        suggestion = v.strip().lower() if pattern.match(v.strip().lower()) else None
+                        problems.add(
+                            number,
+                            header,
+                            "datatype-error",
+                            f"'{v}' is not a valid {datatype}",
+                            suggestion,
+                        )
+
+            if column in templates.REFERENCE_TYPES:
+                for v in values:
+                    for name in templates.cell_names(v):
+                        lookups.setdefault(name, []).append((problems, number, header))
+    return problems
+
+
+def check(tables, index):
+    """Return the problem rows for all tables."""
+    lookups = {}
+    all_problems = [check_table(table, lookups) for table in tables.values()]
+    for name, match in index.resolve_all(lookups).items():
+        if match.resolved:
+            continue
+        for problems, number, header in lookups[name]:
+            rule = "lookup-error"
+            if match.label:
+                message = f"'{name}' is not a label; did you mean '{match.label}'?"
+            elif match.kind == "ambiguous":
+                message = f"'{name}' is not a label, and matches more than one term as a synonym"
+            else:
+                message = f"'{name}' is not a label or IRI of any term"
+            if number == 2:
+                rule = "invalid-template-string"
+            problems.add(number, header, rule, message, match.label)
+    return [row for problems in all_problems for row in problems.rows]
+
+
+def main():
+    p = ArgumentParser(description="Check the templates for ROBOT template errors")
+    p.add_argument("-i", "--index", default=INDEX_FILE, help="The label index (see labels.py)")
+    p.add_argument("-t", "--templates", default=templates.TEMPLATE_DIR, help="Template directory")
+    p.add_argument("-o", "--output", help="Write the problems table here instead of stdout")
+    args = p.parse_args()
+
+    tables = templates.read_tables(template_dir=args.templates)
+    with LabelIndex.load(args.index, args.templates) as index:
+        problems = check(tables, index)
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        writer = csv.DictWriter(out, fieldnames=FIELDNAMES, delimiter="\t", lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(problems)
+    finally:
+        if args.output:
+            out.close()
+    print(f"{len(problems)} template problems", file=sys.stderr)
+    if problems:
+        sys.exit(PROBLEMS_STATUS)
+
+
+if __name__ == "__main__":
+    main()
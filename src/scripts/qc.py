@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+#
+# Run all template QC for `make apply` from one read of the templates:
+#
+# - report: the report.py checks and unresolved labels
+# - template: the preflight.py checks for ROBOT template errors
+# - valve: the VALVE rules in src/ontology/validation (validate.py)
+#
+# The phases run concurrently over the same Tables. Problems are merged into
+# one table with at most one problem per cell: the most severe, or else the
+# first by phase. Timing for each phase is printed at the end.
+#
+# ROBOT template itself can be run as a last phase with --robot, only when
+# the other template checks find no errors, as in build/template-problems.tsv.
+
+import csv
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import preflight
+import report
+import templates
+import validate
+
+from labels import INDEX_FILE, LabelIndex, check as check_labels
+from tracing import span
+
+
+VALIDATION_DIR = "src/ontology/validation"
+
+FIELDNAMES = ["table", "cell", "level", "rule ID", "rule", "message", "suggestion"]
+
+PHASES = ["template", "valve", "report"]
+
+# Lower is more severe; VALVE uses upper case levels
+LEVELS = {"error": 0, "warn": 1, "warning": 1, "info": 2}
+
+
+# Each phase opens its own connection to the label index
+
+def run_report(tables, index_path):
+    others = [table for name, table in tables.items() if name != "index"]
+    problems = report.report(tables["index"], others)
+    with LabelIndex(index_path) as index:
+        problems.extend(check_labels(tables, index))
+    return problems
+
+
+def run_template(tables, index_path):
+    with LabelIndex(index_path) as index:
+        return preflight.check(tables, index)
+
+
+def run_valve(tables, validation_dir):
+    validator = validate.Validator(validation_dir, validate.template_tables(tables))
+    problems = validator.validate()
+    for problem in problems:
+        problem["table"] = tables[problem["table"]].path
+    return problems
+
+
+def run_robot(command, tables):
+    """Run ROBOT template on the tables and return its --errors rows."""
+    with tempfile.TemporaryDirectory() as tmp:
+        errors = os.path.join(tmp, "errors.tsv")
+        args = shlex.split(command) + ["template"]
+        for table in tables.values():
+            args.extend(["--template", table.path])
+        args.extend(["--force", "true", "--errors", errors])
+        subprocess.run(args, check=False)
+        if not os.path.exists(errors):
+            return []
+        with open(errors) as f:
+            return list(csv.DictReader(f, delimiter="\t"))
+
+
+def merge(results):
+    """Merge the problems of each phase, keeping one problem per table and cell."""
+    merged = {}
+    for phase in PHASES + ["robot"]:
+        for problem in results.get(phase, []):
+            table = os.path.splitext(os.path.basename(problem["table"]))[0]
+            key = (table, problem["cell"])
+            level = LEVELS.get((problem.get("level") or "").lower(), 0)
+            if key not in merged or level < merged[key][0]:
+                merged[key] = (level, problem)
+    return [problem for _, problem in merged.values()]
+
+
+def timed(timings, phase, fn, *args):
+    began = time.perf_counter()
+    try:
+        with span(phase):
+            return fn(*args)
+    finally:
+        timings[phase] = time.perf_counter() - began
+
+
+def main():
+    p = ArgumentParser(description="Run the report, template and VALVE checks on the templates")
+    p.add_argument("-i", "--index", default=INDEX_FILE, help="The label index (see labels.py)")
+    p.add_argument("-t", "--templates", default=templates.TEMPLATE_DIR, help="Template directory")
+    p.add_argument("-v", "--validation", default=VALIDATION_DIR, help="VALVE configuration directory")
+    p.add_argument("-r", "--robot", help="ROBOT command to also run ROBOT template, e.g. 'java -jar build/robot.jar'")
+    p.add_argument("-o", "--output", help="Write the problems table here instead of stdout")
+    args = p.parse_args()
+
+    timings = {}
+    began = time.perf_counter()
+    tables = timed(timings, "parse", templates.read_tables, None, args.templates)
+    # Rebuild the label index first if the templates have changed
+    timed(timings, "labels", LabelIndex.load, args.index, args.templates).close()
+    results = {}
+    with ThreadPoolExecutor(max_workers=len(PHASES)) as executor:
+        futures = {
+            "report": executor.submit(timed, timings, "report", run_report, tables, args.index),
+            "template": executor.submit(timed, timings, "template", run_template, tables, args.index),
+            "valve": executor.submit(timed, timings, "valve", run_valve, tables, args.validation),
+        }
+        for phase, future in futures.items():
+            results[phase] = future.result()
+    if args.robot and not any(
+        (problem["level"] or "").lower() == "error" for problem in results["template"]
+    ):
+        results["robot"] = timed(timings, "robot", run_robot, args.robot, tables)
+
+    problems = timed(timings, "merge", merge, results)
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        writer = csv.DictWriter(
+            out, fieldnames=FIELDNAMES, delimiter="\t", lineterminator="\n", extrasaction="ignore"
+        )
+        writer.writeheader()
+        writer.writerows(problems)
+    finally:
+        if args.output:
+            out.close()
+
+    print("phase\tseconds\tproblems", file=sys.stderr)
+    for phase, seconds in timings.items():
+        count = len(results[phase]) if phase in results else ""
+        print(f"{phase}\t{seconds:.3f}\t{count}", file=sys.stderr)
+    print(f"total\t{time.perf_counter() - began:.3f}\t{len(problems)}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
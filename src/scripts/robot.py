@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+#
+# A thin client for the ROBOT server in RobotServer.java, which runs ROBOT
+# commands in one long-running JVM so that a build does not pay for a JVM
+# start and OWL API warm-up on every command, and keeps build/imports.ttl and
+# src/ontology/metadata.ttl loaded between commands.
+#
+#     robot.py start [--cache FILE ...]   compile and start the server
+#     robot.py stop                       stop the server
+#     robot.py status                     print the server port and timings
+#     robot.py ARGS...                    run `robot ARGS...`
+#
+# When the server is not running, ROBOT ARGS are run with `java -jar` as
+# usual. The time taken by each command is added to build/robot-timings.tsv.
+
+import json
+import os
+import socket
+import struct
+import subprocess
+import sys
+import time
+
+from argparse import ArgumentParser
+
+ROBOT_JAR = "build/robot.jar"
+SERVER_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "RobotServer.java")
+CLASS_DIR = "build/robot-server"
+SERVER_FILE = "build/robot-server.json"
+LOG_FILE = "build/robot-server.log"
+TIMINGS_FILE = "build/robot-timings.tsv"
+DEFAULT_CACHE = ["build/imports.ttl", "src/ontology/metadata.ttl"]
+
+# The commands RobotServer.java runs, for the timings
+COMMANDS = {
+    "annotate", "convert", "diff", "extract", "filter", "merge", "query", "reason",
+    "remove", "report", "template",
+}
+
+
+def read_server():
+    if not os.path.exists(SERVER_FILE):
+        return None
+    with open(SERVER_FILE) as f:
+        return json.load(f)
+
+
+def encode(value):
+    data = value.encode("utf-8")
+    return struct.pack(">i", len(data)) + data
+
+
+def read_exactly(conn, size):
+    data = b""
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("the ROBOT server closed the connection")
+        data += chunk
+    return data
+
+
+def request(port, args):
+    """Send ROBOT arguments to the server, copying its output to ours.
+    Return the exit code and the server time in milliseconds."""
+    with socket.create_connection(("127.0.0.1", port)) as conn:
+        message = encode(os.getcwd()) + struct.pack(">i", len(args))
+        message += b"".join(encode(arg) for arg in args)
+        conn.sendall(message)
+        streams = {1: sys.stdout.buffer, 2: sys.stderr.buffer}
+        while True:
+            kind = read_exactly(conn, 1)[0]
+            if kind == 0:
+                code, millis = struct.unpack(">iq", read_exactly(conn, 12))
+                sys.stdout.flush()
+                return code, millis
+            (size,) = struct.unpack(">i", read_exactly(conn, 4))
+            streams[kind].write(read_exactly(conn, size))
+            streams[kind].flush()
+
+
+def record_timing(mode, seconds, args, code):
+    commands = [arg for arg in args if arg in COMMANDS]
+    new = not os.path.exists(TIMINGS_FILE)
+    os.makedirs(os.path.dirname(TIMINGS_FILE), exist_ok=True)
+    with open(TIMINGS_FILE, "a") as f:
+        if new:
+            f.write("time\tmode\tseconds\texit\tcommands\n")
+        f.write(
+            f"{time.strftime('%Y-%m-%dT%H:%M:%S')}\t{mode}\t{seconds:.3f}\t{code}\t{' '.join(commands)}\n"
+        )
+
+
+def compile_server():
+    target = os.path.join(CLASS_DIR, "RobotServer.class")
+    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(SERVER_SOURCE):
+        return
+    os.makedirs(CLASS_DIR, exist_ok=True)
+    subprocess.run(["javac", "-cp", ROBOT_JAR, "-d", CLASS_DIR, SERVER_SOURCE], check=True)
+
+
+def start(cache, timeout=60):
+    server = read_server()
+    if server and is_running(server["port"]):
+        print(f"ROBOT server is already running on port {server['port']}", file=sys.stderr)
+        return
+    compile_server()
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    log = open(LOG_FILE, "a")
+    process = subprocess.Popen(
+        ["java", "-cp", os.pathsep.join([ROBOT_JAR, CLASS_DIR]), "RobotServer", str(port)] + cache,
+        stdout=log,
+        stderr=log,
+        start_new_session=True,
+    )
+    began = time.time()
+    while not is_running(port):
+        if process.poll() is not None or time.time() - began > timeout:
+            sys.exit(f"ERROR: the ROBOT server did not start; see {LOG_FILE}")
+        time.sleep(0.2)
+    with open(SERVER_FILE, "w") as f:
+        json.dump({"port": port, "pid": process.pid, "cache": cache}, f)
+    print(f"ROBOT server started on port {port}", file=sys.stderr)
+
+
+def is_running(port):
+    try:
+        socket.create_connection(("127.0.0.1", port), timeout=1).close()
+        return True
+    except OSError:
+        return False
+
+
+def stop():
+    server = read_server()
+    if server and is_running(server["port"]):
+        request(server["port"], ["shutdown"])
+        print("ROBOT server stopped", file=sys.stderr)
+    if os.path.exists(SERVER_FILE):
+        os.remove(SERVER_FILE)
+
+
+def status():
+    server = read_server()
+    if server and is_running(server["port"]):
+        print(f"ROBOT server running on port {server['port']} (pid {server['pid']})")
+        print(f"Cached: {', '.join(server['cache'])}")
+    else:
+        print("ROBOT server is not running")
+    if not os.path.exists(TIMINGS_FILE):
+        return
+    totals = {}
+    with open(TIMINGS_FILE) as f:
+        next(f)
+        for line in f:
+            _, mode, seconds, _, commands = line.rstrip("\n").split("\t")
+            count, total = totals.get((mode, commands), (0, 0.0))
+            totals[(mode, commands)] = (count + 1, total + float(seconds))
+    print("mode\tcommands\truns\tmean seconds")
+    for (mode, commands), (count, total) in sorted(totals.items()):
+        print(f"{mode}\t{commands}\t{count}\t{total / count:.2f}")
+
+
+def main():
+    args = sys.argv[1:]
+    if args and args[0] in ("start", "stop", "status"):
+        p = ArgumentParser(description="Manage the ROBOT server")
+        p.add_argument("command", choices=["start", "stop", "status"])
+        p.add_argument(
+            "-c", "--cache", action="append", help="Ontology to keep loaded (default: imports and metadata)"
+        )
+        opts = p.parse_args(args)
+        if opts.command == "start":
+            start(opts.cache or DEFAULT_CACHE)
+        elif opts.command == "stop":
+            stop()
+        else:
+            status()
+        return
+
+    began = time.perf_counter()
+    server = read_server()
+    if server and is_running(server["port"]):
+        code, _ = request(server["port"], args)
+        mode = "server"
+    else:
+        code = subprocess.run(["java", "-jar", ROBOT_JAR] + args).returncode
+        mode = "jvm"
+    record_timing(mode, time.perf_counter() - began, args, code)
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
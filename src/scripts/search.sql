@@ -0,0 +1,37 @@
+-- Full-text index of the labels, alternative terms and definitions in an
+-- rdftab statements database, used by the SoT search API (sot.py).
+--
+-- The index is contentless: the rowid of each entry is the rowid of its
+-- statement, so the subject, predicate and value are read from statements.
+-- Each statement fills the one column for its predicate, and bm25 ranks a
+-- match in a label above one in an alternative term or a definition.
+
+DROP TABLE IF EXISTS search;
+DROP VIEW IF EXISTS search_statements;
+
+CREATE VIRTUAL TABLE search USING fts5(
+  label,
+  synonym,
+  definition,
+  content = '',
+  tokenize = 'unicode61 remove_diacritics 2',
+  prefix = '2 3'
+);
+
+-- The index entry for each indexed statement, by stanza so that patches to
+-- the statements of some stanzas (ncbitaxon-refresh.py) can update the index
+CREATE VIEW search_statements AS
+SELECT rowid AS id,
+  stanza,
+  CASE WHEN predicate = 'rdfs:label' THEN value END AS label,
+  CASE WHEN predicate IN ('IAO:0000118', 'OBI:9991118') THEN value END AS synonym,
+  CASE WHEN predicate = 'IAO:0000115' THEN value END AS definition
+FROM statements
+WHERE predicate IN ('rdfs:label', 'IAO:0000118', 'OBI:9991118', 'IAO:0000115')
+  AND value IS NOT NULL;
+
+INSERT INTO search (rowid, label, synonym, definition)
+SELECT id, label, synonym, definition FROM search_statements;
+
+INSERT INTO search (search, rank) VALUES ('rank', 'bm25(10.0, 5.0, 1.0)');
+INSERT INTO search (search) VALUES ('optimize');
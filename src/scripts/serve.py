@@ -0,0 +1,499 @@
+#!/usr/bin/env python3
+#
+# Serve the IEDB SoT API (doc/api.md) from the databases in build/.
+
+import json
+import logging
+import re
+import tempfile
+
+from argparse import ArgumentParser
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, parse_qsl, quote, urlencode, urlsplit
+
+import sot
+
+
+TSV = "text/tab-separated-values; charset=utf-8"
+CONTENT_TYPES = {
+    "html": "text/html; charset=utf-8",
+    "ttl": "text/turtle; charset=utf-8",
+    "json": "application/ld+json; charset=utf-8",
+    "tsv": TSV,
+}
+
+# POST bodies larger than this are spooled to disk
+SPOOL_SIZE = 8 * 1024 * 1024
+
+
+class ChunkedWriter:
+    """A file-like object that buffers writes and sends them as HTTP chunks."""
+
+    def __init__(self, wfile, size=65536):
+        self.wfile = wfile
+        self.size = size
+        self.buffer = []
+        self.buffered = 0
+
+    def write(self, text):
+        data = text.encode("utf-8")
+        self.buffer.append(data)
+        self.buffered += len(data)
+        if self.buffered >= self.size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffered:
+            return
+        data = b"".join(self.buffer)
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.buffer = []
+        self.buffered = 0
+
+    def close(self):
+        self.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class BodyLines:
+    """Iterate over the lines of a request body. The body is read into a
+    temporary file first, in memory up to SPOOL_SIZE bytes, so that the
+    response is not written while the client is still sending: with a large
+    body, both sides would block on full socket buffers."""
+
+    def __init__(self, rfile, length):
+        self.file = tempfile.SpooledTemporaryFile(SPOOL_SIZE)
+        while length > 0:
+            data = rfile.read(min(length, 65536))
+            if not data:
+                break
+            self.file.write(data)
+            length -= len(data)
+        self.file.seek(0)
+
+    def __iter__(self):
+        for line in self.file:
+            yield line.decode("utf-8")
+
+    def close(self):
+        self.file.close()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "SoT"
+    # Headers and body are written separately; without TCP_NODELAY small
+    # responses on a kept-alive connection wait for the client's delayed ACK
+    disable_nagle_algorithm = True
+    sot = None
+    cache = None
+
+    def log_message(self, fmt, *args):
+        logging.info("%s %s", self.address_string(), fmt % args)
+
+    def do_GET(self):
+        self.route(None)
+
+    def do_POST(self):
+        body = BodyLines(self.rfile, int(self.headers.get("Content-Length") or 0))
+        try:
+            self.route(body)
+        finally:
+            body.close()
+
+    def route(self, body):
+        # Reopen rebuilt databases and drop the cached terms they changed
+        self.cache.refresh()
+        url = urlsplit(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+        path = url.path
+        if body is not None and params.get("method") != "GET":
+            self.send_text(405, "POST requires method=GET in the query string\n")
+            return
+
+        m = re.match(r"^/ontology/ONTIE_(\d+)(\.(html|ttl|json|tsv))?$", path)
+        if m:
+            fmt = m.group(3) or self.accept_format(params)
+            curie = "ONTIE:" + m.group(1)
+            self.term(["ONTIE"], curie, fmt, params, lambda ext: f"/ontology/ONTIE_{m.group(1)}.{ext}")
+            return
+        if path in ["/ontology", "/ontology/"]:
+            self.subjects("all", params, body)
+            return
+        if path == "/ontology/ONTIE":
+            self.subjects("ONTIE", params, body)
+            return
+        if path == "/":
+            self.send_text(200, sot.html_page("IEDB Source of Truth", self.resource_list()), "html")
+            return
+        if path in ["/resources", "/resources/"]:
+            self.send_text(200, sot.html_page("Resources", self.resource_list()), "html")
+            return
+
+        m = re.match(r"^/resources/([^/]+)(/(subjects|subject|predicates|search))?/?$", path)
+        if not m:
+            self.send_text(404, "Not found\n")
+            return
+        resource_name, action = m.group(1), m.group(3)
+        if not action or action == "subjects":
+            self.subjects(resource_name, params, body)
+        elif action == "subject":
+            subject = params.get("curie")
+            if not subject and params.get("iri"):
+                subject = self.sot.compact(params["iri"])
+            if not subject:
+                self.send_text(400, "A 'curie' or 'iri' parameter is required\n")
+                return
+
+            def href(ext):
+                return f"/resources/{resource_name}/subject?curie={quote(subject)}&format={ext}"
+
+            fmt = params.get("format") or self.accept_format(params)
+            self.term([resource_name], subject, fmt, params, href)
+        elif action == "search":
+            self.search(resource_name, params)
+        else:
+            self.predicates(resource_name, params)
+
+    def accept_format(self, params):
+        accept = self.headers.get("Accept", "")
+        if "text/turtle" in accept:
+            return "ttl"
+        if "json" in accept:
+            return "json"
+        if "tab-separated" in accept:
+            return "tsv"
+        return "html"
+
+    def resource_list(self):
+        items = [
+            f'<li><a href="/resources/{escape(name)}">{escape(name)}</a></li>'
+            for name in self.sot.resources
+        ]
+        items.append('<li><a href="/resources/all">all</a></li>')
+        return "<ul>\n" + "\n".join(items) + "\n</ul>"
+
+    def get_resources(self, name):
+        resources = self.sot.get_resources(name)
+        if resources is None:
+            self.send_text(404, f"Unknown resource '{name}'\n")
+        return resources
+
+    # Responses
+
+    def send_text(self, status, text, fmt=None, headers=None):
+        data = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", CONTENT_TYPES.get(fmt, "text/plain; charset=utf-8"))
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(data)
+
+    def send_not_modified(self, etag):
+        self.send_response(304)
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+    def start_stream(self, fmt, headers=None):
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPES[fmt])
+        self.send_header("Transfer-Encoding", "chunked")
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        return ChunkedWriter(self.wfile)
+
+    def send_tsv(self, columns, rows, show_headers=True, headers=None):
+        """Stream TSV rows as they are produced."""
+        out = self.start_stream("tsv", headers)
+        if show_headers:
+            out.write(sot.tsv_line([c[0] for c in columns]))
+        for row in rows:
+            out.write(sot.tsv_line(row))
+        out.close()
+
+    # Endpoints
+
+    def term(self, resource_names, subject, fmt, params, href):
+        resources = []
+        for name in resource_names:
+            rs = self.get_resources(name)
+            if rs is None:
+                return
+            resources.extend(rs)
+
+        # Representations are cached and validated by the ETag of their stanza
+        key = (fmt, self.path)
+        entry = self.cache.get(key)
+        if entry is not None:
+            etag = entry.etag
+        else:
+            etag, digests = self.cache.etag(resources, subject, key)
+        matches = [t.strip() for t in self.headers.get("If-None-Match", "").split(",")]
+        if etag in matches:
+            self.send_not_modified(etag)
+            return
+        if entry is None:
+            text = self.render_term(resources, subject, fmt, params, href)
+            if text is None:
+                self.send_text(404, f"Subject '{subject}' not found\n")
+                return
+            entry = sot.Rendered(subject, etag, digests, text)
+            self.cache.put(key, entry)
+        # "*" matches any representation, so only a term that exists
+        if "*" in matches:
+            self.send_not_modified(etag)
+            return
+        self.send_text(200, entry.text, fmt, {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept"})
+
+    def render_term(self, resources, subject, fmt, params, href):
+        """Return a term in a format, or None if it is not found."""
+        if fmt == "tsv":
+            select = params.get("select")
+            return self.sot.render_tsv(
+                resources,
+                subject,
+                select.split(",") if select else None,
+                params.get("compact") == "true",
+                params.get("show-headers") != "false",
+            )
+        statements = self.sot.get_stanza(resources, subject)
+        if not statements:
+            return None
+        if fmt == "ttl":
+            return self.sot.render_ttl(subject, statements)
+        if fmt == "json":
+            return self.sot.render_json(resources, subject, statements)
+        return self.sot.render_html(resources, subject, statements, href)
+
+    def subjects(self, resource_name, params, body):
+        resources = self.get_resources(resource_name)
+        if resources is None:
+            return
+        fmt = params.get("format") or ("tsv" if body is not None else "html")
+        compact = params.get("compact") == "true"
+        show_headers = params.get("show-headers") != "false"
+        select = params.get("select")
+
+        # Explicit subjects come from the POST body or a CURIE/IRI parameter
+        key, requested = None, None
+        next_href = None
+        if body is not None:
+            key, requested = sot.parse_body(body)
+            if key is None:
+                self.send_text(400, "The first line of the body must be 'CURIE' or 'IRI'\n")
+                return
+        else:
+            for k in ["CURIE", "IRI"]:
+                if k in params:
+                    key, requested = k, sot.parse_subject_list(params[k])
+                    if requested is None:
+                        self.send_text(400, f"Unsupported operator for {k}: '{params[k]}'\n")
+                        return
+
+        if requested is not None and not select and fmt == "tsv":
+            # Term status: resolve in batches and stream in request order
+            columns = sot.parse_select([key] + sot.STATUS_SELECT)
+            rows = self.sot.get_status(resources, key, requested, compact)
+            self.send_tsv(columns, rows, show_headers)
+            return
+
+        if requested is not None:
+            columns = sot.parse_select(select.split(",") if select else [key] + sot.STATUS_SELECT)
+            pairs = []
+            for r in requested:
+                subject = self.sot.compact(r) if key == "IRI" else r
+                pairs.append((r, subject))
+        else:
+            filters = []
+            for k, v in params.items():
+                if k in ["format", "select", "limit", "offset", "after", "show-headers", "compact", "method"]:
+                    continue
+                m = re.match(r"^(eq|like|iri\.eq|iri\.like)\.(.*)$", v)
+                predicate = self.sot.get_predicate(k)
+                if not m or not predicate:
+                    self.send_text(400, f"Invalid constraint: {k}={v}\n")
+                    return
+                filters.append((predicate, m.group(1), m.group(2)))
+            after = sot.decode_after(params.get("after", ""))
+            if after is None:
+                self.send_text(400, f"Invalid after token: {params['after']}\n")
+                return
+            columns = sot.parse_select(select.split(",") if select else sot.DEFAULT_SELECT)
+            if params.get("limit") == "all":
+                if fmt != "tsv":
+                    self.send_text(400, "limit=all requires format=tsv\n")
+                    return
+                self.export(resources, filters, after, columns, compact, show_headers)
+                return
+            page = self.get_page(params)
+            if page is None:
+                return
+            limit, offset = page
+            # One more than the limit, to know whether there is a next page
+            subjects = self.sot.find_subjects(resources, filters, limit + 1, offset, after)
+            if len(subjects) > limit:
+                subjects = subjects[:limit]
+                next_href = self.next_page(subjects[-1])
+            pairs = [(None, s) for s in subjects]
+
+        rows = (self.sot.get_row(resources, s, columns, compact, key=r) for r, s in pairs)
+        if fmt == "tsv":
+            headers = {"Link": f'<{next_href}>; rel="next"'} if next_href else None
+            self.send_tsv(columns, rows, show_headers, headers)
+        else:
+            self.send_html_table(resource_name, columns, pairs, rows, next_href)
+
+    def get_page(self, params):
+        """Return the limit, at most MAX_LIMIT, and offset of a page of
+        results, or send a 400 response and return None."""
+        try:
+            limit = min(int(params.get("limit", sot.DEFAULT_LIMIT)), sot.MAX_LIMIT)
+            offset = int(params.get("offset", 0))
+        except ValueError:
+            self.send_text(400, "limit and offset must be integers\n")
+            return None
+        if limit < 1 or offset < 0:
+            self.send_text(400, "limit must be at least 1 and offset must not be negative\n")
+            return None
+        return limit, offset
+
+    def next_page(self, subject):
+        """Return the URL of the page of results after a subject."""
+        url = urlsplit(self.path)
+        query = [(k, v) for k, v in parse_qsl(url.query, keep_blank_values=True) if k not in ["after", "offset"]]
+        query.append(("after", sot.encode_after(subject)))
+        return url.path + "?" + urlencode(query)
+
+    def export(self, resources, filters, after, columns, compact, show_headers):
+        """Stream every matching subject as TSV. Without filters, each
+        resource is read in one pass in subject order instead of with a
+        query for each subject."""
+        if filters:
+            subjects = self.sot.iterate_pages(resources, filters, after)
+            rows = (self.sot.get_row(resources, s, columns, compact) for s in subjects)
+        else:
+            rows = (
+                self.sot.make_row(resources, s, values, True, columns, compact)
+                for s, values in self.sot.iterate_subject_values(resources, after)
+            )
+        self.send_tsv(columns, rows, show_headers)
+
+    def search(self, resource_name, params):
+        resources = self.get_resources(resource_name)
+        if resources is None:
+            return
+        text = params.get("text", "").strip()
+        if not text:
+            self.send_text(400, "A 'text' parameter is required\n")
+            return
+        missing = [r.name for r in resources if not r.searchable]
+        if missing:
+            self.send_text(404, f"No search index for {', '.join(missing)}\n")
+            return
+        page = self.get_page(params)
+        if page is None:
+            return
+        limit, offset = page
+        results = self.sot.search(resources, text, limit, offset)
+
+        fmt = params.get("format") or "html"
+        if fmt == "json":
+            # For autocomplete: the ID, IRI, first label and score of each match
+            data = []
+            for subject, score in results:
+                labels = self.sot.get_labels(resources, subject)
+                data.append(
+                    {
+                        "id": subject,
+                        "iri": self.sot.expand(subject),
+                        "label": labels[0] if labels else "",
+                        "score": round(score, 3),
+                    }
+                )
+            self.send_text(200, json.dumps(data), "json")
+            return
+        compact = params.get("compact") == "true"
+        select = params.get("select")
+        columns = sot.parse_select(select.split(",") if select else sot.DEFAULT_SELECT)
+        pairs = [(None, s) for s, _ in results]
+        rows = (self.sot.get_row(resources, s, columns, compact) for _, s in pairs)
+        if fmt == "tsv":
+            self.send_tsv(columns, rows, params.get("show-headers") != "false")
+        else:
+            self.send_html_table(resource_name, columns, pairs, rows)
+
+    def send_html_table(self, resource_name, columns, pairs, rows, next_href=None):
+        out = self.start_stream("html")
+        out.write(sot.html_head("Subjects"))
+        out.write("<table>\n")
+        out.write("<tr>" + "".join(f"<th>{escape(c[0])}</th>" for c in columns) + "</tr>\n")
+        names = [c[0] for c in columns]
+        for (_, subject), row in zip(pairs, rows):
+            cells = []
+            for name, value in zip(names, row):
+                if name in ["IRI", "CURIE"]:
+                    label = row[names.index("label")] if "label" in names else ""
+                    href = self.sot.subject_href(resource_name, subject)
+                    text = f"{self.sot.compact(subject)} {label}".strip()
+                    cells.append(f'<td><a href="{escape(href)}">{escape(text)}</a></td>')
+                elif name == "label":
+                    cells.append(f'<td><span property="rdfs:label">{escape(value)}</span></td>')
+                else:
+                    cells.append(f"<td>{escape(value)}</td>")
+            out.write("<tr>" + "".join(cells) + "</tr>\n")
+        out.write("</table>\n")
+        if next_href:
+            out.write(f'<p><a href="{escape(next_href)}" rel="next">Next</a></p>\n')
+        out.write(sot.HTML_FOOT)
+        out.close()
+
+    def predicates(self, resource_name, params):
+        resources = self.get_resources(resource_name)
+        if resources is None:
+            return
+        predicates = set()
+        for resource in resources:
+            predicates.update(resource.predicates)
+        columns = sot.parse_select(["CURIE", "label"])
+        rows = [[p, self.sot.predicate_labels.get(p, "")] for p in sorted(predicates)]
+        if params.get("format") == "tsv":
+            self.send_tsv(columns, rows, params.get("show-headers") != "false")
+            return
+        items = [f"<li>{escape(p)} {escape(label)}</li>" for p, label in rows]
+        self.send_text(200, sot.html_page("Predicates", "<ul>\n" + "\n".join(items) + "\n</ul>"), "html")
+
+
+def main():
+    p = ArgumentParser()
+    p.add_argument("-d", "--build-dir", default="build", help="Directory containing resource .db files")
+    p.add_argument("-H", "--host", default="127.0.0.1", help="Host to bind")
+    p.add_argument("-p", "--port", type=int, default=3210, help="Port to bind")
+    p.add_argument("-c", "--connections", type=int, default=8, help="Connections per database")
+    p.add_argument(
+        "--cache-size", type=int, default=sot.RENDER_CACHE_SIZE, help="Rendered terms to cache (0 to disable)"
+    )
+    args = p.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    Handler.sot = sot.SoT(args.build_dir, args.connections)
+    Handler.cache = sot.RenderCache(Handler.sot, args.cache_size)
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    logging.info(f"Serving {', '.join(Handler.sot.resources)} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        Handler.sot.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1115 @@
+"""Query layer for the IEDB SoT API over rdftab statements databases.
+
+Each resource (ONTIE and each import) is a SQLite database in build/ loaded
+by rdftab. Connections are opened read-only and pooled per resource, and all
+queries are parameterized constant strings so SQLite can reuse the compiled
+statements from each connection's statement cache.
+
+Queries across resources ("all") either run on a pool of connections with
+every database attached, as one UNION ALL statement (Federation), or, for
+bulk lookups, on each resource at once in a thread pool.
+"""
+
+import base64
+import binascii
+import hashlib
+import heapq
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from html import escape
+from itertools import groupby, islice
+from urllib.parse import quote
+
+import taxmap
+
+
+# Database file stem -> resource name used in /resources/{name}
+RESOURCE_NAMES = {
+    "ontie": "ONTIE",
+    "ncbitaxon": "NCBITaxonomy",
+    "doid": "DOID",
+    "obi": "OBI",
+}
+
+# Obsolete NCBITaxon map in the build directory, see taxmap.py
+TAXMAP_FILE = "ncbitaxon.map"
+TAXMAP_RESOURCE = "NCBITaxonomy"
+
+# Predicates that can always be selected by label
+DEFAULT_PREDICATES = {
+    "type": "rdf:type",
+    "label": "rdfs:label",
+    "subclass of": "rdfs:subClassOf",
+    "obsolete": "owl:deprecated",
+    "replacement": "IAO:0100001",
+    "alternative term": "IAO:0000118",
+    "definition": "IAO:0000115",
+}
+
+DEFAULT_SELECT = ["IRI", "label", "obsolete", "replacement"]
+STATUS_SELECT = ["label", "recognized", "obsolete", "replacement"]
+TERM_SELECT = ["IRI", "label", "recognized", "obsolete", "replacement"]
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 10000
+
+# Requested subjects are resolved this many at a time
+STATUS_BATCH_SIZE = 5000
+
+# Databases SQLite can attach to one connection by default
+MAX_ATTACHED = 10
+
+# Seconds between checks for rebuilt databases
+RELOAD_INTERVAL = 1.0
+
+# Rendered term representations kept by RenderCache
+RENDER_CACHE_SIZE = 4096
+
+# Columns of the full-text search index (search.sql) for each predicate
+SEARCH_COLUMNS = {
+    "rdfs:label": "label",
+    "IAO:0000118": "synonym",
+    "OBI:9991118": "synonym",
+    "IAO:0000115": "definition",
+}
+
+PREFIX_SQL = "SELECT prefix, base FROM prefix"
+PREDICATES_SQL = "SELECT DISTINCT predicate FROM statements"
+STANZA_SQL = """SELECT subject, predicate, object, value, datatype, language
+FROM statements WHERE stanza = ?"""
+# The statements of a stanza with the labels of their objects, which are
+# everything its renderings depend on besides the prefixes and predicate labels.
+# Queries here do not LEFT JOIN statements, because SQLite materializes the
+# whole statements view of a compact database (compact.sql) to do that.
+DIGEST_SQL = """SELECT s.subject, s.predicate, s.object, s.value, s.datatype, s.language,
+  (SELECT group_concat(l.value, '|') FROM statements AS l
+   WHERE l.subject = s.object AND l.predicate = 'rdfs:label')
+FROM statements AS s
+WHERE s.stanza = ?
+ORDER BY 1, 2, 3, 4, 5, 6, 7"""
+SUBJECT_SQL = """SELECT predicate, object, value
+FROM statements WHERE subject = ?"""
+LABEL_SQL = """SELECT value FROM statements
+WHERE subject = ? AND predicate = 'rdfs:label'"""
+ALL_LABELS_SQL = "SELECT subject, value FROM statements WHERE predicate = 'rdfs:label'"
+# Subject queries return subjects after a given subject, in subject order, so
+# that pages start from the last subject of the previous page (keyset
+# pagination) and resources can be merged as they are read
+ALL_SUBJECTS_SQL = """SELECT DISTINCT subject FROM statements
+WHERE subject > ? AND subject NOT LIKE '\\_:%' ESCAPE '\\'
+ORDER BY subject"""
+SUBJECT_VALUES_SQL = """SELECT subject, predicate, object, value FROM statements
+WHERE subject > ? AND subject NOT LIKE '\\_:%' ESCAPE '\\'
+ORDER BY subject"""
+REQUESTED_CREATE_SQL = """CREATE TEMP TABLE IF NOT EXISTS requested (
+  idx INTEGER PRIMARY KEY,
+  subject TEXT NOT NULL
+)"""
+REQUESTED_CLEAR_SQL = "DELETE FROM temp.requested"
+REQUESTED_INSERT_SQL = "INSERT INTO temp.requested (idx, subject) VALUES (?, ?)"
+# Without statistics SQLite takes the requested table to be large, and for a
+# small batch on an analyzed database builds an automatic index on statements
+# instead of using idx_subject
+REQUESTED_ANALYZE_SQL = "ANALYZE temp.requested"
+# One join against statements for each batch of requested subjects,
+# grouped on the requested index so rows come back in request order.
+# Subjects that are not found have no row.
+STATUS_SQL = """SELECT r.idx,
+  group_concat(CASE WHEN s.predicate = 'rdfs:label' THEN s.value END, '|'),
+  max(CASE WHEN s.predicate = 'owl:deprecated' THEN s.value END),
+  min(CASE WHEN s.predicate = 'IAO:0100001' THEN s.object END)
+FROM temp.requested AS r
+JOIN statements AS s ON s.subject = r.subject
+GROUP BY r.idx
+ORDER BY r.idx"""
+SEARCHABLE_SQL = "SELECT 1 FROM sqlite_master WHERE name = 'search'"
+# Subjects ranked by their best match; bm25 is lower for better matches
+SEARCH_SQL = """SELECT s.subject, min(f.rank) AS score
+FROM search AS f
+JOIN statements AS s ON s.rowid = f.rowid
+WHERE search MATCH ? AND s.subject NOT LIKE '\\_:%' ESCAPE '\\'
+GROUP BY s.subject
+ORDER BY score, s.subject
+LIMIT ?"""
+# A LIKE filter checked only against the statements the index matches
+LIKE_SEARCH_SQL = """SELECT s.subject
+FROM search AS f
+JOIN statements AS s ON s.rowid = f.rowid
+WHERE search MATCH ? AND s.predicate = ? AND s.value LIKE ? AND s.subject > ?"""
+# The subjects after a subject matching one filter. The queries for the
+# filters of a request are joined with INTERSECT and then ORDER_SQL.
+FILTER_SQL = {
+    "eq": "SELECT subject FROM statements WHERE predicate = ? AND value = ? AND subject > ?",
+    "like": "SELECT subject FROM statements WHERE predicate = ? AND value LIKE ? AND subject > ?",
+    "iri.eq": "SELECT subject FROM statements WHERE predicate = ? AND object = ? AND subject > ?",
+    "iri.like": "SELECT subject FROM statements WHERE predicate = ? AND object LIKE ? AND subject > ?",
+}
+ORDER_SQL = " ORDER BY 1"
+
+
+class ConnectionPool:
+    """A bounded pool of read-only SQLite connections to one database."""
+
+    def __init__(self, path, size=8):
+        self.path = path
+        self.size = size
+        self.idle = queue.LifoQueue()
+        self.opened = 0
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def connect(self):
+        uri = "file:" + quote(os.path.abspath(self.path)) + "?mode=ro"
+        conn = sqlite3.connect(
+            uri, uri=True, check_same_thread=False, cached_statements=256
+        )
+        # mode=ro still allows TEMP tables, which bulk status lookups use
+        conn.execute("PRAGMA mmap_size = 268435456")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection, opening a new one while under the pool size."""
+        conn = None
+        try:
+            conn = self.idle.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                if self.opened < self.size:
+                    self.opened += 1
+                    conn = self.connect()
+            if conn is None:
+                conn = self.idle.get()
+        try:
+            yield conn
+        finally:
+            if self.closed:
+                conn.close()
+            else:
+                self.idle.put(conn)
+
+    def close(self):
+        self.closed = True
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class AttachedPool(ConnectionPool):
+    """A pool of connections to an in-memory database with several
+    databases attached read-only as r0, r1, ..."""
+
+    def __init__(self, paths, size=8):
+        super().__init__(":memory:", size)
+        self.paths = paths
+
+    def connect(self):
+        conn = sqlite3.connect(":memory:", uri=True, check_same_thread=False, cached_statements=256)
+        for i, path in enumerate(self.paths):
+            uri = "file:" + quote(os.path.abspath(path)) + "?mode=ro"
+            conn.execute(f"ATTACH DATABASE ? AS r{i}", (uri,))
+            conn.execute(f"PRAGMA r{i}.mmap_size = 268435456")
+        return conn
+
+
+class Federation:
+    """All resource databases attached to each connection of one pool, so
+    that a query runs on several of them as one statement: a UNION ALL of
+    the query on the statements table of each, in resource order."""
+
+    def __init__(self, resources, pool_size=8):
+        self.schemas = {r.name: f"r{i}" for i, r in enumerate(resources)}
+        self.pool = AttachedPool([r.path for r in resources], pool_size)
+        self.statements = {}
+
+    def union_all(self, resources, sql):
+        key = (sql, tuple(r.name for r in resources))
+        if key not in self.statements:
+            self.statements[key] = "\nUNION ALL\n".join(
+                re.sub(r"\bstatements\b", self.schemas[r.name] + ".statements", sql) for r in resources
+            )
+        return self.statements[key]
+
+    def execute(self, resources, sql, params=()):
+        """Return the rows of a query on each resource, in resource order.
+        SQLite runs the arms of a UNION ALL one after another."""
+        with self.pool.connection() as conn:
+            return conn.execute(self.union_all(resources, sql), tuple(params) * len(resources)).fetchall()
+
+    def close(self):
+        self.pool.close()
+
+
+def file_stamp(path):
+    st = os.stat(path)
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+class Resource:
+    """One ontology database and the predicate labels it defines."""
+
+    def __init__(self, name, path, pool_size=8):
+        self.name = name
+        self.path = path
+        self.pool_size = pool_size
+        self.open()
+
+    def connect(self):
+        """Open a pool on the database file and read its predicates. Return
+        the stamp, pool, predicates and searchable flag; raise sqlite3.Error
+        if the file is not a complete database."""
+        stamp = file_stamp(self.path)
+        pool = ConnectionPool(self.path, self.pool_size)
+        predicates = set()
+        try:
+            with pool.connection() as conn:
+                for (predicate,) in conn.execute(PREDICATES_SQL):
+                    predicates.add(predicate)
+                searchable = conn.execute(SEARCHABLE_SQL).fetchone() is not None
+        except sqlite3.Error:
+            pool.close()
+            raise
+        return stamp, pool, predicates, searchable
+
+    def open(self):
+        self.labels = None
+        self.stamp, self.pool, self.predicates, self.searchable = self.connect()
+
+    def changed(self):
+        """Return True if the database file has been replaced or modified since it was opened."""
+        try:
+            return file_stamp(self.path) != self.stamp
+        except FileNotFoundError:
+            # Being rebuilt; keep the open connections until the new file is there
+            return False
+
+    def reopen(self):
+        """Open a new pool on the rebuilt file and return True. Connections
+        borrowed from the old pool finish their queries and are closed when
+        released. If the new file cannot be read yet, keep the old pool and
+        return False, so that it is tried again at the next check."""
+        try:
+            stamp, pool, predicates, searchable = self.connect()
+        except (OSError, sqlite3.Error):
+            return False
+        old = self.pool
+        self.labels = None
+        self.stamp, self.pool, self.predicates, self.searchable = stamp, pool, predicates, searchable
+        old.close()
+        return True
+
+    def load_labels(self):
+        """Read every label at once, for bulk rendering, instead of querying
+        the labels of each term."""
+        labels = {}
+        for subject, label in self.iterate(ALL_LABELS_SQL):
+            labels.setdefault(subject, []).append(label)
+        self.labels = labels
+
+    def get_labels(self, subject):
+        if self.labels is not None:
+            return self.labels.get(subject, [])
+        return [label for (label,) in self.execute(LABEL_SQL, (subject,))]
+
+    def digest(self, subject):
+        """Return a hash of the stanza of a subject and the labels of its objects."""
+        h = hashlib.sha1()
+        for row in self.execute(DIGEST_SQL, (subject,)):
+            h.update(repr(row).encode("utf-8"))
+        return h.hexdigest()
+
+    def execute(self, sql, params=()):
+        with self.pool.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def status(self, subjects):
+        """Return (index, labels, obsolete, replacement) rows for the
+        subjects found from a batch of (index, subject) pairs, loaded into a
+        TEMP table and joined once."""
+        with self.pool.connection() as conn:
+            conn.execute(REQUESTED_CREATE_SQL)
+            conn.execute(REQUESTED_CLEAR_SQL)
+            conn.executemany(REQUESTED_INSERT_SQL, subjects)
+            conn.execute(REQUESTED_ANALYZE_SQL)
+            rows = conn.execute(STATUS_SQL).fetchall()
+            conn.execute(REQUESTED_CLEAR_SQL)
+            conn.commit()
+            return rows
+
+    def iterate(self, sql, params=(), size=1000):
+        """Yield rows from a query in batches without holding them all."""
+        with self.pool.connection() as conn:
+            cur = conn.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(size)
+                if not rows:
+                    break
+                yield from rows
+
+    def stream(self, sql, params=(), size=1000):
+        """Yield rows from a long-running query on a connection of its own,
+        so that the pool stays free for the queries made while the rows are
+        used."""
+        conn = self.pool.connect()
+        try:
+            cur = conn.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            conn.close()
+
+
+class SoT:
+    """All resources found in the build directory, plus shared prefixes and labels."""
+
+    def __init__(self, build_dir="build", pool_size=8):
+        self.resources = {}
+        paths = {}
+        for name in sorted(os.listdir(build_dir)):
+            stem, ext = os.path.splitext(name)
+            if ext == ".db":
+                paths[RESOURCE_NAMES.get(stem, stem)] = os.path.join(build_dir, name)
+        # ONTIE always comes first so its labels win in "all" queries
+        for name in sorted(paths, key=lambda n: (n != "ONTIE", n)):
+            self.resources[name] = Resource(name, paths[name], pool_size)
+        if not self.resources:
+            raise Exception(f"No .db files found in {build_dir}")
+        self.pool_size = pool_size
+        self.lock = threading.Lock()
+        self.checked = time.monotonic()
+        self.federation = self.federate()
+        # Bulk lookups run on every resource at once; threads are started
+        # as needed, up to one per pooled connection
+        self.executor = ThreadPoolExecutor(len(self.resources) * pool_size)
+
+        # The taxon map is reopened like the databases when it is rebuilt. A
+        # replaced map is closed when the last status lookup using it is done
+        self.taxmap = None
+        self.taxmap_stamp = None
+        self.taxmap_path = None
+        self.taxmap_users = {}
+        self.taxmap_lock = threading.Lock()
+        if TAXMAP_RESOURCE in self.resources:
+            self.taxmap_path = os.path.join(build_dir, TAXMAP_FILE)
+            if os.path.exists(self.taxmap_path):
+                self.taxmap_stamp = file_stamp(self.taxmap_path)
+                self.taxmap = taxmap.TaxMap(self.taxmap_path)
+        self.load_metadata()
+
+    def load_metadata(self):
+        """Load the prefixes and predicate labels of all resources, and set
+        metadata_digest to a hash of them."""
+        prefixes = []
+        for resource in self.resources.values():
+            for prefix, base in resource.execute(PREFIX_SQL):
+                if (prefix, base) not in prefixes:
+                    prefixes.append((prefix, base))
+        # Longest base first so the most specific prefix is used
+        prefixes.sort(key=lambda x: len(x[1]), reverse=True)
+
+        predicate_labels = {}
+        label_predicates = dict(DEFAULT_PREDICATES)
+        for label, predicate in DEFAULT_PREDICATES.items():
+            predicate_labels[predicate] = label
+        for resource in self.resources.values():
+            for predicate in resource.predicates:
+                if predicate in predicate_labels:
+                    continue
+                for (label,) in resource.execute(LABEL_SQL, (predicate,)):
+                    predicate_labels[predicate] = label
+                    label_predicates.setdefault(label, predicate)
+                    break
+
+        self.prefixes = prefixes
+        # The base of each prefix; the longest if a prefix has more than one
+        self.prefix_bases = {}
+        for prefix, base in prefixes:
+            self.prefix_bases.setdefault(prefix, base)
+        self.predicate_labels = predicate_labels
+        self.label_predicates = label_predicates
+        self.metadata_digest = hashlib.sha1(
+            repr((prefixes, sorted(predicate_labels.items()))).encode("utf-8")
+        ).hexdigest()
+
+    def federate(self):
+        """Return a Federation of all resources, or None if there is only
+        one or too many to attach."""
+        if 1 < len(self.resources) <= MAX_ATTACHED:
+            return Federation(list(self.resources.values()), self.pool_size)
+        return None
+
+    def execute(self, resources, sql, params=()):
+        """Return the rows of a query on each resource, in resource order."""
+        if self.federation and len(resources) > 1:
+            return self.federation.execute(resources, sql, params)
+        rows = []
+        for resource in resources:
+            rows.extend(resource.execute(sql, params))
+        return rows
+
+    def each_resource(self, resources, fn, *args):
+        """Return fn(resource, *args) for each resource, in resource order,
+        calling it for all of them at once when there are several."""
+        if len(resources) < 2:
+            return [fn(resource, *args) for resource in resources]
+        return list(self.executor.map(lambda resource: fn(resource, *args), resources))
+
+    def refresh(self):
+        """Reopen the databases that have been rebuilt, checking at most once
+        every RELOAD_INTERVAL seconds. Return the reopened resources."""
+        now = time.monotonic()
+        if now - self.checked < RELOAD_INTERVAL:
+            return []
+        with self.lock:
+            if now - self.checked < RELOAD_INTERVAL:
+                return []
+            self.checked = now
+            self.reopen_taxmap()
+            changed = [r for r in self.resources.values() if r.changed() and r.reopen()]
+            if changed:
+                self.load_metadata()
+                if self.federation:
+                    # Attach the new files; connections in use are closed when released
+                    self.federation.close()
+                    self.federation = self.federate()
+        return changed
+
+    def reopen_taxmap(self):
+        """Open the taxon map again if it has been rebuilt, keeping the old
+        one if the new file cannot be read yet."""
+        if not self.taxmap_path:
+            return
+        try:
+            stamp = file_stamp(self.taxmap_path)
+        except FileNotFoundError:
+            return
+        if stamp == self.taxmap_stamp:
+            return
+        try:
+            new = taxmap.TaxMap(self.taxmap_path)
+        except Exception:
+            # Not a complete map yet; try again at the next check
+            return
+        with self.taxmap_lock:
+            old = self.taxmap
+            self.taxmap = new
+            self.taxmap_stamp = stamp
+            if old and not self.taxmap_users.get(old):
+                old.close()
+
+    @contextmanager
+    def borrow_taxmap(self):
+        """Yield the current taxon map, or None, keeping it open until done."""
+        with self.taxmap_lock:
+            tm = self.taxmap
+            if tm:
+                self.taxmap_users[tm] = self.taxmap_users.get(tm, 0) + 1
+        try:
+            yield tm
+        finally:
+            if tm:
+                with self.taxmap_lock:
+                    self.taxmap_users[tm] -= 1
+                    if not self.taxmap_users[tm]:
+                        del self.taxmap_users[tm]
+                        if tm is not self.taxmap:
+                            tm.close()
+
+    def close(self):
+        for resource in self.resources.values():
+            resource.pool.close()
+        if self.federation:
+            self.federation.close()
+        self.executor.shutdown()
+        if self.taxmap:
+            self.taxmap.close()
+
+    def get_resources(self, name):
+        """Return the list of resources for a resource name, or 'all'."""
+        if name.lower() == "all":
+            return list(self.resources.values())
+        for resource_name, resource in self.resources.items():
+            if resource_name.lower() == name.lower():
+                return [resource]
+        return None
+
+    # CURIEs and IRIs
+
+    def expand(self, curie):
+        """Return the IRI for a CURIE, or the CURIE if the prefix is unknown."""
+        if not curie:
+            return curie
+        if curie.startswith("<") and curie.endswith(">"):
+            return curie[1:-1]
+        if ":" not in curie or curie.startswith("_:"):
+            return curie
+        prefix, local = curie.split(":", 1)
+        if prefix in self.prefix_bases:
+            return self.prefix_bases[prefix] + local
+        return curie
+
+    def compact(self, iri):
+        """Return the CURIE for an IRI, or the IRI in angle brackets."""
+        if not iri:
+            return iri
+        if iri.startswith("<") and iri.endswith(">"):
+            iri = iri[1:-1]
+        prefix, _, local = iri.partition(":")
+        if prefix in self.prefix_bases and not local.startswith("/"):
+            # Already a CURIE with a known prefix
+            return iri
+        for prefix, base in self.prefixes:
+            if iri.startswith(base):
+                return prefix + ":" + iri[len(base):]
+        if re.match(r"^[A-Za-z][\w.-]*:[^/]", iri):
+            # Already a CURIE
+            return iri
+        return "<" + iri + ">"
+
+    def predicate_label(self, predicate):
+        return self.predicate_labels.get(predicate, predicate)
+
+    def get_predicate(self, label):
+        """Resolve a predicate label or CURIE to a predicate CURIE."""
+        if label in self.label_predicates:
+            return self.label_predicates[label]
+        if ":" in label:
+            return self.compact(label)
+        return None
+
+    # Statements
+
+    def get_labels(self, resources, subject):
+        if any(resource.labels is not None for resource in resources):
+            found = [label for resource in resources for label in resource.get_labels(subject)]
+        else:
+            found = [label for (label,) in self.execute(resources, LABEL_SQL, (subject,))]
+        labels = []
+        for label in found:
+            if label not in labels:
+                labels.append(label)
+        return labels
+
+    def get_stanza(self, resources, subject):
+        """Return statement tuples for a subject stanza across resources."""
+        return self.execute(resources, STANZA_SQL, (subject,))
+
+    def get_subject(self, resources, subject):
+        """Return a dict from predicate to values for a subject, and whether
+        the subject was found in any resource."""
+        values = {}
+        rows = self.execute(resources, SUBJECT_SQL, (subject,))
+        for predicate, obj, value in rows:
+            add_value(values, predicate, obj, value)
+        return values, bool(rows)
+
+    def iterate_subject_values(self, resources, after=""):
+        """Yield (subject, values) for every subject after a subject, in
+        subject order, with the values as returned by get_subject. Each
+        resource is read in one pass over its subject index."""
+        streams = [resource.stream(SUBJECT_VALUES_SQL, (after,)) for resource in resources]
+        for subject, rows in groupby(heapq.merge(*streams, key=lambda row: row[0]), key=lambda row: row[0]):
+            values = {}
+            for _, predicate, obj, value in rows:
+                add_value(values, predicate, obj, value)
+            yield subject, values
+
+    # Subject queries
+
+    def find_subjects(self, resources, filters, limit=DEFAULT_LIMIT, offset=0, after=""):
+        """Return a sorted list of subjects matching all (predicate, operator,
+        object) filters that come after a subject, from the offset up to the
+        limit. A limit of None returns them all."""
+        subjects = self.iterate_subjects(resources, filters, after)
+        return list(islice(subjects, offset, None if limit is None else offset + limit))
+
+    def iterate_pages(self, resources, filters, after="", size=MAX_LIMIT):
+        """Yield every subject matching all filters that comes after a
+        subject, a page at a time, so no connection is held between pages."""
+        while True:
+            subjects = self.find_subjects(resources, filters, size, 0, after)
+            yield from subjects
+            if len(subjects) < size:
+                return
+            after = subjects[-1]
+
+    def iterate_subjects(self, resources, filters, after=""):
+        """Yield the subjects matching all filters that come after a subject,
+        in subject order and without duplicates, merging the resources as
+        they are read."""
+        streams = [self.iterate_resource_subjects(r, filters, after) for r in resources]
+        last = None
+        for subject in heapq.merge(*streams):
+            if subject != last:
+                yield subject
+                last = subject
+
+    def iterate_resource_subjects(self, resource, filters, after=""):
+        if not filters:
+            return (row[0] for row in resource.iterate(ALL_SUBJECTS_SQL, (after,)))
+        queries = []
+        params = []
+        for predicate, operator, obj in filters:
+            if operator.endswith("like"):
+                obj = obj.replace("*", "%")
+            if operator.startswith("iri."):
+                obj = self.compact(obj) if "%" not in obj else obj
+            query = None
+            if operator == "like" and resource.searchable and predicate in SEARCH_COLUMNS:
+                query = like_query(SEARCH_COLUMNS[predicate], obj)
+            if query:
+                queries.append(LIKE_SEARCH_SQL)
+                params.extend([query, predicate, obj, after])
+            else:
+                queries.append(FILTER_SQL[operator])
+                params.extend([predicate, obj, after])
+        sql = " INTERSECT ".join(queries) + ORDER_SQL
+        return (row[0] for row in resource.iterate(sql, params))
+
+    # Full-text search
+
+    def search(self, resources, text, limit=DEFAULT_LIMIT, offset=0):
+        """Return (subject, score) pairs for the subjects whose labels,
+        alternative terms or definitions match the words of the text, best
+        match first. Words ending in '*' match as prefixes. Scores are bm25
+        scores within each resource, negated so that higher is better."""
+        query = search_query(text)
+        if not query:
+            return []
+        scores = {}
+        results = self.each_resource(resources, Resource.execute, SEARCH_SQL, (query, offset + limit))
+        for rows in results:
+            for subject, score in rows:
+                if subject not in scores or score < scores[subject]:
+                    scores[subject] = score
+        ranked = sorted(scores.items(), key=lambda x: (x[1], x[0]))[offset:offset + limit]
+        return [(subject, -score) for subject, score in ranked]
+
+    # Term status
+
+    def get_status(self, resources, key, requested, compact=False):
+        """Yield [key, label, recognized, obsolete, replacement] rows for an
+        iterable of requested CURIEs or IRIs, in request order. Requests are
+        consumed in batches, so memory use does not grow with the input."""
+        use_taxmap = self.taxmap_path and self.resources[TAXMAP_RESOURCE] in resources
+        with self.borrow_taxmap() if use_taxmap else nullcontext() as tm:
+            yield from self.iterate_status(resources, key, requested, compact, tm)
+
+    def iterate_status(self, resources, key, requested, compact, tm):
+        """Yield the get_status rows, answering obsolete taxa from a taxon map."""
+        for batch in batched(requested, STATUS_BATCH_SIZE):
+            found = [False] * len(batch)
+            labels = [[] for _ in batch]
+            obsolete = [""] * len(batch)
+            replacement = [""] * len(batch)
+            subjects = []
+            for idx, r in enumerate(batch):
+                subject = self.compact(r) if key == "IRI" else r
+                if tm:
+                    # Obsolete taxa are answered from the map without SQLite
+                    repl = tm.lookup_curie(subject)
+                    if repl is not None:
+                        found[idx] = True
+                        labels[idx].append("obsolete taxon " + subject[10:])
+                        obsolete[idx] = "true"
+                        if repl != taxmap.DELETED:
+                            repl = f"NCBITaxon:{repl}"
+                            replacement[idx] = repl if compact else self.expand(repl)
+                        continue
+                subjects.append((idx, subject))
+            # Every resource is looked up at once, and the results are merged
+            # in resource order so that earlier resources take precedence
+            results = self.each_resource(resources, Resource.status, subjects) if subjects else []
+            for rows in results:
+                for idx, label, obs, repl in rows:
+                    found[idx] = True
+                    if label:
+                        for lbl in label.split("|"):
+                            if lbl not in labels[idx]:
+                                labels[idx].append(lbl)
+                    if obs and not obsolete[idx]:
+                        obsolete[idx] = obs
+                    if repl and not replacement[idx]:
+                        replacement[idx] = self.compact(repl) if compact else self.expand(repl)
+            for idx, requested_id in enumerate(batch):
+                yield [
+                    requested_id,
+                    "|".join(labels[idx]),
+                    "true" if found[idx] else "false",
+                    obsolete[idx],
+                    replacement[idx],
+                ]
+
+    # Table rows
+
+    def format_value(self, resources, cell, fmt, compact):
+        kind, value = cell
+        if kind == "value":
+            return value
+        if fmt == "label":
+            labels = self.get_labels(resources, value)
+            return labels[0] if labels else ""
+        if fmt == "CURIE" or (fmt is None and compact):
+            return self.compact(value)
+        return self.expand(value)
+
+    def get_row(self, resources, subject, columns, compact=False, key=None):
+        """Return a list of cell values for a subject. The key is the subject
+        as requested, used for the IRI or CURIE column when given."""
+        values, found = self.get_subject(resources, subject)
+        return self.make_row(resources, subject, values, found, columns, compact, key)
+
+    def make_row(self, resources, subject, values, found, columns, compact=False, key=None):
+        """Return a list of cell values for a subject from its values."""
+        row = []
+        for name, label, fmt in columns:
+            if name == "IRI":
+                row.append(key if key else self.expand(subject))
+            elif name == "CURIE":
+                row.append(key if key else self.compact(subject))
+            elif name == "recognized":
+                row.append("true" if found else "false")
+            elif name == "label":
+                row.append("|".join(v for _, v in values.get("rdfs:label", [])))
+            else:
+                predicate = self.get_predicate(label)
+                cells = values.get(predicate, [])
+                cells = [self.format_value(resources, c, fmt, compact) for c in cells]
+                row.append("|".join(sorted(c for c in cells if c is not None)))
+        return row
+
+    # Term rendering
+
+    def render_tsv(self, resources, subject, select=None, compact=False, show_headers=True):
+        """Render the TSV table of one term, with the TERM_SELECT columns by default."""
+        columns = parse_select(select or TERM_SELECT)
+        row = self.get_row(resources, subject, columns, compact)
+        lines = [tsv_line([c[0] for c in columns])] if show_headers else []
+        return "".join(lines + [tsv_line(row)])
+
+    def subject_href(self, resource_name, subject):
+        if subject.startswith("ONTIE:"):
+            return "/ontology/ONTIE_" + subject.split(":", 1)[1]
+        return f"/resources/{resource_name}/subject?curie={quote(subject)}"
+
+    def render_ttl(self, subject, statements):
+        """Render the statements of a stanza as Turtle, nesting blank nodes."""
+        by_subject = {}
+        for s, p, o, v, dt, lang in statements:
+            by_subject.setdefault(s, []).append((p, o, v, dt, lang))
+        used = set()
+
+        def term(curie):
+            if ":" in curie and not curie.startswith("<") and not curie.startswith("_:"):
+                used.add(curie.split(":", 1)[0])
+            return curie
+
+        def obj(o, v, dt, lang):
+            if o is None:
+                literal = '"' + v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+                if lang:
+                    return literal + "@" + lang
+                if dt and dt != "xsd:string":
+                    return literal + "^^" + term(dt)
+                return literal
+            if o.startswith("_:") and o in by_subject:
+                return "[ " + " ; ".join(
+                    term(p) + " " + obj(o2, v2, dt2, lang2)
+                    for p, o2, v2, dt2, lang2 in by_subject[o]
+                ) + " ]"
+            return term(o)
+
+        lines = [term(subject)]
+        sep = " "
+        for p, o, v, dt, lang in sorted(by_subject.get(subject, []), key=lambda x: x[0] != "rdf:type"):
+            lines.append(f"{sep} {term(p)} {obj(o, v, dt, lang)}")
+            sep = ";"
+        lines.append(".")
+        prefixes = [
+            f"@prefix {p}: <{b}> ." for p, b in sorted(self.prefixes) if p in used
+        ]
+        return "\n".join(prefixes) + "\n\n" + "\n".join(lines) + "\n"
+
+    def render_json(self, resources, subject, statements):
+        """Render the statements of a stanza as a JSON-LD object."""
+        by_subject = {}
+        for s, p, o, v, dt, lang in statements:
+            by_subject.setdefault(s, []).append((p, o, v, dt, lang))
+        context = {}
+
+        def node(s):
+            data = {}
+            for p, o, v, dt, lang in by_subject.get(s, []):
+                key = self.predicate_label(p)
+                context[key] = self.expand(p)
+                if o is None:
+                    value = {"@value": v}
+                    if lang:
+                        value["@language"] = lang
+                    elif dt and dt != "xsd:string":
+                        value["@type"] = dt
+                elif o.startswith("_:") and o in by_subject:
+                    value = node(o)
+                else:
+                    value = {"@id": self.compact(o), "iri": self.expand(o)}
+                    labels = self.get_labels(resources, o)
+                    if labels:
+                        value["label"] = labels[0]
+                if key in data:
+                    if not isinstance(data[key], list):
+                        data[key] = [data[key]]
+                    data[key].append(value)
+                else:
+                    data[key] = value
+            return data
+
+        data = {"@id": self.compact(subject), "iri": self.expand(subject)}
+        data.update(node(subject))
+        return json.dumps({"@context": context, **data})
+
+    def render_html(self, resources, subject, statements, base_href):
+        """Render the statements of a stanza as an HTML page with RDFa."""
+        labels = self.get_labels(resources, subject)
+        title = labels[0] if labels else subject
+        prefixes = "\n".join(f"prefix {p}: {b}" for p, b in self.prefixes)
+        html = [f'<ul prefixes="{escape(prefixes)}" resource="{escape(subject)}">']
+        for s, p, o, v, dt, lang in statements:
+            if s != subject:
+                continue
+            plabel = escape(self.predicate_label(p))
+            html.append("  <li>")
+            html.append(f'    <a href="{escape(self.expand(p))}">{plabel}</a>:')
+            if o is None:
+                html.append(f'    <span property="{escape(p)}">{escape(v)}</span>')
+            elif o.startswith("_:"):
+                html.append(f'    <span property="{escape(p)}">{escape(o)}</span>')
+            else:
+                olabels = self.get_labels(resources, o)
+                text = olabels[0] if olabels else self.compact(o)
+                html.append(
+                    f'    <a href="{escape(self.expand(o))}" property="{escape(p)}">{escape(text)}</a>'
+                )
+            html.append("  </li>")
+        html.append("</ul>")
+        html.append("<p>")
+        for name, ext in [("Turtle", "ttl"), ("JSON-LD", "json"), ("TSV", "tsv")]:
+            html.append(f'  <a href="{escape(base_href(ext))}">{name} ({ext})</a>')
+        html.append("</p>")
+        return html_page(title, "\n".join(html))
+
+
+class Rendered:
+    """A rendered term representation, its ETag, and the digest of the
+    subject's stanza in each resource it was rendered from."""
+
+    def __init__(self, subject, etag, digests, text):
+        self.subject = subject
+        self.etag = etag
+        self.digests = digests
+        self.text = text
+
+
+class RenderCache:
+    """A bounded LRU cache of rendered term representations.
+
+    ETags are a hash of the variant (format and request), the prefixes and
+    predicate labels, and the digest of the term's stanza in each resource,
+    so a term keeps its ETag across database rebuilds that do not change it.
+    When a database is rebuilt, only the entries whose stanza digests in that
+    database changed are dropped."""
+
+    def __init__(self, sot, size=RENDER_CACHE_SIZE):
+        self.sot = sot
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def etag(self, resources, subject, variant):
+        """Return the ETag and the stanza digests for a term variant."""
+        digests = {r.name: r.digest(subject) for r in resources}
+        return self.make_etag(variant, digests), digests
+
+    def make_etag(self, variant, digests):
+        h = hashlib.sha1(repr((variant, sorted(digests.items()))).encode("utf-8"))
+        h.update(self.sot.metadata_digest.encode("utf-8"))
+        return '"' + h.hexdigest()[:20] + '"'
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        if self.size <= 0:
+            return
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def refresh(self):
+        """Drop the entries for stanzas that changed in rebuilt databases."""
+        digest = self.sot.metadata_digest
+        changed = self.sot.refresh()
+        if not changed:
+            return
+        if self.sot.metadata_digest != digest:
+            with self.lock:
+                self.entries.clear()
+            return
+        with self.lock:
+            entries = list(self.entries.items())
+        stale = []
+        for key, entry in entries:
+            for resource in changed:
+                old = entry.digests.get(resource.name)
+                if old is not None and resource.digest(entry.subject) != old:
+                    stale.append(key)
+                    break
+        with self.lock:
+            for key in stale:
+                self.entries.pop(key, None)
+
+
+HTML_FOOT = """  </body>
+</html>
+"""
+
+
+def html_head(title):
+    return f"""<!DOCTYPE html>
+<html>
+  <head>
+    <meta charset="utf-8">
+    <title>{escape(title)}</title>
+  </head>
+  <body>
+    <h1>{escape(title)}</h1>
+"""
+
+
+def html_page(title, body):
+    return html_head(title) + body + "\n" + HTML_FOOT
+
+
+CELL_BREAKS = re.compile(r"[\t\r\n]+")
+
+
+def tsv_line(row):
+    """Join cells into a TSV line, replacing tabs and newlines inside cells."""
+    return "\t".join(CELL_BREAKS.sub(" ", c) if c else "" for c in row) + "\n"
+
+
+def parse_select(select):
+    """Parse a comma-separated select string into (name, predicate label,
+    value format) tuples, e.g. 'replacement [CURIE]'."""
+    columns = []
+    for name in select:
+        name = name.strip()
+        if not name:
+            continue
+        label = name
+        fmt = None
+        m = re.match(r"^(.+?)\s*\[(IRI|CURIE|label)\]$", name)
+        if m:
+            label, fmt = m.group(1), m.group(2)
+        columns.append((name, label, fmt))
+    return columns
+
+
+def parse_subject_list(value):
+    """Parse 'eq.X' or 'in.(X,Y)' / 'in.X Y' into a list of subjects."""
+    if value.startswith("eq."):
+        return [value[3:]]
+    if value.startswith("in."):
+        value = value[3:].strip()
+        if value.startswith("(") and value.endswith(")"):
+            value = value[1:-1]
+        return [x for x in re.split(r"[,\s]+", value) if x]
+    return None
+
+
+def add_value(values, predicate, obj, value):
+    """Add an object or literal value of a predicate to a dict from
+    predicate to values, once."""
+    cell = ("object", obj) if obj is not None else ("value", value)
+    pvs = values.setdefault(predicate, [])
+    if cell not in pvs:
+        pvs.append(cell)
+
+
+def encode_after(subject):
+    """Return the opaque token for the page after a subject."""
+    return base64.urlsafe_b64encode(subject.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_after(token):
+    """Return the subject for an 'after' token, or None if it is not valid."""
+    try:
+        return base64.b64decode(token + "=" * (-len(token) % 4), b"-_", validate=True).decode("utf-8")
+    except (binascii.Error, UnicodeDecodeError):
+        return None
+
+
+def search_query(text):
+    """Return an FTS5 query matching all words of the text, quoted so that
+    they are not read as operators. A trailing '*' makes a word a prefix."""
+    words = re.findall(r"[^\W_]+\*?", text)
+    return " ".join(f'"{w[:-1]}"*' if w.endswith("*") else f'"{w}"' for w in words)
+
+
+def like_query(column, pattern):
+    """Return an FTS5 query for one column of the search index that matches
+    every value the LIKE pattern matches, or None if there is none.
+
+    Only patterns that start with words can be narrowed by the index: the
+    words before the first wildcard must be the first words of the value,
+    the last of them possibly incomplete. The index also matches other case
+    and diacritics, so the results must still be checked with LIKE."""
+    literal = re.split(r"[%_]", pattern, 1)[0]
+    if not literal.isascii():
+        return None
+    words = re.findall(r"[A-Za-z0-9]+", literal)
+    if not words:
+        return None
+    return f'{column} : ^ "{" ".join(words)}" *'
+
+
+def batched(iterable, size):
+    """Yield lists of up to size items from an iterable."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def parse_body(lines):
+    """Parse a POSTed list of CURIEs or IRIs from an iterable of lines.
+    Return the key column and a generator over the remaining IDs."""
+    lines = (x.strip() for x in lines)
+    lines = (x for x in lines if x)
+    key = next(lines, None)
+    if key not in ["CURIE", "IRI"]:
+        return None, iter([])
+    return key, lines
@@ -0,0 +1,225 @@
+"""Streaming readers and writers for NCBI Taxonomy dump files.
+
+Dumps can be read as plain .dmp files, gzip-compressed files, or members of
+the taxdump.zip and taxdump.tar.gz archives. Rows are converted in batches
+and each batch is written with a single call, as Turtle, N-Triples, or rows
+in an rdftab-style statements table.
+"""
+
+import gzip
+import io
+import os
+import sqlite3
+import sys
+import tarfile
+import zipfile
+
+
+BATCH_SIZE = 10000
+
+NCBITAXON = "http://purl.obolibrary.org/obo/NCBITaxon_"
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+RDFS_LABEL = "http://www.w3.org/2000/01/rdf-schema#label"
+OWL_CLASS = "http://www.w3.org/2002/07/owl#Class"
+OWL_DEPRECATED = "http://www.w3.org/2002/07/owl#deprecated"
+XSD_BOOLEAN = "http://www.w3.org/2001/XMLSchema#boolean"
+IAO_REPLACEMENT = "http://purl.obolibrary.org/obo/IAO_0100001"
+
+TTL_PREFIXES = """@prefix rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#> .
+@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+@prefix xsd: <http://www.w3.org/2001/XMLSchema#> .
+@prefix owl: <http://www.w3.org/2002/07/owl#> .
+@prefix NCBITaxon: <http://purl.obolibrary.org/obo/NCBITaxon_> .
+@prefix IAO: <http://purl.obolibrary.org/obo/IAO_> .
+
+"""
+
+PREFIXES_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prefixes.sql")
+STATEMENTS_SQL = """CREATE TABLE IF NOT EXISTS statements (
+  stanza TEXT,
+  subject TEXT,
+  predicate TEXT,
+  object TEXT,
+  value TEXT,
+  datatype TEXT,
+  language TEXT
+)"""
+INSERT_SQL = "INSERT INTO statements VALUES (?, ?, ?, ?, ?, ?, ?)"
+# The same indexes the Makefile creates for build/%.db
+INDEX_SQL = [
+    "CREATE INDEX IF NOT EXISTS idx_stanza ON statements (stanza)",
+    "CREATE INDEX IF NOT EXISTS idx_subject ON statements (subject)",
+    "CREATE INDEX IF NOT EXISTS idx_predicate ON statements (predicate)",
+    "CREATE INDEX IF NOT EXISTS idx_object ON statements (object)",
+    "CREATE INDEX IF NOT EXISTS idx_value ON statements (value)",
+]
+
+FORMATS = {".ttl": "ttl", ".nt": "nt", ".db": "db"}
+
+
+def open_dump(path, member):
+    """Return a text stream over a dump, given a .dmp path, a .gz file,
+    a .zip or .tar.gz archive containing the member, or '-' for stdin."""
+    if path == "-":
+        return sys.stdin
+    if path.endswith(".zip"):
+        archive = zipfile.ZipFile(path)
+        return io.TextIOWrapper(archive.open(member), encoding="utf-8")
+    if path.endswith((".tar.gz", ".tgz", ".tar")):
+        archive = tarfile.open(path, "r:*")
+        return io.TextIOWrapper(archive.extractfile(member), encoding="utf-8")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def read_batches(lines, parse, size=BATCH_SIZE):
+    """Yield lists of parsed rows, skipping lines that parse to None."""
+    batch = []
+    for line in lines:
+        row = parse(line)
+        if row is None:
+            continue
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def parse_merged(line):
+    """Return (old taxid, new taxid) strings from a merged.dmp line."""
+    cells = line.split("|", 2)
+    if len(cells) < 2:
+        return None
+    old = cells[0].strip()
+    if not old:
+        return None
+    return old, cells[1].strip()
+
+
+def parse_delnodes(line):
+    """Return (taxid, None) from a delnodes.dmp line."""
+    taxid = line.strip().strip("|").strip()
+    if not taxid:
+        return None
+    return taxid, None
+
+
+def statements(rows):
+    """Yield statements table rows for (taxid, replacement) rows."""
+    for taxid, replacement in rows:
+        s = "NCBITaxon:" + taxid
+        yield s, s, "rdf:type", "owl:Class", None, None, None
+        yield s, s, "rdfs:label", None, "obsolete taxon " + taxid, "xsd:string", None
+        yield s, s, "owl:deprecated", None, "true", "xsd:boolean", None
+        if replacement:
+            yield s, s, "IAO:0100001", "NCBITaxon:" + replacement, None, None, None
+
+
+def output_format(path, fmt=None):
+    if fmt:
+        return fmt
+    ext = os.path.splitext(path)[1]
+    if ext not in FORMATS:
+        raise Exception(f"Cannot determine output format for '{path}'; use --format")
+    return FORMATS[ext]
+
+
+def open_writer(path, fmt):
+    if fmt == "ttl":
+        return TurtleWriter(path)
+    if fmt == "nt":
+        return NTriplesWriter(path)
+    if fmt == "db":
+        return StatementsWriter(path)
+    raise Exception(f"Unknown output format '{fmt}'")
+
+
+class TurtleWriter:
+    """Write one obsolete class stanza per taxon."""
+
+    def __init__(self, path):
+        self.out = open(path, "w", buffering=1 << 20)
+        self.out.write(TTL_PREFIXES)
+
+    def write(self, rows):
+        self.out.write("".join(self.stanza(taxid, repl) for taxid, repl in rows))
+
+    def stanza(self, taxid, replacement):
+        s = (
+            f"NCBITaxon:{taxid}\n"
+            "  rdf:type owl:Class ;\n"
+            f'  rdfs:label "obsolete taxon {taxid}" ;\n'
+            '  owl:deprecated "true"^^xsd:boolean'
+        )
+        if replacement:
+            return s + f" ;\n  IAO:0100001 NCBITaxon:{replacement} .\n\n"
+        return s + " .\n\n"
+
+    def close(self):
+        self.out.close()
+
+
+class NTriplesWriter:
+    """Write one line per triple with full IRIs."""
+
+    def __init__(self, path):
+        self.out = open(path, "w", buffering=1 << 20)
+
+    def write(self, rows):
+        self.out.write("".join(self.triples(taxid, repl) for taxid, repl in rows))
+
+    def triples(self, taxid, replacement):
+        s = f"<{NCBITAXON}{taxid}>"
+        t = (
+            f"{s} <{RDF_TYPE}> <{OWL_CLASS}> .\n"
+            f'{s} <{RDFS_LABEL}> "obsolete taxon {taxid}" .\n'
+            f'{s} <{OWL_DEPRECATED}> "true"^^<{XSD_BOOLEAN}> .\n'
+        )
+        if replacement:
+            t += f"{s} <{IAO_REPLACEMENT}> <{NCBITAXON}{replacement}> .\n"
+        return t
+
+    def close(self):
+        self.out.close()
+
+
+class StatementsWriter:
+    """Insert rows into an rdftab-style statements table, creating the
+    prefix table and indexes like the build/%.db rule in the Makefile."""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode = OFF")
+        self.conn.execute("PRAGMA synchronous = OFF")
+        with open(PREFIXES_SQL) as f:
+            self.conn.executescript(f.read())
+        self.conn.execute(STATEMENTS_SQL)
+
+    def write(self, rows):
+        self.conn.executemany(INSERT_SQL, statements(rows))
+
+    def close(self):
+        for sql in INDEX_SQL:
+            self.conn.execute(sql)
+        self.conn.commit()
+        self.conn.execute("ANALYZE")
+        self.conn.close()
+
+
+def convert(lines, parse, path, fmt=None, on_batch=None):
+    """Convert dump lines to the output path, batch by batch.
+    Call on_batch with each batch of rows, if given. Return the row count."""
+    writer = open_writer(path, output_format(path, fmt))
+    count = 0
+    try:
+        for batch in read_batches(lines, parse):
+            writer.write(batch)
+            if on_batch:
+                on_batch(batch)
+            count += len(batch)
+    finally:
+        writer.close()
+    return count
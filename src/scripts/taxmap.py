@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+#
+# A compact, memory-mappable map of obsolete NCBI Taxonomy IDs,
+# built from merged.dmp and delnodes.dmp.
+#
+# The file is a header followed by two little-endian uint32 arrays of equal
+# length: the sorted obsolete taxids, then the replacement taxid for each one
+# (0 when the taxon was deleted and has no replacement). Merge chains are
+# collapsed when the map is built, so a lookup is a single binary search.
+
+import mmap
+import struct
+import sys
+
+from argparse import ArgumentParser
+from array import array
+from bisect import bisect_left
+
+import taxdump
+
+
+MAGIC = b"TAXMAP01"
+HEADER = struct.Struct("<8sQ")
+DELETED = 0
+
+
+def read_merged(lines):
+    """Yield (old taxid, new taxid) pairs from merged.dmp lines."""
+    for line in lines:
+        cells = line.split("|")
+        if len(cells) < 2 or not cells[0].strip():
+            continue
+        yield int(cells[0]), int(cells[1])
+
+
+def read_delnodes(lines):
+    """Yield taxids from delnodes.dmp lines."""
+    for line in lines:
+        taxid = line.strip().strip("|").strip()
+        if taxid:
+            yield int(taxid)
+
+
+def collapse(merged, deleted):
+    """Given a dict of merged taxids and a set of deleted taxids, return a dict
+    from every obsolete taxid to its final replacement, or DELETED."""
+    resolved = {taxid: DELETED for taxid in deleted}
+    for start in merged:
+        if start in resolved:
+            continue
+        chain = []
+        taxid = start
+        while taxid in merged and taxid not in resolved:
+            if taxid in chain:
+                # Cycle in the dump: treat every member as having no replacement
+                resolved[taxid] = DELETED
+                break
+            chain.append(taxid)
+            taxid = merged[taxid]
+        if taxid in resolved:
+            final = resolved[taxid]
+        else:
+            final = taxid
+        for t in chain:
+            resolved[t] = final
+    return resolved
+
+
+def write(path, resolved):
+    """Write a resolved dict to a map file."""
+    taxids = array("I", sorted(resolved))
+    replacements = array("I", (resolved[t] for t in taxids))
+    if sys.byteorder == "big":
+        taxids.byteswap()
+        replacements.byteswap()
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(taxids)))
+        taxids.tofile(f)
+        replacements.tofile(f)
+
+
+def build(path, merged_lines=None, delnodes_lines=None):
+    """Build a map file from merged.dmp and/or delnodes.dmp lines.
+    Return the number of obsolete taxa."""
+    merged = dict(read_merged(merged_lines or []))
+    deleted = set(read_delnodes(delnodes_lines or []))
+    resolved = collapse(merged, deleted)
+    write(path, resolved)
+    return len(resolved)
+
+
+class TaxMap:
+    """Read-only view of a map file, backed by mmap."""
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = HEADER.unpack_from(self.mm)
+        if magic != MAGIC:
+            raise Exception(f"{path} is not a taxon map")
+        self.count = count
+        view = memoryview(self.mm)
+        start = HEADER.size
+        if sys.byteorder == "big":
+            # Rare: fall back to swapped in-memory copies
+            self.taxids = array("I", view[start:start + 4 * count])
+            self.replacements = array("I", view[start + 4 * count:start + 8 * count])
+            self.taxids.byteswap()
+            self.replacements.byteswap()
+        else:
+            self.taxids = view[start:start + 4 * count].cast("I")
+            self.replacements = view[start + 4 * count:start + 8 * count].cast("I")
+
+    def __len__(self):
+        return self.count
+
+    def lookup(self, taxid):
+        """Return None if the taxid is not obsolete, otherwise its final
+        replacement taxid, or DELETED if it has none."""
+        i = bisect_left(self.taxids, taxid)
+        if i < self.count and self.taxids[i] == taxid:
+            return self.replacements[i]
+        return None
+
+    def lookup_curie(self, curie):
+        """Like lookup() for an 'NCBITaxon:N' CURIE. Other CURIEs return None."""
+        if not curie.startswith("NCBITaxon:"):
+            return None
+        local = curie[10:]
+        if not local.isdigit():
+            return None
+        return self.lookup(int(local))
+
+    def close(self):
+        if isinstance(self.taxids, memoryview):
+            self.taxids.release()
+            self.replacements.release()
+        self.mm.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def main():
+    p = ArgumentParser(description="Build or query an obsolete NCBI Taxonomy map")
+    sub = p.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build", help="Build a map from merged.dmp and delnodes.dmp")
+    b.add_argument("-m", "--merged", help="The table of merged nodes: merged.dmp, .gz or a taxdump archive")
+    b.add_argument("-d", "--delnodes", help="The table of deleted nodes: delnodes.dmp, .gz or a taxdump archive")
+    b.add_argument("output", help="The map file to write")
+    q = sub.add_parser("lookup", help="Look up the status of NCBITaxon CURIEs")
+    q.add_argument("map", help="The map file to read")
+    q.add_argument("curies", nargs="+", help="NCBITaxon CURIEs")
+    args = p.parse_args()
+
+    if args.command == "build":
+        merged = taxdump.open_dump(args.merged, "merged.dmp") if args.merged else None
+        delnodes = taxdump.open_dump(args.delnodes, "delnodes.dmp") if args.delnodes else None
+        try:
+            count = build(args.output, merged, delnodes)
+        finally:
+            for f in [merged, delnodes]:
+                if f:
+                    f.close()
+        print(f"Wrote {count} obsolete taxa to {args.output}", file=sys.stderr)
+        return
+
+    with TaxMap(args.map) as taxmap:
+        for curie in args.curies:
+            replacement = taxmap.lookup_curie(curie)
+            if replacement is None:
+                print(f"{curie}\t\t")
+            elif replacement == DELETED:
+                print(f"{curie}\ttrue\t")
+            else:
+                print(f"{curie}\ttrue\tNCBITaxon:{replacement}")
+
+
+if __name__ == "__main__":
+    main()
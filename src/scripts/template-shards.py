@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+#
+# Build ontie.owl from the templates in parallel shards.
+#
+# Each template is templated on its own, and the large ones (protein.tsv,
+# taxon.tsv) in chunks of rows, by separate ROBOT processes. Every shard uses
+# the same label table as its --input: build/shards/labels.ttl, which declares
+# every term in index.tsv, external.tsv and predicates.tsv with its label and
+# type, so labels resolve exactly as when all templates are given to one
+# ROBOT template command. The shard modules are then merged with
+# metadata.ttl and imports.ttl and annotated, as in the Makefile rule.
+#
+# Chunk boundaries are chosen from the content of the rows, so adding or
+# removing a row only changes the chunk it is in. Shard modules are named by
+# the hash of their rows, the label table and the ROBOT command, and are
+# reused while those stay the same.
+
+import csv
+import hashlib
+import io
+import json
+import os
+import shlex
+import sqlite3
+import subprocess
+import sys
+import time
+
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import templates
+
+
+SHARD_DIR = "build/shards"
+PREFIXES_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prefixes.sql")
+
+# Templates whose terms (ID, Label, Type) make up the label table
+LABEL_TABLES = ["index", "external", "predicates"]
+
+RDFS_LABEL = "http://www.w3.org/2000/01/rdf-schema#label"
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+
+
+def read_prefixes():
+    conn = sqlite3.connect(":memory:")
+    with open(PREFIXES_SQL) as f:
+        conn.executescript(f.read())
+    prefixes = dict(conn.execute("SELECT prefix, base FROM prefix"))
+    conn.close()
+    return prefixes
+
+
+def expand(curie, prefixes):
+    if curie.startswith("http://") or curie.startswith("https://"):
+        return curie
+    prefix, _, local = curie.partition(":")
+    if prefix not in prefixes:
+        return None
+    return prefixes[prefix] + local
+
+
+def label_table(tables, prefixes):
+    """Return Turtle declaring each term of the label tables with its label and type."""
+    lines = []
+    seen = set()
+    for name in LABEL_TABLES:
+        for row in tables[name].rows:
+            iri = expand((row.get("ID") or "").strip(), prefixes)
+            label = row.get("Label")
+            if not iri or not label or (iri, label) in seen:
+                continue
+            seen.add((iri, label))
+            kind = expand((row.get("Type") or "").strip() or "owl:Class", prefixes)
+            lines.append(f"<{iri}> <{RDF_TYPE}> <{kind}> .")
+            lines.append(f"<{iri}> <{RDFS_LABEL}> {json.dumps(label, ensure_ascii=False)} .")
+    return "\n".join(lines) + "\n"
+
+
+def chunks(rows, size):
+    """Split rows into chunks of about size rows. A chunk ends after a row
+    whose hash is 0 modulo size, or at twice the size, so boundaries move
+    with the rows instead of with their positions."""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        digest = int(hashlib.sha1("\t".join(row).encode()).hexdigest()[:8], 16)
+        if digest % size == 0 or len(chunk) >= size * 2:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def tsv(headers, template, rows):
+    out = io.StringIO()
+    writer = csv.writer(out, delimiter="\t", lineterminator="\n")
+    writer.writerow(headers)
+    writer.writerow(template)
+    writer.writerows(rows)
+    return out.getvalue()
+
+
+def shard_tables(tables, size):
+    """Yield (table name, TSV text) for each template or chunk of a template."""
+    for name, table in tables.items():
+        template = templates.row_cells(table.headers, table.template)
+        rows = [templates.row_cells(table.headers, row) for row in table.rows]
+        if len(rows) <= size * 2:
+            yield name, tsv(table.headers, template, rows)
+            continue
+        for chunk in chunks(rows, size):
+            yield name, tsv(table.headers, template, chunk)
+
+
+def write_if_changed(path, text):
+    if os.path.exists(path):
+        with open(path) as f:
+            if f.read() == text:
+                return
+    with open(path, "w") as f:
+        f.write(text)
+
+
+class ShardBuild:
+    def __init__(self, robot, shard_dir):
+        self.robot = shlex.split(robot)
+        self.shard_dir = shard_dir
+
+    def template(self, name, text, labels_path, labels_hash):
+        """Template one shard into a module, or reuse the module from a
+        previous build. Return (module path, seconds, reused)."""
+        key = hashlib.sha256(
+            "\0".join([text, labels_hash, " ".join(self.robot)]).encode()
+        ).hexdigest()[:16]
+        module = os.path.join(self.shard_dir, f"{name}.{key}.owl")
+        if os.path.exists(module):
+            return module, 0.0, True
+        source = os.path.join(self.shard_dir, f"{name}.{key}.tsv")
+        with open(source, "w") as f:
+            f.write(text)
+        began = time.perf_counter()
+        tmp = module + ".tmp.owl"
+        subprocess.run(
+            self.robot
+            + ["template", "--input", labels_path, "--template", source, "--output", tmp],
+            check=True,
+        )
+        os.replace(tmp, module)
+        return module, time.perf_counter() - began, False
+
+    def merge(self, modules, inputs, ontology_iri, version_iri, output):
+        args = self.robot + ["merge"]
+        for path in modules + inputs:
+            args.extend(["--input", path])
+        args.extend(["--include-annotations", "true", "annotate"])
+        if ontology_iri:
+            args.extend(["--ontology-iri", ontology_iri])
+        if version_iri:
+            args.extend(["--version-iri", version_iri])
+        args.extend(["--output", output])
+        subprocess.run(args, check=True)
+
+
+def main():
+    p = ArgumentParser(description="Build ontie.owl from templates in parallel shards")
+    p.add_argument(
+        "-r",
+        "--robot",
+        default="java -jar build/robot.jar --prefix 'ONTIE: https://ontology.iedb.org/ontology/ONTIE_'",
+        help="ROBOT command",
+    )
+    p.add_argument("-t", "--templates", default=templates.TEMPLATE_DIR, help="Template directory")
+    p.add_argument("-i", "--input", action="append", default=[], help="Ontology to merge with the modules")
+    p.add_argument("-j", "--jobs", type=int, default=4, help="Number of ROBOT processes at once")
+    p.add_argument("-c", "--chunk", type=int, default=500, help="Rows per chunk of large templates")
+    p.add_argument("-d", "--shard-dir", default=SHARD_DIR, help="Directory for shards and modules")
+    p.add_argument("--ontology-iri", help="Ontology IRI of the output")
+    p.add_argument("--version-iri", help="Version IRI of the output")
+    p.add_argument("-o", "--output", required=True, help="Merged ontology to write")
+    args = p.parse_args()
+
+    os.makedirs(args.shard_dir, exist_ok=True)
+    tables = templates.read_tables(template_dir=args.templates)
+    labels = label_table(tables, read_prefixes())
+    labels_path = os.path.join(args.shard_dir, "labels.ttl")
+    write_if_changed(labels_path, labels)
+    labels_hash = hashlib.sha256(labels.encode()).hexdigest()
+
+    build = ShardBuild(args.robot, args.shard_dir)
+    shards = list(shard_tables(tables, args.chunk))
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        futures = [
+            (name, executor.submit(build.template, name, text, labels_path, labels_hash))
+            for name, text in shards
+        ]
+        results = [(name, future.result()) for name, future in futures]
+    print("shard\tseconds\treused", file=sys.stderr)
+    for name, (module, seconds, reused) in results:
+        print(f"{os.path.basename(module)}\t{seconds:.1f}\t{'yes' if reused else 'no'}", file=sys.stderr)
+    print(f"templated {len(shards)} shards in {time.perf_counter() - began:.1f}s", file=sys.stderr)
+
+    modules = [module for _, (module, _, _) in results]
+    began = time.perf_counter()
+    build.merge(modules, args.input, args.ontology_iri, args.version_iri, args.output)
+    print(f"merged in {time.perf_counter() - began:.1f}s", file=sys.stderr)
+
+    # Drop modules and shard tables from earlier builds
+    keep = {labels_path} | set(modules) | {module[:-4] + ".tsv" for module in modules}
+    for filename in os.listdir(args.shard_dir):
+        path = os.path.join(args.shard_dir, filename)
+        if path not in keep:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
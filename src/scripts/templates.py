@@ -0,0 +1,153 @@
+"""Read and write the ROBOT template tables in src/ontology/templates."""
+
+import csv
+import os
+import re
+
+
+TEMPLATE_DIR = "src/ontology/templates"
+
+# Same order as SHEETS in the Makefile
+SHEETS = [
+    "predicates",
+    "index",
+    "external",
+    "protein",
+    "complex",
+    "disease",
+    "taxon",
+    "assays",
+    "other",
+]
+
+# ROBOT template string types whose cells name other terms, by label or CURIE
+REFERENCE_TYPES = {"C", "SC", "EC", "DC", "DI", "I", "SI", "AI"}
+
+# A Manchester class expression with quoted names, e.g. 'in taxon' some 'Homo sapiens'
+EXPRESSION = re.compile(r"'\s+(some|only|value|and|or)\s+['(]")
+
+
+class Table:
+    """A template table: header row, template string row, and data rows as dicts.
+    Data rows start at row 3 in A1 notation."""
+
+    def __init__(self, name, path, headers, template, rows):
+        self.name = name
+        self.path = path
+        self.headers = headers
+        self.template = template
+        self.rows = rows
+
+    def column(self, header):
+        """Return the values in a column, or an empty list if it does not exist."""
+        if header not in self.headers:
+            return []
+        return [row.get(header) or "" for row in self.rows]
+
+    def append(self, row):
+        """Add a data row, with empty strings for any missing columns."""
+        self.rows.append({header: row.get(header, "") for header in self.headers})
+
+
+def row_cells(headers, row):
+    """Return the cells of a row as read by csv.DictReader, keeping short
+    rows short and any extra cells at the end."""
+    cells = [row.get(header) for header in headers]
+    while cells and cells[-1] is None:
+        cells.pop()
+    return ["" if cell is None else cell for cell in cells] + row.get(None, [])
+
+
+def column_type(template):
+    """Return the type and SPLIT separator (or None) of a template string,
+    e.g. ("SC", "|") for "SC % SPLIT=|"."""
+    split = None
+    if " SPLIT=" in template:
+        template, split = template.rsplit(" SPLIT=", 1)
+    return template.split(" ", 1)[0], split
+
+
+def cell_names(value):
+    """Return the names in a cell: the quoted names in a Manchester expression,
+    or else the whole value (which may itself contain apostrophes)."""
+    value = value.strip()
+    if not value:
+        return []
+    if value.startswith("'") or EXPRESSION.search(value):
+        return re.findall(r"'([^']+)'", value)
+    return [value]
+
+
+def references(table):
+    """Yield (row number, header, name) for every label or CURIE named in the
+    reference columns of a table. Row numbers are A1 rows, starting at 3."""
+    columns = []
+    for header in table.headers:
+        column, split = column_type(table.template.get(header) or "")
+        if column in REFERENCE_TYPES:
+            columns.append((header, split))
+    for number, row in enumerate(table.rows, start=3):
+        for header, split in columns:
+            value = row.get(header)
+            if not value:
+                continue
+            for cell in value.split(split) if split else [value]:
+                for name in cell_names(cell):
+                    yield number, header, name
+
+
+def idx_to_a1(row, col):
+    """Convert a row & column to A1 notation. Adapted from gspread.utils."""
+    div = col
+    column_label = ""
+
+    while div:
+        (div, mod) = divmod(div, 26)
+        if mod == 0:
+            mod = 26
+            div -= 1
+        column_label = chr(mod + 64) + column_label
+
+    label = f"{column_label}{row}"
+    return label
+
+
+def table_path(name, template_dir=TEMPLATE_DIR):
+    return os.path.join(template_dir, f"{name}.tsv")
+
+
+def read_table(path, delimiter="\t"):
+    """Read a template TSV (or CSV) into a Table."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    with open(path, "r") as f:
+        reader = csv.DictReader(f, delimiter=delimiter)
+        headers = reader.fieldnames
+        template = next(reader)
+        rows = list(reader)
+    return Table(name, path, headers, template, rows)
+
+
+def read_tables(names=None, template_dir=TEMPLATE_DIR):
+    """Read templates by name into a dict of Tables."""
+    return {name: read_table(table_path(name, template_dir)) for name in names or SHEETS}
+
+
+def write_tables(tables):
+    """Write tables to temporary files, then move them all into place,
+    so a failure part way through does not leave some tables updated."""
+    written = []
+    try:
+        for table in tables:
+            tmp = table.path + ".tmp"
+            with open(tmp, "w") as f:
+                writer = csv.writer(f, delimiter="\t", lineterminator="\n")
+                writer.writerow(table.headers)
+                writer.writerow(row_cells(table.headers, table.template))
+                writer.writerows(row_cells(table.headers, row) for row in table.rows)
+            written.append((tmp, table.path))
+    except Exception:
+        for tmp, _ in written:
+            os.remove(tmp)
+        raise
+    for tmp, path in written:
+        os.replace(tmp, path)
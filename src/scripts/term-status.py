@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+#
+# Resolve the status of a list of CURIEs or IRIs against the databases in build/,
+# producing the same table as POSTing the list to /resources/{r}/subjects.
+
+import sys
+
+from argparse import ArgumentParser, FileType
+
+import sot
+
+
+def main():
+    p = ArgumentParser()
+    p.add_argument("input", type=FileType("r"), help="List of CURIEs or IRIs with a 'CURIE' or 'IRI' header")
+    p.add_argument("-d", "--build-dir", default="build", help="Directory containing resource .db files")
+    p.add_argument("-r", "--resource", default="all", help="Resource to search, or 'all'")
+    p.add_argument("-c", "--compact", action="store_true", help="Return replacements as CURIEs")
+    args = p.parse_args()
+
+    s = sot.SoT(args.build_dir, 1)
+    resources = s.get_resources(args.resource)
+    if resources is None:
+        print(f"Unknown resource '{args.resource}'", file=sys.stderr)
+        sys.exit(1)
+    key, requested = sot.parse_body(args.input)
+    if key is None:
+        print("The first line of the input must be 'CURIE' or 'IRI'", file=sys.stderr)
+        sys.exit(1)
+
+    sys.stdout.write(sot.tsv_line([key] + sot.STATUS_SELECT))
+    for row in s.get_status(resources, key, requested, args.compact):
+        sys.stdout.write(sot.tsv_line(row))
+    s.close()
+
+
+if __name__ == "__main__":
+    main()
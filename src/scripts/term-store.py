@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+#
+# Pre-render every ONTIE term into a static tree that any file server can serve.
+#
+# build/ontie.db is read in one pass and each term is rendered as serve.py
+# renders /ontology/ONTIE_0000001.html, .ttl, .json and .tsv:
+#
+#     build/terms/objects/ab/ab12...ef.gz          gzipped document, named by the hash of its content
+#     build/terms/ontology/ONTIE_0000001.ttl.gz    hard link to the object for that document
+#     build/terms/manifest.json                    the digest and objects of each term
+#
+# Servers that can send precompressed files (e.g. nginx gzip_static) can serve
+# build/terms as is. A term is only rendered again when its digest changes:
+# the hash of its statements, the labels of the terms it refers to, the
+# prefixes and predicate labels, and the rendering code. Large builds are
+# rendered in a process pool.
+
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import sot
+
+
+OUTPUT_DIR = "build/terms"
+FORMATS = ["html", "ttl", "json", "tsv"]
+
+# Render in a process pool when at least this many terms changed
+POOL_MIN = 500
+BATCH_SIZE = 200
+
+WALK_SQL = """SELECT stanza, subject, predicate, object, value, datatype, language
+FROM statements WHERE stanza LIKE 'ONTIE:%'
+ORDER BY stanza, rowid"""
+
+# Set in each worker process
+worker_sot = None
+
+
+def code_digest():
+    """Return a hash of the code that renders terms, so that changes to it
+    render every term again."""
+    h = hashlib.sha1()
+    for module in [sot, sys.modules[__name__]]:
+        with open(module.__file__, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def walk(path):
+    """Yield (subject, statements) for each ONTIE stanza, in stanza order."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        stanza, statements = None, []
+        for row in conn.execute(WALK_SQL):
+            if row[0] != stanza:
+                if statements:
+                    yield stanza, statements
+                stanza, statements = row[0], []
+            statements.append(tuple(row[1:]))
+        if statements:
+            yield stanza, statements
+    finally:
+        conn.close()
+
+
+def term_digest(statements, labels, base):
+    h = hashlib.sha1(base.encode("utf-8"))
+    for row in sorted(statements, key=repr):
+        h.update(repr(row).encode("utf-8"))
+        if row[2]:
+            h.update(repr(sorted(labels.get(row[2], []))).encode("utf-8"))
+    return h.hexdigest()
+
+
+def write_object(output_dir, text):
+    """Write gzipped text to the object store and return its hash."""
+    data = text.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    path = object_path(output_dir, digest)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        # No name or mtime in the header, so the same document always
+        # compresses to the same bytes
+        with open(tmp, "wb") as f, gzip.GzipFile("", "wb", 9, f, mtime=0) as gz:
+            gz.write(data)
+        os.replace(tmp, path)
+    return digest
+
+
+def object_path(output_dir, digest):
+    return os.path.join(output_dir, "objects", digest[:2], digest + ".gz")
+
+
+def link_path(output_dir, subject, fmt):
+    return os.path.join(output_dir, "ontology", f"ONTIE_{subject.split(':', 1)[1]}.{fmt}.gz")
+
+
+def render(s, output_dir, subject, statements):
+    """Render one term in every format and return a dict from format to object hash."""
+    resources = s.get_resources("ONTIE")
+    number = subject.split(":", 1)[1]
+
+    def href(ext):
+        return f"/ontology/ONTIE_{number}.{ext}"
+
+    documents = {
+        "html": s.render_html(resources, subject, statements, href),
+        "ttl": s.render_ttl(subject, statements),
+        "json": s.render_json(resources, subject, statements),
+        "tsv": s.render_tsv(resources, subject),
+    }
+    return {fmt: write_object(output_dir, text) for fmt, text in documents.items()}
+
+
+def open_sot(build_dir):
+    s = sot.SoT(build_dir, 1)
+    s.resources["ONTIE"].load_labels()
+    return s
+
+
+def init_worker(build_dir):
+    global worker_sot
+    worker_sot = open_sot(build_dir)
+
+
+def render_batch(output_dir, batch):
+    return [(subject, render(worker_sot, output_dir, subject, statements)) for subject, statements in batch]
+
+
+def link(output_dir, subject, objects):
+    for fmt, digest in objects.items():
+        path = link_path(output_dir, subject, fmt)
+        tmp = path + ".tmp"
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        try:
+            os.link(object_path(output_dir, digest), tmp)
+        except OSError:
+            # No hard links on this file system
+            with open(object_path(output_dir, digest), "rb") as fr, open(tmp, "wb") as fw:
+                fw.write(fr.read())
+        os.replace(tmp, path)
+
+
+def read_manifest(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get("terms", {})
+
+
+def main():
+    p = ArgumentParser(description="Pre-render every ONTIE term into a static tree")
+    p.add_argument("-d", "--build-dir", default="build", help="Directory containing resource .db files")
+    p.add_argument("-o", "--output", default=OUTPUT_DIR, help="Directory to write the tree to")
+    p.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Rendering processes")
+    p.add_argument("-f", "--force", action="store_true", help="Render every term again")
+    args = p.parse_args()
+
+    began = time.perf_counter()
+    db = os.path.join(args.build_dir, "ontie.db")
+    if not os.path.exists(db):
+        sys.exit(f"ERROR: {db} does not exist")
+    os.makedirs(os.path.join(args.output, "ontology"), exist_ok=True)
+    manifest_path = os.path.join(args.output, "manifest.json")
+    previous = {} if args.force else read_manifest(manifest_path)
+
+    s = open_sot(args.build_dir)
+    base = code_digest() + s.metadata_digest
+    labels = s.resources["ONTIE"].labels
+
+    terms = {}
+    todo = []
+    for subject, statements in walk(db):
+        digest = term_digest(statements, labels, base)
+        old = previous.get(subject)
+        if old and old["digest"] == digest and all(
+            os.path.exists(link_path(args.output, subject, fmt)) for fmt in FORMATS
+        ):
+            terms[subject] = old
+            continue
+        terms[subject] = {"digest": digest}
+        todo.append((subject, statements))
+
+    if len(todo) >= POOL_MIN and args.jobs > 1:
+        batches = [todo[i:i + BATCH_SIZE] for i in range(0, len(todo), BATCH_SIZE)]
+        with ProcessPoolExecutor(args.jobs, initializer=init_worker, initargs=(args.build_dir,)) as executor:
+            results = [r for batch in executor.map(render_batch, [args.output] * len(batches), batches) for r in batch]
+    else:
+        results = [(subject, render(s, args.output, subject, statements)) for subject, statements in todo]
+    s.close()
+
+    for subject, objects in results:
+        link(args.output, subject, objects)
+        terms[subject]["objects"] = objects
+
+    # Remove the links for terms that are gone and objects nothing uses
+    removed = 0
+    for subject in set(previous) - set(terms):
+        removed += 1
+        for fmt in FORMATS:
+            path = link_path(args.output, subject, fmt)
+            if os.path.exists(path):
+                os.remove(path)
+    used = {object_path(args.output, d) for term in terms.values() for d in term["objects"].values()}
+    for root, _, files in os.walk(os.path.join(args.output, "objects")):
+        for name in files:
+            path = os.path.join(root, name)
+            if path not in used:
+                os.remove(path)
+
+    tmp = manifest_path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"terms": terms}, f, sort_keys=True)
+    os.replace(tmp, manifest_path)
+    print(
+        f"{len(terms)} terms: {len(results)} rendered, {len(terms) - len(results)} unchanged, "
+        f"{removed} removed in {time.perf_counter() - began:.1f}s",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
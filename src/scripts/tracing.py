@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+#
+# Record where build time goes.
+#
+# `make TRACE=true ...` sets this script as the Makefile SHELL, so every
+# recipe line (curl, rdftab, sqlite3, gizmos, ROBOT, the Python scripts,
+# valve, cogs) runs through `tracing.py shell`, which records the target, the
+# command, wall time, CPU time, peak RSS and the sizes of the target's
+# inputs and output. Python scripts can add their own phases with
+#
+#     from tracing import span
+#     with span("report"):
+#         ...
+#
+# which records to the same trace when they run under `make TRACE=true`.
+# Records are JSON lines in build/trace.jsonl, grouped by run.
+#
+#     tracing.py summary [--run RUN]       breakdown by target, command and span,
+#                                          and steps slower than the run before
+#     tracing.py regressions [--run RUN]   steps that are slower than the run before
+
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from argparse import ArgumentParser
+from contextlib import contextmanager
+
+TRACE_FILE = "build/trace.jsonl"
+
+# Environment variables that tell scripts and nested commands where to record
+ENV_FILE = "TRACE_FILE"
+ENV_RUN = "TRACE_RUN"
+ENV_STEP = "TRACE_STEP"
+
+
+def sizes(paths):
+    return {path: os.path.getsize(path) for path in paths if path and os.path.isfile(path)}
+
+
+def write(record, path=None):
+    path = path or os.environ.get(ENV_FILE) or TRACE_FILE
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # One short write in append mode, so parallel make jobs do not interleave lines
+    with open(path, "a") as f:
+        f.write(json.dumps(record, sort_keys=True) + "\n")
+
+
+@contextmanager
+def span(name, inputs=(), outputs=()):
+    """Record a phase of a Python script when it runs under a trace."""
+    if not os.environ.get(ENV_RUN):
+        yield
+        return
+    began = time.time()
+    wall = time.perf_counter()
+    cpu = time.thread_time()
+    try:
+        yield
+    finally:
+        write(
+            {
+                "run": os.environ[ENV_RUN],
+                "step": os.environ.get(ENV_STEP, ""),
+                "span": name,
+                "start": began,
+                "wall": time.perf_counter() - wall,
+                "cpu": time.thread_time() - cpu,
+                "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                "inputs": sizes(inputs),
+                "outputs": sizes(outputs),
+            }
+        )
+
+
+def shell(argv):
+    """Run a recipe line like `sh -c`, recording it for the target."""
+    p = ArgumentParser(prog="tracing.py shell")
+    p.add_argument("--run", default="")
+    p.add_argument("--target", default="")
+    p.add_argument("--inputs", default="")
+    p.add_argument("--file", default=TRACE_FILE)
+    p.add_argument("-c", dest="command", required=True)
+    args = p.parse_args(argv)
+    if not args.target:
+        # $(shell ...) calls while make reads the Makefile
+        os.execv("/bin/sh", ["/bin/sh", "-c", args.command])
+
+    env = dict(os.environ)
+    env.update({ENV_FILE: args.file, ENV_RUN: args.run, ENV_STEP: args.target})
+    began = time.time()
+    wall = time.perf_counter()
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    code = subprocess.run(["/bin/sh", "-c", args.command], env=env).returncode
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    write(
+        {
+            "run": args.run,
+            "step": args.target,
+            "command": args.command,
+            "start": began,
+            "wall": time.perf_counter() - wall,
+            "cpu": (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime),
+            "max_rss_kb": after.ru_maxrss,
+            "inputs": sizes(args.inputs.split()),
+            "outputs": sizes([args.target]),
+            "exit": code,
+        },
+        args.file,
+    )
+    return code
+
+
+def read_runs(path):
+    """Return a dict from run ID to records, in the order runs started."""
+    runs = {}
+    if not os.path.exists(path):
+        return runs
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                runs.setdefault(record["run"], []).append(record)
+    return runs
+
+
+def select_run(runs, run):
+    if not runs:
+        sys.exit("ERROR: no trace recorded; run make with TRACE=true")
+    if run and run not in runs:
+        sys.exit(f"ERROR: no run '{run}'")
+    return run or list(runs)[-1]
+
+
+def step_totals(records):
+    """Return a dict from step to total wall time, CPU time and peak RSS of its commands."""
+    totals = {}
+    for record in records:
+        if "command" not in record:
+            continue
+        total = totals.setdefault(record["step"], {"wall": 0.0, "cpu": 0.0, "max_rss_kb": 0})
+        total["wall"] += record["wall"]
+        total["cpu"] += record["cpu"]
+        total["max_rss_kb"] = max(total["max_rss_kb"], record["max_rss_kb"])
+    return totals
+
+
+def human_size(size):
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024:
+            return f"{size:.0f}{unit}"
+        size /= 1024
+    return f"{size:.1f}TB"
+
+
+def summary(records, width=40):
+    """Print a flame-style breakdown: each step with its commands and spans
+    underneath, and a bar for its share of the total wall time."""
+    totals = step_totals(records)
+    whole = sum(t["wall"] for t in totals.values()) or 1
+    print(f"{'wall':>8} {'cpu':>8} {'rss':>7}  {'':<{width}}  step")
+    for step, total in sorted(totals.items(), key=lambda item: -item[1]["wall"]):
+        bar = "#" * max(1, round(width * total["wall"] / whole))
+        print(
+            f"{total['wall']:8.2f} {total['cpu']:8.2f} {human_size(total['max_rss_kb'] * 1024):>7}  "
+            f"{bar:<{width}}  {step}"
+        )
+        # Commands of the step, then the spans the commands recorded
+        steps = [record for record in records if record["step"] == step]
+        for record in sorted(steps, key=lambda record: "command" not in record):
+            if "command" in record:
+                label = record["command"].split("\n")[0][:80]
+                inputs = sum(record["inputs"].values())
+                outputs = sum(record["outputs"].values())
+                io = f" [{human_size(inputs)} -> {human_size(outputs)}]" if inputs or outputs else ""
+                print(f"{record['wall']:8.2f} {record['cpu']:8.2f} {'':>7}  {'':<{width}}    {label}{io}")
+            else:
+                print(f"{record['wall']:8.2f} {record['cpu']:8.2f} {'':>7}  {'':<{width}}      - {record['span']}")
+    print(f"{whole:8.2f} total")
+
+
+def regressions(previous, current, ratio=1.2, minimum=0.5):
+    """Return (step, before, after) for steps slower by the ratio and at least minimum seconds."""
+    before = step_totals(previous)
+    after = step_totals(current)
+    slower = []
+    for step, total in after.items():
+        if step not in before:
+            continue
+        old = before[step]["wall"]
+        new = total["wall"]
+        if new > old * ratio and new - old >= minimum:
+            slower.append((step, old, new))
+    return sorted(slower, key=lambda item: item[1] - item[2])
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "shell":
+        sys.exit(shell(sys.argv[2:]))
+
+    p = ArgumentParser(description="Summarize build traces")
+    p.add_argument("-f", "--file", default=TRACE_FILE, help="Trace file")
+    sub = p.add_subparsers(dest="command", required=True)
+    s = sub.add_parser("summary", help="Print the time taken by each step of a run")
+    s.add_argument("-r", "--run", help="Run ID (default: the last run)")
+    r = sub.add_parser("regressions", help="Compare a run with the run before it")
+    r.add_argument("-r", "--run", help="Run ID (default: the last run)")
+    r.add_argument("--ratio", type=float, default=1.2, help="Slowdown ratio to report")
+    r.add_argument("--minimum", type=float, default=0.5, help="Smallest slowdown in seconds to report")
+    r.add_argument("--fail", action="store_true", help="Exit with an error when a step is slower")
+    sub.add_parser("runs", help="List the recorded runs")
+    args = p.parse_args()
+
+    runs = read_runs(args.file)
+    if args.command == "runs":
+        for run, records in runs.items():
+            totals = step_totals(records)
+            print(f"{run}\t{len(totals)} steps\t{sum(t['wall'] for t in totals.values()):.2f}s")
+        return
+
+    run = select_run(runs, args.run)
+    if args.command == "summary":
+        print(f"Run {run}")
+        summary(runs[run])
+        print()
+    names = list(runs)
+    if names.index(run) == 0:
+        print(f"Run {run} is the first recorded run")
+        return
+    previous = names[names.index(run) - 1]
+    ratio = getattr(args, "ratio", 1.2)
+    minimum = getattr(args, "minimum", 0.5)
+    slower = regressions(runs[previous], runs[run], ratio, minimum)
+    print(f"Run {run} compared with {previous}")
+    for step, old, new in slower:
+        print(f"{step}\t{old:.2f}s -> {new:.2f}s ({new / old if old else float('inf'):.1f}x)")
+    if not slower:
+        print("No steps are slower")
+    elif getattr(args, "fail", False):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
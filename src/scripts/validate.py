@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+#
+# Validate the templates against the VALVE configuration in
+# src/ontology/validation (datatype.tsv, field.tsv, rule.tsv), writing the
+# same problems table as `valve`.
+#
+# Everything a condition refers to is built once before any row is checked:
+# the member sets for in() and distinct(), the trees defined by tree(), and
+# the set of descendants for each under(tree, "term"). Each table is then
+# checked in one pass, applying its field.tsv and rule.tsv conditions to each
+# row. Conditions remember their result for each value, and rows with the
+# same checked cells share their problems, so large tables with repeated
+# parents and taxa are cheap to check.
+#
+# As in VALVE, empty cells are only checked by rule.tsv conditions.
+
+import csv
+import os
+import re
+import sys
+
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from templates import idx_to_a1
+
+
+FIELDNAMES = ["table", "cell", "level", "rule ID", "rule", "message", "suggestion"]
+
+TOKEN = re.compile(r'\s*(?:(?P<string>"(?:[^"\\]|\\.)*")|(?P<label>[A-Za-z_][\w.]*)|(?P<punct>[(),=]))')
+
+
+class ConditionError(Exception):
+    pass
+
+
+def tokenize(text):
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        m = TOKEN.match(text, pos)
+        if not m:
+            raise ConditionError(f"cannot parse '{text[pos:]}' in '{text}'")
+        pos = m.end()
+        kind = m.lastgroup
+        value = m.group(kind)
+        if kind == "string":
+            value = re.sub(r"\\(.)", r"\1", value[1:-1])
+        yield kind, value
+
+
+def parse(text):
+    """Parse a condition into nested tuples:
+    ("string", value), ("label", name) or ("function", name, args, kwargs)."""
+    tokens = list(tokenize(text))
+    node, pos = parse_expression(tokens, 0, text)
+    if pos != len(tokens):
+        raise ConditionError(f"unexpected '{tokens[pos][1]}' in '{text}'")
+    return node
+
+
+def parse_expression(tokens, pos, text):
+    if pos >= len(tokens):
+        raise ConditionError(f"unexpected end of '{text}'")
+    kind, value = tokens[pos]
+    if kind == "string":
+        return ("string", value), pos + 1
+    if kind != "label":
+        raise ConditionError(f"unexpected '{value}' in '{text}'")
+    if pos + 1 >= len(tokens) or tokens[pos + 1] != ("punct", "("):
+        return ("label", value), pos + 1
+    args = []
+    kwargs = {}
+    pos += 2
+    while tokens[pos] != ("punct", ")"):
+        if tokens[pos][0] == "label" and pos + 1 < len(tokens) and tokens[pos + 1] == ("punct", "="):
+            kwargs[tokens[pos][1]], pos = parse_expression(tokens, pos + 2, text)
+        else:
+            arg, pos = parse_expression(tokens, pos, text)
+            args.append(arg)
+        if tokens[pos] == ("punct", ","):
+            pos += 1
+        elif tokens[pos] != ("punct", ")"):
+            raise ConditionError(f"expected ',' or ')' in '{text}'")
+    return ("function", value, args, kwargs), pos + 1
+
+
+def read_tsv(path, row_start=2):
+    """Return the headers and (A1 row number, row) pairs of a TSV table,
+    with data starting on row_start."""
+    with open(path) as f:
+        reader = csv.reader(f, delimiter="\t")
+        headers = next(reader, [])
+        rows = []
+        for number, cells in enumerate(reader, start=2):
+            if number < row_start:
+                continue
+            cells = cells + [""] * (len(headers) - len(cells))
+            rows.append((number, dict(zip(headers, cells))))
+    return headers, rows
+
+
+class Datatype:
+    def __init__(self, name, parent, match, level, instructions, replace):
+        self.name = name
+        self.parent = parent
+        self.pattern = re.compile(match[1:-1]) if match else None
+        self.level = level or "ERROR"
+        self.instructions = instructions
+        self.replace = replace
+
+    def fix(self, value):
+        """Apply the s/pattern/replacement/flags suggestion to a value."""
+        m = re.match(r"^s/(.*)/(.*)/(\w*)$", self.replace or "")
+        if not m:
+            return None
+        pattern, replacement, flags = m.groups()
+        replacement = re.sub(r"\\(\d)", r"\\g<\1>", replacement)
+        return re.sub(pattern, replacement, value, count=0 if "g" in flags else 1)
+
+
+class Tree:
+    """A tree from the child column to the (split) parent column of a table,
+    optionally extending another tree."""
+
+    def __init__(self, child_values, edges, extends=None):
+        self.nodes = set(child_values)
+        self.parents = {}
+        if extends:
+            self.nodes |= extends.nodes
+            for child, parents in extends.parents.items():
+                self.parents.setdefault(child, set()).update(parents)
+        for child, parent in edges:
+            self.parents.setdefault(child, set()).add(parent)
+        self.descendants = {}
+
+    def under(self, ancestor):
+        """Return the set of the ancestor and all its descendants, built once."""
+        if ancestor not in self.descendants:
+            children = {}
+            for child, parents in self.parents.items():
+                for parent in parents:
+                    children.setdefault(parent, set()).add(child)
+            found = {ancestor}
+            queue = [ancestor]
+            while queue:
+                for child in children.get(queue.pop(), ()):
+                    if child not in found:
+                        found.add(child)
+                        queue.append(child)
+            self.descendants[ancestor] = found
+        return self.descendants[ancestor]
+
+
+def read_tables(directory, row_start=2):
+    """Return a dict from table name to (headers, rows) for the TSVs in a directory."""
+    tables = {}
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".tsv"):
+            name = os.path.splitext(filename)[0]
+            tables[name] = read_tsv(os.path.join(directory, filename), row_start)
+    return tables
+
+
+def template_tables(tables):
+    """Return (headers, rows) for templates.Table objects that are already read."""
+    return {
+        name: (
+            table.headers,
+            [
+                (number, {header: row.get(header) or "" for header in table.headers})
+                for number, row in enumerate(table.rows, start=3)
+            ],
+        )
+        for name, table in tables.items()
+    }
+
+
+class Validator:
+    def __init__(self, config_dir, tables):
+        """Load the configuration and the (headers, rows) of each table to check."""
+        self.tables = {}
+        self.headers = {}
+        for name, (headers, rows) in list(read_tables(config_dir).items()) + list(tables.items()):
+            self.tables[name] = rows
+            self.headers[name] = headers
+
+        self.datatypes = {}
+        for _, row in self.tables.pop("datatype"):
+            self.datatypes[row["datatype"]] = Datatype(
+                row["datatype"],
+                row.get("parent"),
+                row.get("match"),
+                row.get("level"),
+                row.get("instructions"),
+                row.get("replace"),
+            )
+        self.fields = self.tables.pop("field")
+        self.rules = self.tables.pop("rule")
+
+        self.columns = {}
+        self.trees = {}
+        tree_fields = {}
+        for _, field in self.fields:
+            node = parse(field["condition"])
+            if node[0] == "function" and node[1] == "tree":
+                tree_fields[f"{field['table']}.{field['column']}"] = (field, node)
+        for name in tree_fields:
+            self.build_tree(name, tree_fields)
+
+        # Compile each field and rule condition once
+        self.checks = {}
+        for number, field in self.fields:
+            check = self.compile(parse(field["condition"]), field["table"], field["column"])
+            self.checks.setdefault(field["table"], []).append(
+                ("field", number, field, field["column"], check)
+            )
+        for number, rule in self.rules:
+            when = self.compile(parse(rule["when condition"]), rule["table"])
+            then = self.compile(parse(rule["then condition"]), rule["table"])
+            self.checks.setdefault(rule["table"], []).append(
+                ("rule", number, rule, rule["then column"], (when, then))
+            )
+
+    def column(self, name, table):
+        """Return the list of values of a table.column, or column of this table."""
+        table, column = name.split(".", 1) if "." in name else (table, name)
+        key = (table, column)
+        if key not in self.columns:
+            if table not in self.tables or column not in self.headers[table]:
+                raise ConditionError(f"unknown column '{table}.{column}'")
+            self.columns[key] = [row.get(column, "") for _, row in self.tables[table]]
+        return self.columns[key]
+
+    def build_tree(self, name, tree_fields):
+        if name in self.trees:
+            return self.trees[name]
+        if name not in tree_fields:
+            raise ConditionError(f"'{name}' is not a tree")
+        field, node = tree_fields[name]
+        _, _, args, kwargs = node
+        table = field["table"]
+        split = kwargs["split"][1] if "split" in kwargs else None
+        child_column = args[0][1]
+        extends = self.build_tree(args[1][1], tree_fields) if len(args) > 1 else None
+        edges = []
+        for _, row in self.tables[table]:
+            child = row.get(child_column, "")
+            value = row.get(field["column"], "")
+            if not child or not value:
+                continue
+            for parent in value.split(split) if split else [value]:
+                edges.append((child, parent.strip()))
+        self.trees[name] = Tree(self.column(child_column, table), edges, extends)
+        return self.trees[name]
+
+    def pattern(self, node, table):
+        """Return a regular expression string for one part of a concat()."""
+        kind = node[0]
+        if kind == "string":
+            return re.escape(node[1])
+        if kind == "label" and node[1] in self.datatypes:
+            datatype = self.datatypes[node[1]]
+            while datatype and not datatype.pattern:
+                datatype = self.datatypes.get(datatype.parent)
+            if not datatype:
+                return ".*"
+            return "(?:" + re.sub(r"(?<!\\)[$^]", "", datatype.pattern.pattern) + ")"
+        if kind == "function" and node[1] == "in":
+            values = self.members(node[2], table)
+            return "(?:" + "|".join(re.escape(v) for v in sorted(values, key=len, reverse=True)) + ")"
+        raise ConditionError(f"cannot use '{node}' in concat()")
+
+    def members(self, args, table):
+        values = set()
+        for arg in args:
+            if arg[0] == "string":
+                values.add(arg[1])
+            else:
+                values.update(self.column(arg[1], table))
+        return values
+
+    def datatype_check(self, name):
+        """Return a check for a datatype and all its parents."""
+        chain = []
+        datatype = self.datatypes[name]
+        while datatype:
+            if datatype.pattern:
+                chain.insert(0, datatype.pattern)
+            datatype = self.datatypes.get(datatype.parent)
+        return lambda value: all(p.search(value) for p in chain)
+
+    def datatype_failure(self, name, value):
+        """Return the most general datatype that a value does not match."""
+        chain = []
+        datatype = self.datatypes[name]
+        while datatype:
+            chain.insert(0, datatype)
+            datatype = self.datatypes.get(datatype.parent)
+        for datatype in chain:
+            if datatype.pattern and not datatype.pattern.search(value):
+                return datatype
+        return None
+
+    def compile(self, node, table, column=None):
+        """Return a function from a cell value to True when the value passes."""
+        check = self.compile_node(node, table, column)
+        results = {}
+
+        def cached(value):
+            if value not in results:
+                results[value] = check(value)
+            return results[value]
+
+        return cached
+
+    def compile_node(self, node, table, column=None):
+        kind = node[0]
+        if kind == "string":
+            return lambda value: value == node[1]
+        if kind == "label":
+            if node[1] in self.datatypes:
+                return self.datatype_check(node[1])
+            raise ConditionError(f"unknown datatype '{node[1]}'")
+
+        _, name, args, kwargs = node
+        if name == "in":
+            values = self.members(args, table)
+            return lambda value: value in values
+        if name == "not":
+            check = self.compile_node(args[0], table)
+            return lambda value: not check(value)
+        if name == "any":
+            checks = [self.compile_node(arg, table) for arg in args]
+            return lambda value: any(check(value) for check in checks)
+        if name == "list":
+            split = args[0][1]
+            check = self.compile_node(args[1], table)
+            return lambda value: all(check(v) for v in value.split(split))
+        if name == "concat":
+            pattern = re.compile("".join(self.pattern(arg, table) for arg in args))
+            return lambda value: bool(pattern.fullmatch(value))
+        if name == "under":
+            tree = self.trees.get(args[0][1])
+            if not tree:
+                raise ConditionError(f"'{args[0][1]}' is not a tree")
+            descendants = tree.under(args[1][1])
+            return lambda value: value in descendants
+        if name == "tree":
+            tree = self.trees[f"{table}.{column}"]
+            split = kwargs["split"][1] if "split" in kwargs else None
+            return lambda value: all(
+                v.strip() in tree.nodes for v in (value.split(split) if split else [value])
+            )
+        if name == "distinct":
+            # Repeated values are found for the whole column in duplicates()
+            return self.compile_node(args[0], table, column)
+        raise ConditionError(f"unknown function '{name}'")
+
+    def duplicates(self, field):
+        """Return the values that break a distinct() field condition."""
+        node = parse(field["condition"])
+        if node[0] != "function" or node[1] != "distinct":
+            return set()
+        table = field["table"]
+        seen = set()
+        duplicates = set()
+        for value in self.column(field["column"], table):
+            if value in seen:
+                duplicates.add(value)
+            seen.add(value)
+        for arg in node[2][1:]:
+            duplicates.update(seen & set(self.column(arg[1], table)))
+        duplicates.discard("")
+        return duplicates
+
+    def validate_table(self, table):
+        """Check every row of a table against its field and rule conditions."""
+        checks = self.checks.get(table, [])
+        if not checks:
+            return []
+        headers = self.headers[table]
+        distinct = [
+            (number, field, self.duplicates(field))
+            for kind, number, field, _, _ in checks
+            if kind == "field"
+        ]
+        distinct = [item for item in distinct if item[2]]
+        columns = sorted(
+            {column for _, _, _, column, _ in checks}
+            | {item["when column"] for kind, _, item, _, _ in checks if kind == "rule"}
+        )
+        problems = []
+        cache = {}
+        for number, row in self.tables[table]:
+            key = tuple(row.get(column, "") for column in columns)
+            if key not in cache:
+                cache[key] = list(self.validate_row(row, checks))
+            found = cache[key]
+            for field_number, field, duplicates in distinct:
+                value = row.get(field["column"], "")
+                rule_id = f"field:{field_number}"
+                if value in duplicates and not any(p["rule ID"] == rule_id for _, p in found):
+                    found = found + [(field["column"], self.field_problem(field_number, field))]
+            for column, problem in found:
+                problems.append(self.problem(table, number, headers, column, row, problem))
+        return problems
+
+    def field_problem(self, number, field):
+        return {
+            "level": "ERROR",
+            "rule ID": f"field:{number}",
+            "rule": field["condition"],
+            "message": field["message"],
+        }
+
+    def validate_row(self, row, checks):
+        """Yield (column, problem) for each failed condition on a row."""
+        for kind, number, item, column, check in checks:
+            value = row.get(column, "")
+            if kind == "field":
+                if not value or check(value):
+                    continue
+                node = parse(item["condition"])
+                if node[0] == "label" and node[1] in self.datatypes:
+                    datatype = self.datatype_failure(node[1], value)
+                    yield column, {
+                        "level": datatype.level,
+                        "rule ID": f"datatype:{datatype.name}",
+                        "rule": datatype.instructions,
+                        "message": item["message"] or datatype.instructions,
+                        "suggestion": datatype.fix(value),
+                    }
+                    continue
+                yield column, self.field_problem(number, item)
+            else:
+                when, then = check
+                if not when(row.get(item["when column"], "")) or then(value):
+                    continue
+                yield column, {
+                    "level": item.get("level") or "ERROR",
+                    "rule ID": f"rule:{number}",
+                    "rule": f"when {item['when column']} {item['when condition']} "
+                    f"then {item['then column']} {item['then condition']}",
+                    "message": item["message"],
+                }
+
+    def problem(self, table, number, headers, column, row, problem):
+        return {
+            "table": table,
+            "cell": idx_to_a1(number, headers.index(column) + 1),
+            "level": problem["level"],
+            "rule ID": problem["rule ID"],
+            "rule": problem["rule"],
+            "message": (problem["message"] or "").replace("{value}", row.get(column, "")),
+            "suggestion": problem.get("suggestion"),
+        }
+
+    def validate(self):
+        problems = []
+        for table in self.tables:
+            problems.extend(self.validate_table(table))
+        return problems
+
+
+def main():
+    p = ArgumentParser(description="Validate tables against a VALVE configuration")
+    p.add_argument("config", help="Directory with datatype.tsv, field.tsv and rule.tsv")
+    p.add_argument("tables", help="Directory of tables to validate")
+    p.add_argument("-r", "--row-start", type=int, default=2, help="First data row of the tables")
+    p.add_argument("-o", "--output", help="Write the problems table here instead of stdout")
+    args = p.parse_args()
+
+    try:
+        tables = read_tables(args.tables, args.row_start)
+        problems = Validator(args.config, tables).validate()
+    except ConditionError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        writer = csv.DictWriter(out, fieldnames=FIELDNAMES, delimiter="\t", lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(problems)
+    finally:
+        if args.output:
+            out.close()
+    print(f"{len(problems)} problems", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+#
+# Compare the size and query latency of rdftab databases with the TEXT
+# statements table and indexes of the build/%.db rule, and with the compact
+# schema of src/scripts/compact.sql (`make COMPACT=true`), on databases such as
+# build/obi.db and build/ncbitaxon.db or on a synthetic NCBITaxon-shaped one.
+#
+# Each database is copied and converted, and the same SoT queries are timed on
+# both: subjects, labels, stanza digests, term status, value filters, subject
+# pages and full-text search.
+
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../src/scripts"))
+
+import sot
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../src/scripts")
+COLUMNS = ["stanza", "subject", "predicate", "object", "value"]
+
+
+def run_script(path, name):
+    conn = sqlite3.connect(path)
+    with open(os.path.join(SCRIPTS, name)) as f:
+        conn.executescript(f.read())
+    conn.commit()
+    conn.close()
+
+
+def build_db(path, taxa):
+    """Create an rdftab-style database with a label, parent, rank and
+    synonyms for each taxon, built as in the Makefile."""
+    rng = random.Random(0)
+    conn = sqlite3.connect(path)
+    with open(os.path.join(SCRIPTS, "prefixes.sql")) as f:
+        conn.executescript(f.read())
+    conn.execute(
+        """CREATE TABLE statements (stanza TEXT, subject TEXT, predicate TEXT,
+           object TEXT, value TEXT, datatype TEXT, language TEXT)"""
+    )
+    ranks = ["species", "genus", "family", "order", "no_rank"]
+
+    def rows():
+        for n in range(1, taxa + 1):
+            s = f"NCBITaxon:{n}"
+            yield s, s, "rdf:type", "owl:Class", None, None, None
+            yield s, s, "rdfs:label", None, f"taxon {n}", "xsd:string", None
+            yield s, s, "rdfs:subClassOf", f"NCBITaxon:{rng.randint(1, n)}", None, None, None
+            yield s, s, "ncbitaxon:has_rank", f"NCBITaxon:{ranks[n % len(ranks)]}", None, None, None
+            yield s, s, "oboInOwl:hasOBONamespace", None, "ncbi_taxonomy", "xsd:string", None
+            if n % 2 == 0:
+                yield s, s, "oboInOwl:hasExactSynonym", None, f"species {n}", "xsd:string", None
+            if n % 3 == 0:
+                yield s, s, "IAO:0000118", None, f"strain {n}", None, "en"
+            if n % 20 == 0:
+                yield s, s, "owl:deprecated", None, "true", "xsd:boolean", None
+
+    conn.executemany("INSERT INTO statements VALUES (?, ?, ?, ?, ?, ?, ?)", rows())
+    for column in COLUMNS:
+        conn.execute(f"CREATE INDEX idx_{column} ON statements ({column})")
+    conn.commit()
+    conn.close()
+    run_script(path, "search.sql")
+    conn = sqlite3.connect(path)
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def compact_db(path, compact):
+    """Copy a database built by the build/%.db rule and convert it as with
+    COMPACT=true. Return the seconds the conversion took."""
+    shutil.copyfile(path, compact)
+    began = time.perf_counter()
+    conn = sqlite3.connect(compact)
+    for column in COLUMNS:
+        conn.execute(f"DROP INDEX IF EXISTS idx_{column}")
+    conn.execute("DROP TABLE IF EXISTS search")
+    conn.commit()
+    conn.close()
+    run_script(compact, "compact.sql")
+    run_script(compact, "search.sql")
+    conn = sqlite3.connect(compact)
+    conn.execute("ANALYZE")
+    conn.close()
+    return time.perf_counter() - began
+
+
+def sizes(path):
+    """Return the file size and the sizes of the tables and of the indexes
+    on statements, in bytes."""
+    conn = sqlite3.connect(path)
+    indexes = {f"idx_{column}" for column in COLUMNS} | {"sqlite_autoindex_terms_1"}
+    try:
+        tables = indexed = 0
+        for name, size in conn.execute("SELECT name, sum(pgsize) FROM dbstat GROUP BY name"):
+            if name in indexes:
+                indexed += size
+            elif name in ("statements", "triples", "terms"):
+                tables += size
+    except sqlite3.OperationalError:
+        # SQLite without the dbstat table
+        tables = indexed = None
+    conn.close()
+    return os.path.getsize(path), tables, indexed
+
+
+def sample(path, count):
+    rng = random.Random(1)
+    conn = sqlite3.connect(path)
+    subjects = [s for (s,) in conn.execute(sot.ALL_SUBJECTS_SQL, ("",))]
+    labels = [v for (v,) in conn.execute("SELECT value FROM statements WHERE predicate = 'rdfs:label'")]
+    conn.close()
+    return rng.sample(subjects, min(count, len(subjects))), rng.sample(labels, min(count, len(labels)))
+
+
+def timed(fn, runs):
+    """Return the median milliseconds of fn over runs."""
+    times = []
+    for _ in range(runs):
+        began = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - began)
+    return statistics.median(times) * 1000
+
+
+def queries(resource, subjects, labels, limit):
+    """Return (name, function) pairs for the SoT queries to time."""
+    words = [label.split()[-1] for label in labels]
+    return [
+        ("subject", lambda: [resource.execute(sot.SUBJECT_SQL, (s,)) for s in subjects]),
+        ("label", lambda: [resource.execute(sot.LABEL_SQL, (s,)) for s in subjects]),
+        ("digest", lambda: [resource.digest(s) for s in subjects]),
+        ("status", lambda: resource.status(list(enumerate(subjects)))),
+        ("filter", lambda: [resource.execute(sot.FILTER_SQL["eq"], ("rdfs:label", v, "")) for v in labels]),
+        ("page", lambda: [resource.execute(sot.ALL_SUBJECTS_SQL + f" LIMIT {limit}", (s,)) for s in subjects]),
+        ("search", lambda: [resource.execute(sot.SEARCH_SQL, (sot.search_query(w), limit)) for w in words]),
+    ]
+
+
+def main():
+    p = ArgumentParser(description="Compare the TEXT and compact statements schemas")
+    p.add_argument("databases", nargs="*", help="rdftab databases built by make")
+    p.add_argument("-t", "--taxa", type=int, default=300000, help="Taxa in the synthetic database")
+    p.add_argument("-n", "--count", type=int, default=1000, help="Subjects and labels to query")
+    p.add_argument("-r", "--runs", type=int, default=3, help="Runs of each query")
+    p.add_argument("-l", "--limit", type=int, default=sot.DEFAULT_LIMIT, help="Rows per page and search")
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        databases = args.databases
+        if not databases:
+            path = os.path.join(tmp, "ncbitaxon.db")
+            build_db(path, args.taxa)
+            databases = [path]
+
+        print("database\tschema\tfile MB\ttables MB\tindexes MB\tquery\tms\tms/query")
+        for path in databases:
+            name = os.path.splitext(os.path.basename(path))[0]
+            compact = os.path.join(tmp, f"{name}-compact.db")
+            seconds = compact_db(path, compact)
+            print(f"converted {path} in {seconds:.1f}s", file=sys.stderr)
+            subjects, labels = sample(path, args.count)
+            for schema, db in [("text", path), ("compact", compact)]:
+                size, tables, indexed = [x / 1048576 if x is not None else float("nan") for x in sizes(db)]
+                resource = sot.Resource(name, db, 1)
+                for query, fn in queries(resource, subjects, labels, args.limit):
+                    ms = timed(fn, args.runs)
+                    print(
+                        f"{name}\t{schema}\t{size:.1f}\t{tables:.1f}\t{indexed:.1f}"
+                        f"\t{query}\t{ms:.1f}\t{ms / len(subjects):.3f}"
+                    )
+                resource.pool.close()
+
+
+if __name__ == "__main__":
+    main()
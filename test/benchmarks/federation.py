@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+#
+# Benchmark "all" queries over several synthetic resource databases:
+# bulk term status with each resource looked up in turn and all at once, and
+# single-subject lookups with a query per resource and one UNION ALL query
+# over the attached databases.
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../src/scripts"))
+
+import sot
+
+
+def build_db(path, prefix, terms):
+    """Create an rdftab-style database with a labelled class for each term,
+    every tenth one obsolete, indexed as in the Makefile."""
+    conn = sqlite3.connect(path)
+    here = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(here, "../../src/scripts/prefixes.sql")) as f:
+        conn.executescript(f.read())
+    conn.execute(
+        """CREATE TABLE statements (stanza TEXT, subject TEXT, predicate TEXT,
+           object TEXT, value TEXT, datatype TEXT, language TEXT)"""
+    )
+
+    def rows():
+        for n in range(1, terms + 1):
+            s = f"{prefix}:{n:07d}"
+            yield s, s, "rdf:type", "owl:Class", None, None, None
+            yield s, s, "rdfs:label", None, f"{prefix} term {n}", "xsd:string", None
+            if n % 10 == 0:
+                yield s, s, "owl:deprecated", None, "true", "xsd:boolean", None
+            else:
+                yield s, s, "rdfs:subClassOf", f"{prefix}:{n // 2 or 1:07d}", None, None, None
+
+    conn.executemany("INSERT INTO statements VALUES (?, ?, ?, ?, ?, ?, ?)", rows())
+    for column in ["stanza", "subject", "predicate", "object", "value"]:
+        conn.execute(f"CREATE INDEX idx_{column} ON statements ({column})")
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+
+
+def requested_ids(prefixes, count, terms):
+    for i in range(count):
+        yield f"{prefixes[i % len(prefixes)]}:{(i * 7919) % (terms + terms // 20) + 1:07d}"
+
+
+def run(label, fn, count):
+    began = time.perf_counter()
+    n = sum(1 for _ in fn())
+    elapsed = time.perf_counter() - began
+    print(f"{label}\t{n}\t{elapsed:.2f}\t{n / elapsed:,.0f}")
+    assert n == count
+
+
+def main():
+    p = ArgumentParser()
+    p.add_argument("-r", "--resources", type=int, default=4, help="Number of resource databases")
+    p.add_argument("-t", "--terms", type=int, default=200000, help="Terms in each database")
+    p.add_argument("-n", "--count", type=int, default=100000, help="CURIEs to request")
+    args = p.parse_args()
+
+    prefixes = ["ONTIE", "NCBITaxon", "DOID", "OBI", "GO", "CHEBI", "UBERON", "PR", "CL", "IAO"][: args.resources]
+    with tempfile.TemporaryDirectory() as tmp:
+        for prefix in prefixes:
+            build_db(os.path.join(tmp, f"{prefix.lower()}.db"), prefix, args.terms)
+        s = sot.SoT(tmp)
+        resources = s.get_resources("all")
+        requested = list(requested_ids(prefixes, args.count, args.terms))
+        subjects = requested[: args.count // 10]
+        print(f"{len(resources)} resources, {os.cpu_count()} CPUs", file=sys.stderr)
+
+        def in_turn(resources, fn, *args):
+            return [fn(resource, *args) for resource in resources]
+
+        def per_resource():
+            for subject in subjects:
+                yield [row for resource in resources for row in resource.execute(sot.SUBJECT_SQL, (subject,))]
+
+        print("method\trows\tseconds\trows/sec")
+        parallel = s.each_resource
+        s.each_resource = in_turn
+        run("status in turn", lambda: s.get_status(resources, "CURIE", requested), args.count)
+        s.each_resource = parallel
+        run("status at once", lambda: s.get_status(resources, "CURIE", requested), args.count)
+        run("subject per resource", per_resource, len(subjects))
+        run("subject attached", lambda: (s.get_subject(resources, x) for x in subjects), len(subjects))
+        s.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+#
+# Benchmark partitioned IEDB extraction against a synthetic SQLite copy of the
+# organism, names and source tables, and check that every jobs/partitions
+# setting writes the same phony templates.
+
+import filecmp
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from argparse import ArgumentParser
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../..")
+FIXTURE = os.path.join(ROOT, "test/iedb/fixture.sql")
+EXTRACT = os.path.join(ROOT, "src/scripts/iedb-extract.py")
+
+
+def write_database(path, organisms, sources):
+    random.seed(0)
+    conn = sqlite3.connect(path)
+    with open(FIXTURE) as f:
+        conn.executescript(f.read())
+    conn.execute("DELETE FROM source")
+    conn.execute("DELETE FROM names")
+    conn.execute("DELETE FROM organism WHERE organism_id >= 10000000")
+    rows = []
+    for n in range(organisms):
+        organism_id = 10000000 + n
+        parent = random.choice([9606, 10090, 11676, 12345]) if n < 100 else 10000000 + random.randrange(n)
+        parents = str(parent)
+        if n % 10 == 0:
+            parents += ",12345"
+        iri = f"https://ontology.iedb.org/ontology/ONTIE_{n + 1:07d}" if n % 2 else None
+        rows.append((organism_id, f"organism {n}", "subspecies", parent, parents, iri))
+    conn.executemany("INSERT INTO organism VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.executemany(
+        "INSERT INTO names VALUES (?, ?, 'synonym')",
+        [(10000000 + n, f"synonym {n}") for n in range(0, organisms, 3)],
+    )
+    conn.executemany(
+        "INSERT INTO source VALUES (?, ?, ?, ?, ?, ?, 'IEDB', NULL)",
+        [
+            (n, f"protein {n}", f"P{n}, alias {n}", f"synonym {n}", 9606, "Homo sapiens")
+            for n in range(1, sources + 1)
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+
+def main():
+    p = ArgumentParser()
+    p.add_argument("-o", "--organisms", type=int, default=200000, help="Synthetic IEDB organisms")
+    p.add_argument("-s", "--sources", type=int, default=200000, help="Synthetic IEDB sources")
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "iedb.db")
+        write_database(db, args.organisms, args.sources)
+        total = args.organisms + args.sources
+
+        print("jobs\tpartitions\tseconds\trows/sec")
+        outputs = []
+        for jobs, partitions in [(1, 1), (2, 8), (4, 16), (8, 32)]:
+            out = os.path.join(tmp, f"phony-{jobs}")
+            start = time.perf_counter()
+            subprocess.run(
+                [
+                    sys.executable,
+                    EXTRACT,
+                    "--database",
+                    f"sqlite:///{db}",
+                    "--output",
+                    out,
+                    "--map",
+                    os.path.join(tmp, "missing.db"),
+                    "--jobs",
+                    str(jobs),
+                    "--partitions",
+                    str(partitions),
+                ],
+                cwd=ROOT,
+                check=True,
+                stderr=subprocess.DEVNULL,
+            )
+            elapsed = time.perf_counter() - start
+            print(f"{jobs}\t{partitions}\t{elapsed:.2f}\t{total / elapsed:,.0f}")
+            outputs.append(out)
+
+        for out in outputs[1:]:
+            for name in ["index.tsv", "taxon.tsv", "protein.tsv"]:
+                assert filecmp.cmp(
+                    os.path.join(outputs[0], name), os.path.join(out, name), shallow=False
+                ), f"{name} differs between {outputs[0]} and {out}"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+#
+# Benchmark the NCBITaxon merged.dmp converter against the previous
+# line-at-a-time implementation, for each output format and input compression.
+
+import gzip
+import os
+import sys
+import tempfile
+import time
+import zipfile
+
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../src/scripts"))
+
+import taxdump
+
+
+def write_dump(path, rows):
+    with open(path, "w") as f:
+        for n in range(rows):
+            f.write(f"{n * 3 + 1}\t|\t{n * 3 + 2}\t|\n")
+
+
+def legacy(dmp, ttl):
+    """The previous ncbitaxon-merged.py loop."""
+    with open(dmp) as lines, open(ttl, "w") as w:
+        w.write(taxdump.TTL_PREFIXES)
+        for line in lines:
+            cells = line.split("|")
+            w.write("NCBITaxon:%s\n" % cells[0].strip())
+            w.write("  rdf:type owl:Class ;\n")
+            w.write('  rdfs:label "obsolete taxon %s" ;\n' % cells[0].strip())
+            w.write('  owl:deprecated "true"^^xsd:boolean ;\n')
+            w.write("  IAO:0100001 NCBITaxon:%s .\n\n" % cells[1].strip())
+
+
+def streaming(dmp, out):
+    with taxdump.open_dump(dmp, "merged.dmp") as lines:
+        taxdump.convert(lines, taxdump.parse_merged, out)
+
+
+def main():
+    p = ArgumentParser()
+    p.add_argument("-n", "--rows", type=int, default=500000, help="Rows in the synthetic merged.dmp")
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dmp = os.path.join(tmp, "merged.dmp")
+        write_dump(dmp, args.rows)
+        with open(dmp, "rb") as f, gzip.open(dmp + ".gz", "wb") as gz:
+            gz.write(f.read())
+        with zipfile.ZipFile(os.path.join(tmp, "taxdump.zip"), "w", zipfile.ZIP_DEFLATED) as z:
+            z.write(dmp, "merged.dmp")
+
+        cases = [
+            ("legacy ttl", lambda: legacy(dmp, os.path.join(tmp, "legacy.ttl"))),
+            ("dmp -> ttl", lambda: streaming(dmp, os.path.join(tmp, "out.ttl"))),
+            ("dmp -> nt", lambda: streaming(dmp, os.path.join(tmp, "out.nt"))),
+            ("dmp -> db", lambda: streaming(dmp, os.path.join(tmp, "out.db"))),
+            ("gz -> ttl", lambda: streaming(dmp + ".gz", os.path.join(tmp, "gz.ttl"))),
+            ("zip -> ttl", lambda: streaming(os.path.join(tmp, "taxdump.zip"), os.path.join(tmp, "zip.ttl"))),
+        ]
+        print("case\tseconds\trows/sec")
+        for name, fn in cases:
+            start = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - start
+            print(f"{name}\t{elapsed:.2f}\t{args.rows / elapsed:,.0f}")
+
+        with open(os.path.join(tmp, "legacy.ttl")) as a, open(os.path.join(tmp, "out.ttl")) as b:
+            assert a.read() == b.read(), "Turtle output differs from the legacy converter"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+#
+# Benchmark paging through every subject of a synthetic NCBITaxon-shaped
+# database with offset and with after tokens, and exporting all of it with
+# one query per subject and in one pass over the subject index.
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../src/scripts"))
+
+import sot
+
+
+def build_db(path, taxa):
+    """Create an rdftab-style database with a label, parent and synonym for
+    each taxon, indexed as in the Makefile."""
+    conn = sqlite3.connect(path)
+    here = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(here, "../../src/scripts/prefixes.sql")) as f:
+        conn.executescript(f.read())
+    conn.execute(
+        """CREATE TABLE statements (stanza TEXT, subject TEXT, predicate TEXT,
+           object TEXT, value TEXT, datatype TEXT, language TEXT)"""
+    )
+
+    def rows():
+        for n in range(1, taxa + 1):
+            s = f"NCBITaxon:{n}"
+            yield s, s, "rdf:type", "owl:Class", None, None, None
+            yield s, s, "rdfs:label", None, f"taxon {n}", "xsd:string", None
+            yield s, s, "rdfs:subClassOf", f"NCBITaxon:{n // 2 or 1}", None, None, None
+            yield s, s, "IAO:0000118", None, f"species {n}", "xsd:string", None
+
+    conn.executemany("INSERT INTO statements VALUES (?, ?, ?, ?, ?, ?, ?)", rows())
+    for column in ["stanza", "subject", "predicate", "object", "value"]:
+        conn.execute(f"CREATE INDEX idx_{column} ON statements ({column})")
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+
+
+def page_offset(s, resources, limit):
+    offset = 0
+    while True:
+        subjects = s.find_subjects(resources, [], limit, offset)
+        yield from subjects
+        if len(subjects) < limit:
+            return
+        offset += limit
+
+
+def page_after(s, resources, limit):
+    after = ""
+    while True:
+        subjects = s.find_subjects(resources, [], limit, 0, after)
+        yield from subjects
+        if len(subjects) < limit:
+            return
+        after = subjects[-1]
+
+
+def run(label, rows, count):
+    began = time.perf_counter()
+    n = sum(1 for _ in rows)
+    elapsed = time.perf_counter() - began
+    print(f"{label}\t{n}\t{elapsed:.2f}\t{n / elapsed:,.0f}")
+    assert n == count
+
+
+def main():
+    p = ArgumentParser()
+    p.add_argument("-t", "--taxa", type=int, default=200000, help="Number of taxa in the database")
+    p.add_argument("-l", "--limit", type=int, default=sot.MAX_LIMIT, help="Subjects per page")
+    p.add_argument("--skip-offset", action="store_true", help="Do not page with offset")
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        build_db(os.path.join(tmp, "ncbitaxon.db"), args.taxa)
+        s = sot.SoT(tmp, 1)
+        resources = s.get_resources("all")
+        columns = sot.parse_select(sot.DEFAULT_SELECT + ["alternative term"])
+
+        print("method\trows\tseconds\trows/sec")
+        if not args.skip_offset:
+            run("offset pages", page_offset(s, resources, args.limit), args.taxa)
+        run("after pages", page_after(s, resources, args.limit), args.taxa)
+        run(
+            "export per subject",
+            (
+                sot.tsv_line(s.get_row(resources, subject, columns))
+                for subject in s.iterate_pages(resources, [])
+            ),
+            args.taxa,
+        )
+        run(
+            "export one pass",
+            (
+                sot.tsv_line(s.make_row(resources, subject, values, True, columns))
+                for subject, values in s.iterate_subject_values(resources)
+            ),
+            args.taxa,
+        )
+        s.close()
+
+
+if __name__ == "__main__":
+    main()
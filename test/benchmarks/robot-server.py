@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+#
+# Time the ROBOT steps of `make update` with a new JVM for each command and
+# through the ROBOT server (`make robot-server`), then restore ontie.owl.
+#
+# Needs build/robot.jar and build/imports.ttl (run `make update` once first).
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from argparse import ArgumentParser
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../..")
+TARGETS = ["build/imports.ttl", "ontie.owl"]
+
+
+def run_make(targets, server):
+    args = ["make", "-B", "-o", "build/robot.jar", "-o", "build/fetched.txt"]
+    for module in ["build/doid-import.ttl", "build/obi-import.ttl"]:
+        args.extend(["-o", module])
+    if server:
+        args.append("ROBOT_SERVER=true")
+    began = time.perf_counter()
+    subprocess.run(args + targets, cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - began
+
+
+def main():
+    p = ArgumentParser()
+    p.add_argument("-r", "--runs", type=int, default=3, help="Runs of each mode")
+    p.add_argument("targets", nargs="*", default=TARGETS, help="Make targets that run ROBOT")
+    args = p.parse_args()
+
+    for path in ["build/robot.jar", "build/imports.ttl"]:
+        if not os.path.exists(os.path.join(ROOT, path)):
+            sys.exit(f"ERROR: {path} is missing; run `make update` first")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backup = os.path.join(tmp, "ontie.owl")
+        shutil.copy(os.path.join(ROOT, "ontie.owl"), backup)
+        try:
+            print("mode\trun\tseconds")
+            for run in range(1, args.runs + 1):
+                print(f"jvm\t{run}\t{run_make(args.targets, False):.2f}", flush=True)
+            subprocess.run(["make", "robot-server"], cwd=ROOT, check=True)
+            try:
+                for run in range(1, args.runs + 1):
+                    print(f"server\t{run}\t{run_make(args.targets, True):.2f}", flush=True)
+            finally:
+                subprocess.run(["make", "robot-server-stop"], cwd=ROOT)
+        finally:
+            shutil.copy(backup, os.path.join(ROOT, "ontie.owl"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+#
+# Benchmark the full-text search index (src/scripts/search.sql) against the
+# LIKE scans it replaces, on rdftab databases such as build/obi.db and
+# build/ncbitaxon.db, or on a synthetic NCBITaxon-shaped database.
+#
+# Two kinds of query are timed for words taken from the labels:
+#
+# - prefix: the subjects API filter label=like.Word*, for the first four
+#   letters of the first word of labels, as a LIKE scan and narrowed by the
+#   index; both must return the same subjects
+# - search: a word anywhere in a label, alternative term or definition, as a
+#   LIKE '%word%' scan (like gizmos.search) and as a ranked sot.search
+
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../src/scripts"))
+
+import sot
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../src/scripts")
+
+SEARCH_PREDICATES = tuple(sot.SEARCH_COLUMNS)
+LABELS_SQL = "SELECT value FROM statements WHERE predicate = 'rdfs:label'"
+WORD_SCAN_SQL = f"""SELECT DISTINCT subject FROM statements
+WHERE predicate IN ({", ".join("?" * len(SEARCH_PREDICATES))}) AND value LIKE ?"""
+
+SYLLABLES = ["ba", "cor", "den", "fu", "gal", "hy", "lo", "mus", "nor", "pe", "ra", "sal", "tri", "vi"]
+
+
+def word(rng, n):
+    return "".join(rng.choice(SYLLABLES) for _ in range(n))
+
+
+def build_db(path, taxa):
+    """Create an rdftab-style database with a label for each taxon and
+    alternative terms and definitions for some, indexed as in the Makefile."""
+    rng = random.Random(0)
+    genera = [word(rng, 3).capitalize() for _ in range(max(taxa // 50, 1))]
+    conn = sqlite3.connect(path)
+    with open(os.path.join(SCRIPTS, "prefixes.sql")) as f:
+        conn.executescript(f.read())
+    conn.execute(
+        """CREATE TABLE statements (stanza TEXT, subject TEXT, predicate TEXT,
+           object TEXT, value TEXT, datatype TEXT, language TEXT)"""
+    )
+
+    def rows():
+        for n in range(1, taxa + 1):
+            s = f"NCBITaxon:{n}"
+            genus = genera[n % len(genera)]
+            label = f"{genus} {word(rng, 4)} strain {n % 997}"
+            yield s, s, "rdf:type", "owl:Class", None, None, None
+            yield s, s, "rdfs:label", None, label, "xsd:string", None
+            yield s, s, "rdfs:subClassOf", f"NCBITaxon:{n // 2 or 1}", None, None, None
+            if n % 3 == 0:
+                yield s, s, "IAO:0000118", None, f"{genus[0]}. {word(rng, 4)}", "xsd:string", None
+            if n % 7 == 0:
+                yield s, s, "IAO:0000115", None, f"A {word(rng, 3)} isolated from {word(rng, 3)}", "xsd:string", None
+
+    conn.executemany("INSERT INTO statements VALUES (?, ?, ?, ?, ?, ?, ?)", rows())
+    for column in ["stanza", "subject", "predicate", "object", "value"]:
+        conn.execute(f"CREATE INDEX idx_{column} ON statements ({column})")
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+
+
+def build_index(path):
+    """Run search.sql on a database and return the seconds it took."""
+    began = time.perf_counter()
+    conn = sqlite3.connect(path)
+    with open(os.path.join(SCRIPTS, "search.sql")) as f:
+        conn.executescript(f.read())
+    conn.commit()
+    conn.close()
+    return time.perf_counter() - began
+
+
+def sample_words(resource, count):
+    """Return words of at least four letters from the labels of a database."""
+    rng = random.Random(1)
+    words = set()
+    for (label,) in resource.iterate(LABELS_SQL):
+        for w in label.split():
+            if len(w) >= 4 and w.isalpha():
+                words.add(w)
+    return rng.sample(sorted(words), min(count, len(words)))
+
+
+def sample_prefixes(resource, count):
+    """Return the first four letters of the first words of the labels of a
+    database, so that each label=like.Word* query matches some labels."""
+    rng = random.Random(2)
+    prefixes = set()
+    for (label,) in resource.iterate(LABELS_SQL):
+        w = label.split()[0] if label.split() else ""
+        if len(w) >= 4 and w[:4].isalpha():
+            prefixes.add(w[:4])
+    return rng.sample(sorted(prefixes), min(count, len(prefixes)))
+
+
+def timed(fn, runs):
+    """Return the median milliseconds of fn over runs, and its last result."""
+    times = []
+    for _ in range(runs):
+        began = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - began)
+    return statistics.median(times) * 1000, result
+
+
+def bench(resource, prefixes, words, runs, limit):
+    rows = []
+    for prefix in prefixes:
+        pattern = prefix + "%"
+        query = sot.like_query("label", pattern)
+        scan_ms, scanned = timed(
+            lambda: {r[0] for r in resource.execute(sot.FILTER_SQL["like"], ("rdfs:label", pattern, ""))}, runs
+        )
+        fts_ms, found = timed(
+            lambda: {r[0] for r in resource.execute(sot.LIKE_SEARCH_SQL, (query, "rdfs:label", pattern, ""))}, runs
+        )
+        if scanned != found:
+            sys.exit(f"ERROR: {resource.name} label=like.{prefix}* returned different subjects with the index")
+        rows.append(("prefix", prefix + "*", len(scanned), scan_ms, fts_ms))
+
+    for w in words:
+        scan_ms, scanned = timed(
+            lambda: resource.execute(WORD_SCAN_SQL, SEARCH_PREDICATES + (f"%{w}%",)), runs
+        )
+        fts_ms, found = timed(lambda: resource.execute(sot.SEARCH_SQL, (sot.search_query(w), limit)), runs)
+        rows.append(("search", w, len(scanned), scan_ms, fts_ms))
+    return rows
+
+
+def main():
+    p = ArgumentParser(description="Compare full-text search with LIKE scans")
+    p.add_argument("databases", nargs="*", help="rdftab databases with a search index (built by make)")
+    p.add_argument("-t", "--taxa", type=int, default=500000, help="Taxa in the synthetic database")
+    p.add_argument("-w", "--words", type=int, default=20, help="Words to query")
+    p.add_argument("-r", "--runs", type=int, default=3, help="Runs of each query")
+    p.add_argument("-l", "--limit", type=int, default=sot.DEFAULT_LIMIT, help="Ranked results to return")
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        databases = args.databases
+        if not databases:
+            path = os.path.join(tmp, "ncbitaxon.db")
+            build_db(path, args.taxa)
+            size = os.path.getsize(path)
+            seconds = build_index(path)
+            growth = (os.path.getsize(path) - size) / size * 100
+            print(f"indexed {args.taxa} taxa in {seconds:.1f}s, database {growth:.0f}% larger", file=sys.stderr)
+            databases = [path]
+
+        print("database\tquery\ttext\tLIKE rows\tLIKE ms\tindex ms\tspeedup")
+        for path in databases:
+            name = os.path.splitext(os.path.basename(path))[0]
+            resource = sot.Resource(name, path, 1)
+            if not resource.searchable:
+                sys.exit(f"ERROR: {path} has no search index; rebuild it with make")
+            prefixes = sample_prefixes(resource, args.words)
+            results = bench(resource, prefixes, sample_words(resource, args.words), args.runs, args.limit)
+            resource.pool.close()
+            for kind, text, count, scan_ms, fts_ms in results:
+                print(f"{name}\t{kind}\t{text}\t{count}\t{scan_ms:.1f}\t{fts_ms:.1f}\t{scan_ms / fts_ms:.0f}x")
+            for kind in ["prefix", "search"]:
+                scan = statistics.median(r[3] for r in results if r[0] == kind)
+                fts = statistics.median(r[4] for r in results if r[0] == kind)
+                print(f"{name}\t{kind}\tmedian\t\t{scan:.1f}\t{fts:.1f}\t{scan / fts:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
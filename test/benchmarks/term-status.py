@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+#
+# Benchmark bulk term-status lookups against a synthetic NCBITaxon-shaped database.
+# Compares the batched TEMP-table resolver with one lookup per subject.
+
+import os
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../src/scripts"))
+
+import sot
+
+
+def build_db(path, taxa):
+    """Create an rdftab-style database with one stanza per taxon. Every tenth
+    taxon is merged into the next one and every hundredth is deleted."""
+    conn = sqlite3.connect(path)
+    here = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(here, "../../src/scripts/prefixes.sql")) as f:
+        conn.executescript(f.read())
+    conn.execute(
+        """CREATE TABLE statements (stanza TEXT, subject TEXT, predicate TEXT,
+           object TEXT, value TEXT, datatype TEXT, language TEXT)"""
+    )
+
+    def rows():
+        for n in range(1, taxa + 1):
+            s = f"NCBITaxon:{n}"
+            yield s, s, "rdf:type", "owl:Class", None, None, None
+            if n % 100 == 0:
+                yield s, s, "rdfs:label", None, f"obsolete taxon {n}", "xsd:string", None
+                yield s, s, "owl:deprecated", None, "true", "xsd:boolean", None
+            elif n % 10 == 0:
+                yield s, s, "rdfs:label", None, f"obsolete taxon {n}", "xsd:string", None
+                yield s, s, "owl:deprecated", None, "true", "xsd:boolean", None
+                yield s, s, "IAO:0100001", f"NCBITaxon:{n + 1}", None, None, None
+            else:
+                yield s, s, "rdfs:label", None, f"taxon {n}", "xsd:string", None
+                yield s, s, "rdfs:subClassOf", f"NCBITaxon:{n // 2 or 1}", None, None, None
+
+    conn.executemany("INSERT INTO statements VALUES (?, ?, ?, ?, ?, ?, ?)", rows())
+    conn.execute("CREATE INDEX idx_subject ON statements (subject)")
+    conn.execute("CREATE INDEX idx_predicate ON statements (predicate)")
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+
+
+def requested_ids(count, taxa):
+    # Include unknown IDs and repeat some, like real pipeline input
+    for i in range(count):
+        yield f"NCBITaxon:{(i * 7919) % (taxa + taxa // 20) + 1}"
+
+
+def run(label, fn, count):
+    start = time.perf_counter()
+    rows = 0
+    for _ in fn():
+        rows += 1
+    elapsed = time.perf_counter() - start
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{label}\t{rows}\t{elapsed:.2f}\t{count / elapsed:,.0f}\t{rss:.0f}")
+    assert rows == count
+
+
+def main():
+    p = ArgumentParser()
+    p.add_argument("-t", "--taxa", type=int, default=200000, help="Number of taxa in the database")
+    p.add_argument("-n", "--count", type=int, default=100000, help="Number of CURIEs to request")
+    p.add_argument("--skip-naive", action="store_true", help="Only run the batched resolver")
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        build_db(os.path.join(tmp, "ncbitaxon.db"), args.taxa)
+        s = sot.SoT(tmp, 1)
+        resources = s.get_resources("all")
+        columns = sot.parse_select(["CURIE"] + sot.STATUS_SELECT)
+
+        print("method\trows\tseconds\tIDs/sec\tmax RSS MB")
+        run(
+            "batched",
+            lambda: s.get_status(resources, "CURIE", requested_ids(args.count, args.taxa)),
+            args.count,
+        )
+        if not args.skip_naive:
+            run(
+                "per-subject",
+                lambda: (
+                    s.get_row(resources, c, columns, key=c)
+                    for c in requested_ids(args.count, args.taxa)
+                ),
+                args.count,
+            )
+        s.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+#
+# Benchmark the template toolchain on synthetic templates at 10k, 100k and 1M rows.
+#
+# For each size, a workspace is generated with the layout of this repository:
+# the real templates plus synthetic protein.tsv and taxon.tsv rows (a deep
+# taxon hierarchy and proteins with many alternative terms), and an
+# NCBITaxon-shaped statements database for mireot.py. Each step then runs as
+# it does in the build, from the workspace:
+#
+# - labels: labels.py build
+# - report: report.py, as for build/report-problems.tsv
+# - mireot: mireot.py on a sample of taxa
+# - generate-form: generate-form.py for the protein form
+# - diff: daff for each sheet against the generated "master", then diff.py
+# - add-term: add-term.py adding one protein
+# - sort-templates: sort-templates.py
+#
+# Results are printed as TSV and written as JSON to --output. Given a
+# --baseline results file, steps slower than the baseline by more than
+# --threshold (and --minimum seconds) are listed and the script exits 1.
+# Use --keep to keep the generated workspaces.
+
+import csv
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlencode
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.."))
+TEMPLATE_DIR = os.path.join(ROOT, "src/ontology/templates")
+SHEETS = ["predicates", "index", "external", "protein", "complex", "disease", "taxon", "assays", "other"]
+SIZES = {"10k": 10000, "100k": 100000, "1m": 1000000}
+STEPS = ["labels", "report", "mireot", "generate-form", "diff", "add-term", "sort-templates"]
+
+# Synthetic terms are numbered after the real ONTIE IDs
+FIRST_ID = 1000000
+
+# Taxa form chains of this length, each starting under a taxon of the previous
+# chains, so the hierarchy is deep as well as broad
+CHAIN = 40
+
+WORDS = [
+    "alpha", "beta", "kinase", "antigen", "envelope", "capsid", "surface", "membrane",
+    "binding", "factor", "receptor", "heat shock", "glycoprotein", "subunit", "chain",
+    "polymerase", "protease", "toxin", "precursor", "fragment",
+]
+
+
+def taxon_parent(n):
+    """Return the number of the parent of synthetic taxon n, or None for a root."""
+    if n == 0:
+        return None
+    if n % CHAIN:
+        return n - 1
+    return (n // CHAIN - 1) * CHAIN // 2
+
+
+def taxon_label(n):
+    return f"Synthetica taxon {n}"
+
+
+def append_rows(path, rows):
+    with open(path, "a") as f:
+        writer = csv.writer(f, delimiter="\t", lineterminator="\n")
+        writer.writerows(rows)
+
+
+def generate_templates(template_dir, rows, seed):
+    """Copy the real templates and add synthetic taxa (60% of rows) and
+    proteins (40%), each with an ONTIE ID in index.tsv. Return the numbers
+    of taxa and proteins."""
+    random.seed(seed)
+    os.makedirs(template_dir, exist_ok=True)
+    for sheet in SHEETS:
+        shutil.copy(os.path.join(TEMPLATE_DIR, f"{sheet}.tsv"), template_dir)
+    taxa = rows * 6 // 10
+    proteins = rows - taxa
+    next_id = iter(range(FIRST_ID, FIRST_ID + rows))
+
+    def ranks(n):
+        return "species" if taxon_parent(n) is not None and n % CHAIN == CHAIN - 1 else "no rank"
+
+    index = []
+    taxon_rows = []
+    for n in range(taxa):
+        parent = taxon_parent(n)
+        alternatives = "|".join(f"T{n}-{i}" for i in range(random.randint(0, 3)))
+        taxon_rows.append(
+            [
+                taxon_label(n),
+                taxon_label(parent) if parent is not None else "organism",
+                ranks(n),
+                alternatives,
+                "taxon",
+                f"NCBITaxon:{n + 1}",
+                "",
+            ]
+        )
+        index.append([f"ONTIE:{next(next_id):07d}", taxon_label(n), "owl:Class", "", ""])
+    append_rows(os.path.join(template_dir, "taxon.tsv"), taxon_rows)
+    del taxon_rows
+
+    protein_rows = []
+    for n in range(proteins):
+        name = f"{random.choice(WORDS)} {random.choice(WORDS)} protein {n}"
+        taxon = taxon_label(random.randrange(taxa)) if taxa else "organism"
+        # Many alternative terms, as for the real IEDB source proteins
+        alternatives = "|".join(f"{name} {random.choice(WORDS)} {i}" for i in range(random.randint(1, 12)))
+        protein_rows.append([f"{name} ({taxon})", "protein", alternatives, name, "protein", taxon])
+        index.append([f"ONTIE:{next(next_id):07d}", f"{name} ({taxon})", "owl:Class", "", ""])
+    append_rows(os.path.join(template_dir, "protein.tsv"), protein_rows)
+    append_rows(os.path.join(template_dir, "index.tsv"), index)
+    return taxa, proteins
+
+
+def generate_statements(path, taxa):
+    """Create an rdftab database of NCBITaxon classes with the same hierarchy
+    as the synthetic taxa, with labels and exact synonyms."""
+    conn = sqlite3.connect(path)
+    with open(os.path.join(ROOT, "src/scripts/prefixes.sql")) as f:
+        conn.executescript(f.read())
+    conn.execute(
+        """CREATE TABLE statements (stanza TEXT, subject TEXT, predicate TEXT,
+           object TEXT, value TEXT, datatype TEXT, language TEXT)"""
+    )
+
+    def rows():
+        for n in range(taxa):
+            s = f"NCBITaxon:{n + 1}"
+            parent = taxon_parent(n)
+            yield s, s, "rdf:type", "owl:Class", None, None, None
+            yield s, s, "rdfs:label", None, taxon_label(n), "xsd:string", None
+            yield s, s, "oio:hasExactSynonym", None, f"T{n}", "xsd:string", None
+            if parent is not None:
+                yield s, s, "rdfs:subClassOf", f"NCBITaxon:{parent + 1}", None, None, None
+
+    conn.executemany("INSERT INTO statements VALUES (?, ?, ?, ?, ?, ?, ?)", rows())
+    conn.execute("CREATE INDEX idx_stanza ON statements (stanza)")
+    conn.execute("CREATE INDEX idx_subject ON statements (subject)")
+    conn.execute("CREATE INDEX idx_predicate ON statements (predicate)")
+    conn.execute("CREATE INDEX idx_object ON statements (object)")
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+
+
+def change_rows(path, fraction, seed):
+    """Edit the last column of a fraction of the data rows, as edits to the sheet would."""
+    random.seed(seed)
+    with open(path) as f:
+        rows = list(csv.reader(f, delimiter="\t"))
+    for row in rows[2:]:
+        if random.random() < fraction:
+            row[-1] = (row[-1] + " edited").strip()
+    with open(path, "w") as f:
+        csv.writer(f, delimiter="\t", lineterminator="\n").writerows(rows)
+
+
+def generate(workspace, rows, seed, terms):
+    """Lay out a workspace for the scripts: src/scripts is a copy of this
+    repository's scripts (sort-templates.py finds the templates from its own
+    path) and src/ontology/templates holds the synthetic templates, with the
+    unedited templates in build/master."""
+    shutil.copytree(
+        os.path.join(ROOT, "src/scripts"),
+        os.path.join(workspace, "src/scripts"),
+        ignore=shutil.ignore_patterns("__pycache__"),
+    )
+    template_dir = os.path.join(workspace, "src/ontology/templates")
+    taxa, _ = generate_templates(template_dir, rows, seed)
+    for directory in ["build/master", "build/diff"]:
+        os.makedirs(os.path.join(workspace, directory))
+    for sheet in SHEETS:
+        shutil.copy(os.path.join(template_dir, f"{sheet}.tsv"), os.path.join(workspace, "build/master"))
+    for sheet in ["protein", "taxon"]:
+        change_rows(os.path.join(template_dir, f"{sheet}.tsv"), 0.01, seed)
+    generate_statements(os.path.join(workspace, "build/ncbitaxon.db"), taxa)
+    random.seed(seed)
+    with open(os.path.join(workspace, "build/terms.txt"), "w") as f:
+        for n in random.sample(range(taxa), min(terms, taxa)):
+            f.write(f"NCBITaxon:{n + 1}\n")
+
+
+def commands(workspace, run):
+    """Return each step as a list of commands to run from the workspace."""
+    tables = [f"src/ontology/templates/{sheet}.tsv" for sheet in SHEETS]
+    daff = shutil.which("daff")
+    query = urlencode(
+        {
+            "template": "protein",
+            "ID": f"ONTIE:{FIRST_ID - 1 - run:07d}",
+            "Label": f"benchmark protein {run} (Homo sapiens)",
+            "Parent": "protein",
+            "Alternative Term": "benchmark protein",
+            "In Taxon": "Homo sapiens",
+        }
+    )
+    return {
+        "labels": [["python3", "src/scripts/labels.py", "--index", "build/labels.db", "build"]],
+        "report": [
+            ["python3", "src/scripts/report.py", "--index", tables[1], "--templates"]
+            + [t for t in tables if t != tables[1]]
+            + ["--labels", "build/labels.db"]
+        ],
+        "mireot": [
+            [
+                "python3", "src/scripts/mireot.py", "--database", "build/ncbitaxon.db",
+                "--terms", "build/terms.txt", "--output", "build/ncbitaxon-import.ttl",
+            ]
+        ],
+        "generate-form": [["python3", "src/scripts/generate-form.py", "protein", "master", "None"]],
+        "diff": None
+        if not daff
+        else [
+            [daff, f"build/master/{sheet}.tsv", f"src/ontology/templates/{sheet}.tsv",
+             "--output", f"build/diff/{sheet}.html", "--fragment"]
+            for sheet in SHEETS
+        ]
+        + [["python3", "src/scripts/diff.py", "src/scripts/diff.html.jinja2"] + SHEETS],
+        "add-term": [["python3", "src/scripts/add-term.py", query]],
+        "sort-templates": [["python3", "src/scripts/sort-templates.py"]],
+    }
+
+
+def measure(workspace, args_list):
+    """Run the commands in turn and return wall seconds, CPU seconds and
+    the largest peak RSS in MB."""
+    wall = cpu = rss = 0.0
+    for args in args_list:
+        began = time.perf_counter()
+        proc = subprocess.Popen(args, cwd=workspace, stdout=subprocess.DEVNULL)
+        _, status, usage = os.wait4(proc.pid, 0)
+        wall += time.perf_counter() - began
+        cpu += usage.ru_utime + usage.ru_stime
+        rss = max(rss, usage.ru_maxrss / 1024)
+        if os.waitstatus_to_exitcode(status) != 0:
+            raise subprocess.CalledProcessError(os.waitstatus_to_exitcode(status), args)
+    return wall, cpu, rss
+
+
+def regressions(results, baseline, threshold, minimum):
+    """Return (step, size, before, after) for results slower than the baseline."""
+    before = {(r["step"], r["size"]): r["seconds"] for r in baseline["results"] if r["seconds"] is not None}
+    slower = []
+    for r in results:
+        old = before.get((r["step"], r["size"]))
+        if old is None or r["seconds"] is None:
+            continue
+        if r["seconds"] > old * (1 + threshold) and r["seconds"] - old >= minimum:
+            slower.append((r["step"], r["size"], old, r["seconds"]))
+    return slower
+
+
+def main():
+    p = ArgumentParser()
+    p.add_argument("-s", "--size", action="append", choices=list(SIZES), help="Sizes to run (default: 10k)")
+    p.add_argument("--step", action="append", choices=STEPS, help="Steps to run (default: all)")
+    p.add_argument("-r", "--runs", type=int, default=3, help="Runs of each step; the fastest is kept")
+    p.add_argument("-n", "--terms", type=int, default=200, help="Taxa for mireot.py to extract")
+    p.add_argument("--seed", type=int, default=0, help="Random seed for the generator")
+    p.add_argument("-o", "--output", default=os.path.join(ROOT, "build/benchmarks.json"), help="Results file")
+    p.add_argument("-b", "--baseline", help="Results file to compare with")
+    p.add_argument("--threshold", type=float, default=0.25, help="Slowdown fraction that is a regression")
+    p.add_argument("--minimum", type=float, default=0.2, help="Smallest slowdown in seconds that is a regression")
+    p.add_argument("--keep", help="Keep the generated workspaces in this directory")
+    args = p.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    steps = [step for step in STEPS if not args.step or step in args.step]
+    results = []
+    print("size\tstep\truns\tseconds\tCPU seconds\tmax RSS MB")
+    for size in args.size or ["10k"]:
+        tmp = tempfile.mkdtemp()
+        workspace = os.path.join(args.keep or tmp, size)
+        try:
+            began = time.perf_counter()
+            # Generate in another process, so that the peak RSS of this one
+            # (which every step inherits on Linux) stays small
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                executor.submit(generate, workspace, SIZES[size], args.seed, args.terms).result()
+            print(f"{size}\tgenerate\t1\t{time.perf_counter() - began:.2f}\t\t", flush=True)
+            for step in steps:
+                timings = []
+                for run in range(args.runs):
+                    step_commands = commands(workspace, run)[step]
+                    if step_commands is None:
+                        break
+                    timings.append(measure(workspace, step_commands))
+                if not timings:
+                    print(f"{size}\t{step}\t0\tskipped\t\t", flush=True)
+                    results.append({"size": size, "rows": SIZES[size], "step": step, "seconds": None})
+                    continue
+                wall, cpu, rss = min(timings)
+                print(f"{size}\t{step}\t{len(timings)}\t{wall:.2f}\t{cpu:.2f}\t{rss:.0f}", flush=True)
+                results.append(
+                    {
+                        "size": size,
+                        "rows": SIZES[size],
+                        "step": step,
+                        "runs": len(timings),
+                        "seconds": round(wall, 4),
+                        "cpu_seconds": round(cpu, 4),
+                        "max_rss_mb": round(rss, 1),
+                    }
+                )
+        finally:
+            shutil.rmtree(tmp)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(
+            {
+                "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print(f"Wrote {args.output}", file=sys.stderr)
+
+    if baseline:
+        slower = regressions(results, baseline, args.threshold, args.minimum)
+        for step, size, old, new in slower:
+            print(f"REGRESSION: {step} at {size} took {new:.2f}s, was {old:.2f}s", file=sys.stderr)
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
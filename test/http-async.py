@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+#
+# Run the api.md GET and POST tests concurrently over a pool of keep-alive
+# connections and report latency percentiles per endpoint.
+#
+#     ./http-async.py doc/api.md
+#     ./http-async.py doc/api.md --load 200 --duration 30
+#
+# By default every test runs --repeat times, at most --connections at once.
+# With --load, the suite is replayed in order at the given number of
+# requests per second for --duration seconds, as a capacity test of a local
+# SoT (src/scripts/serve.py). Responses are checked as in http-test.py.
+
+import argparse, asyncio, importlib.util, logging, os, ssl, sys, time
+
+from urllib.parse import urlsplit
+
+# The parsing and comparison of http-test.py, which is not importable by name
+spec = importlib.util.spec_from_file_location(
+	'http_test', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'http-test.py'))
+http_test = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(http_test)
+
+logging.basicConfig(level=logging.INFO)
+
+class Connection:
+	'''One HTTP/1.1 connection that is kept open between requests.'''
+
+	def __init__(self, host, port, tls):
+		self.host = host
+		self.port = port
+		self.tls = tls
+		self.reader = None
+		self.writer = None
+
+	async def open(self):
+		context = ssl.create_default_context() if self.tls else None
+		self.reader, self.writer = await asyncio.open_connection(
+			self.host, self.port, ssl=context)
+
+	def close(self):
+		if self.writer:
+			self.writer.close()
+		self.reader = self.writer = None
+
+	async def request(self, method, path, body=None):
+		'''Send a request and return the status and body bytes.'''
+		if not self.writer:
+			await self.open()
+		data = body.encode('utf-8') if body is not None else b''
+		head = '%s %s HTTP/1.1\r\nHost: %s\r\nContent-Length: %d\r\n\r\n' % (
+			method, path, self.host, len(data))
+		self.writer.write(head.encode('latin-1') + data)
+		await self.writer.drain()
+
+		status_line = await self.reader.readline()
+		if not status_line:
+			raise ConnectionError('connection closed by server')
+		status = int(status_line.split()[1])
+		headers = {}
+		while True:
+			line = await self.reader.readline()
+			if line in (b'\r\n', b'\n', b''):
+				break
+			k, _, v = line.decode('latin-1').partition(':')
+			headers[k.strip().lower()] = v.strip()
+
+		if headers.get('transfer-encoding', '').lower() == 'chunked':
+			chunks = []
+			while True:
+				size = int((await self.reader.readline()).split(b';')[0], 16)
+				if size == 0:
+					await self.reader.readline()
+					break
+				chunks.append(await self.reader.readexactly(size))
+				await self.reader.readexactly(2)
+			content = b''.join(chunks)
+		elif 'content-length' in headers:
+			content = await self.reader.readexactly(int(headers['content-length']))
+		else:
+			content = await self.reader.read()
+			self.close()
+		if headers.get('connection', '').lower() == 'close':
+			self.close()
+		return status, content
+
+class Pool:
+	'''A fixed number of keep-alive connections shared by all requests.'''
+
+	def __init__(self, base, size):
+		url = urlsplit(base)
+		tls = url.scheme == 'https'
+		port = url.port or (443 if tls else 80)
+		self.idle = asyncio.Queue()
+		for _ in range(size):
+			self.idle.put_nowait(Connection(url.hostname, port, tls))
+
+	async def request(self, method, path, body=None):
+		'''Return the status, body and seconds taken, retrying once on a
+		connection the server has closed.'''
+		conn = await self.idle.get()
+		try:
+			for attempt in range(2):
+				began = time.perf_counter()
+				try:
+					status, content = await conn.request(method, path, body)
+					return status, content, time.perf_counter() - began
+				except (ConnectionError, asyncio.IncompleteReadError):
+					conn.close()
+					if attempt:
+						raise
+		finally:
+			self.idle.put_nowait(conn)
+
+	def close(self):
+		while not self.idle.empty():
+			self.idle.get_nowait().close()
+
+def load_tests(api_doc):
+	'''Return (method, path, body, expected) for each test in the API doc.'''
+	tests = []
+	for path, expected in http_test.parse_get_test_strings(
+			http_test.get_test_strings(api_doc)):
+		tests.append(('GET', path, None, expected))
+	for path, body, expected in http_test.parse_post_test_strings(
+			http_test.post_test_strings(api_doc)):
+		tests.append(('POST', path, body, expected))
+	return tests
+
+def endpoint(method, path):
+	'''Group requests by method and path without the query string.'''
+	return '%s %s' % (method, path.split('?')[0])
+
+def percentile(values, p):
+	'''Return the nearest-rank percentile of a list of values.'''
+	values = sorted(values)
+	rank = max(1, -(-len(values) * p // 100))
+	return values[int(rank) - 1]
+
+class Run:
+	'''Latencies and failures of the requests made so far.'''
+
+	def __init__(self, pool, check=True):
+		self.pool = pool
+		self.check = check
+		self.latencies = {}
+		self.failures = {}
+
+	async def run_test(self, test, scheduled=None):
+		'''Run one test. Under load, latency is counted from when the request
+		was due, so time spent waiting for a connection is included.'''
+		method, path, body, expected = test
+		name = endpoint(method, path)
+		try:
+			status, content, seconds = await self.pool.request(method, path, body)
+			if scheduled is not None:
+				seconds = time.perf_counter() - scheduled
+		except (OSError, asyncio.IncompleteReadError) as e:
+			logging.error(' %s %s failed: %s' % (method, path, e))
+			self.failures[name] = self.failures.get(name, 0) + 1
+			return False
+		self.latencies.setdefault(name, []).append(seconds)
+		ok = status == 200
+		if ok and self.check:
+			label = method if method == 'GET' else 'POST (%s)' % body.replace('\n', '\\n')
+			ok = http_test.compare(path, expected, http_test.fix_result(content), label)
+		elif not ok:
+			logging.error(' %s %s returned %d' % (method, path, status))
+		if not ok:
+			self.failures[name] = self.failures.get(name, 0) + 1
+		return ok
+
+	def report(self, seconds):
+		print('endpoint\trequests\tfailures\tp50 ms\tp95 ms\tp99 ms\tmax ms')
+		total = 0
+		for name in sorted(set(self.latencies) | set(self.failures)):
+			times = self.latencies.get(name, [])
+			total += len(times)
+			cells = ['%.1f' % (percentile(times, p) * 1000) for p in (50, 95, 99)] if times else ['', '', '']
+			cells.append('%.1f' % (max(times) * 1000) if times else '')
+			print('%s\t%d\t%d\t%s' % (name, len(times), self.failures.get(name, 0), '\t'.join(cells)))
+		print('total\t%d\t%d\t%.2f s\t%.1f requests/s' % (
+			total, sum(self.failures.values()), seconds, total / seconds if seconds else 0))
+
+async def contract(tests, pool, repeat):
+	'''Run every test repeat times concurrently. Return the run and whether all passed.'''
+	run = Run(pool)
+	results = await asyncio.gather(*[run.run_test(t) for t in tests * repeat])
+	return run, all(results)
+
+async def load(tests, pool, rate, duration, check):
+	'''Start requests from the suite, in order, at a fixed rate for a duration,
+	whether or not earlier requests have finished.'''
+	run = Run(pool, check)
+	began = time.perf_counter()
+	pending = []
+	n = 0
+	while True:
+		due = began + n / rate
+		if due - began >= duration:
+			break
+		delay = due - time.perf_counter()
+		if delay > 0:
+			await asyncio.sleep(delay)
+		pending.append(asyncio.ensure_future(run.run_test(tests[n % len(tests)], due)))
+		n += 1
+	results = await asyncio.gather(*pending)
+	return run, all(results)
+
+async def main_async(args):
+	tests = load_tests(args.api_doc)
+	if not tests:
+		logging.error(' no tests found in %s' % args.api_doc)
+		return False
+	os.environ['NO_PROXY'] = '127.0.0.1'
+	pool = Pool(args.base, args.connections)
+	began = time.perf_counter()
+	try:
+		if args.load:
+			run, ok = await load(tests, pool, args.load, args.duration, not args.no_check)
+		else:
+			run, ok = await contract(tests, pool, args.repeat)
+	finally:
+		pool.close()
+	run.report(time.perf_counter() - began)
+	return ok
+
+def main():
+	parser = argparse.ArgumentParser(description='Run the API tests concurrently')
+	parser.add_argument('api_doc', help='the API doc with GET and POST tests')
+	parser.add_argument('-b', '--base', default=http_test.base, help='the root URL to test')
+	parser.add_argument('-c', '--connections', type=int, default=8,
+		help='keep-alive connections in the pool')
+	parser.add_argument('-r', '--repeat', type=int, default=1,
+		help='times to run each test')
+	parser.add_argument('-l', '--load', type=float,
+		help='replay the tests at this many requests per second')
+	parser.add_argument('-d', '--duration', type=float, default=10,
+		help='seconds to run the load for')
+	parser.add_argument('--no-check', action='store_true',
+		help='only check the status of responses under load')
+	args = parser.parse_args()
+	if not asyncio.run(main_async(args)):
+		logging.error(' http-async failed')
+		sys.exit(1)
+	logging.info(' http-async passed')
+
+if __name__ == '__main__':
+	main()
@@ -27,18 +27,20 @@ def run_tests(get_tests, post_tests):
 		path = pair[0]
 		expected = pair[1]
 		result = get(path)
-		success = compare(path, expected, result, 'GET')
+		if not compare(path, expected, result, 'GET'):
+			success = False
 	# run the POST tests
 	for tpl in post_tests:
 		path = tpl[0]
 		body = tpl[1]
 		expected = tpl[2]
 		result = post(path, body)
-		success = compare(
-			path, 
-			expected, 
-			result, 
-			'POST (%s)' % body.replace('\n', '\\n'))
+		if not compare(
+				path,
+				expected,
+				result,
+				'POST (%s)' % body.replace('\n', '\\n')):
+			success = False
 	return success
 
 def get(path):
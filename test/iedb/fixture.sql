@@ -0,0 +1,57 @@
+-- A small stand-in for the IEDB organism, names and source tables.
+-- Load it with: sqlite3 build/iedb.db < test/iedb/fixture.sql
+-- (or psql) and run the IEDB scripts with --database sqlite:///build/iedb.db
+
+DROP TABLE IF EXISTS organism;
+DROP TABLE IF EXISTS names;
+DROP TABLE IF EXISTS source;
+
+CREATE TABLE organism (
+  organism_id INTEGER PRIMARY KEY,
+  organism_name TEXT,
+  rank TEXT,
+  parent_tax_id INTEGER,
+  parent_tax_id_string TEXT,
+  iri TEXT
+);
+
+CREATE TABLE names (
+  tax_id INTEGER,
+  name_txt TEXT,
+  name_class TEXT
+);
+
+CREATE TABLE source (
+  source_id INTEGER PRIMARY KEY,
+  name TEXT,
+  aliases TEXT,
+  synonyms TEXT,
+  organism_id INTEGER,
+  organism_name TEXT,
+  database TEXT,
+  iri TEXT
+);
+
+INSERT INTO organism VALUES
+  (9606, 'Homo sapiens', 'species', 9605, '9605', NULL),
+  (10090, 'Mus musculus', 'species', 862507, '862507', NULL),
+  (11676, 'Human immunodeficiency virus 1', 'species', 11646, '11646', NULL),
+  (12345, 'Example virus', 'species', 10239, '10239', NULL),
+  (10000001, 'Mus musculus BALB/c', 'subspecies', 10090, '10090', 'https://ontology.iedb.org/ontology/ONTIE_0000001'),
+  (10000100, 'Mus musculus FIXTURE-1', 'subspecies', 10090, '10090', NULL),
+  (10000101, 'Example virus strain A', 'subspecies', 12345, '12345', NULL),
+  (10000102, 'Example recombinant virus', 'subspecies', 11676, '11676,12345', NULL),
+  (10000103, 'Mus musculus FIXTURE-1 substrain', 'subspecies', 10000100, '10000100', NULL);
+
+INSERT INTO names VALUES
+  (10000100, 'M. musculus FIXTURE-1', 'synonym'),
+  (10000100, 'mouse FIXTURE-1', 'synonym'),
+  (10000102, 'HIV-1/EXV recombinant', 'synonym'),
+  (10090, 'house mouse', 'genbank common name');
+
+INSERT INTO source VALUES
+  (900001, 'Fixture protein alpha', 'FPA, alpha protein', 'fixture alpha', 9606, 'Homo sapiens', 'IEDB', NULL),
+  (900002, 'Fixture envelope glycoprotein', NULL, NULL, 12345, 'Example virus', 'IEDB', NULL),
+  (900003, 'Fixture protein beta', 'FPB', 'FPB, beta protein', 10000100, 'Mus musculus FIXTURE-1', 'IEDB', NULL),
+  (900004, 'Already mapped protein', NULL, NULL, 9606, 'Homo sapiens', 'IEDB', 'https://ontology.iedb.org/ontology/ONTIE_0000002'),
+  (900005, 'UniProt protein', NULL, NULL, 9606, 'Homo sapiens', 'UniProt', NULL);